@@ -0,0 +1,253 @@
+"""
+    HTTP API of the extraction and SEO pipeline, for clients other than the Streamlit app.
+
+    POST   /analyze           {"url": ..., "languages": ["English"], "mode": "single", "force_regenerate": false}
+                              or {"items": [...]} to submit several analyses at once.
+                              Responds 202 with the job (or {"jobs": [...]}) and the
+                              "subscription" that lets this client cancel it.
+    GET    /jobs/{id}         State, current stage, sections ready so far and, once done, the result.
+    GET    /jobs/{id}/stream  Server-sent events: "stage" and "section" as they happen, then
+                              "done", "failed" or "cancelled" with the whole job.
+    DELETE /jobs/{id}?subscription=...
+                              Stop waiting for the job; it is cancelled once no other client
+                              or session wants it.
+    GET    /health            LLM calls running and queued per backend, jobs in flight, and
+                              the health and latency of the model backends.
+
+    Analyses run as background jobs (utils/analysis_job.py) on the coordinator's bounded
+    pool, with LLM calls capped per backend, so the event loop only ever reads job state.
+    Identical requests in flight share one job, from this API and the app alike.
+
+    Usage:
+        python api.py [--port 8000] [--backend local|huggingface] [--api-key ...]
+"""
+import argparse, asyncio, json, os, uuid
+import tornado.ioloop, tornado.web
+from tornado.iostream import StreamClosedError
+from utils.analysis_job import submit_analysis
+from utils.cache import MetaDataCache, LLMCache
+from utils.jobs import BackgroundJob, get_coordinator
+from utils.model_handler import backend_stats
+from utils.near_duplicates import NearDuplicateIndex
+from utils.transcript_store import TranscriptStore
+from utils.video_extraction import VideoExtraction
+from utils.config import HUGGINGFACE_API_KEY, API_PORT, API_MAX_BATCH, API_MAX_LANGUAGES, API_STREAM_POLL_SECONDS, NEAR_DUPLICATE_REUSE, STAGE2_MODE
+from utils.config import LANGUAGES
+
+MODES = ('single', 'parallel')
+
+
+class AnalysisService:
+    """
+        What the handlers share: the model, the caches and the submission of analyses.
+    """
+    def __init__(self, llm, is_local_model: bool, llm_cache: LLMCache = None, metadata_cache: MetaDataCache = None,
+                 duplicates: NearDuplicateIndex = None, transcripts: TranscriptStore = None):
+        self.llm = llm
+        self.is_local_model = is_local_model
+        self.llm_cache = llm_cache
+        self.metadata_cache = metadata_cache
+        self.duplicates = duplicates
+        self.transcripts = transcripts
+        self.__video_extraction = VideoExtraction()
+
+    def prepare(self, item: dict) -> dict:
+        """
+            input (Parameter): One analysis request (url, language or languages, mode, force_regenerate).
+            Output: The checked request. Raises ValueError when it is not valid.
+        """
+        if not isinstance(item, dict):
+            raise ValueError("Every analysis must be a JSON object")
+        video_id = self.__video_extraction.get_video_id(url=str(item.get('url') or ''))
+        if not video_id:
+            raise ValueError("A valid YouTube 'url' is required")
+        languages = item.get('languages') or [item.get('language') or 'English']
+        if not isinstance(languages, list) or not all(isinstance(language, str) and language for language in languages):
+            raise ValueError("'languages' must be a list of language names")
+        unsupported = [language for language in languages if language not in LANGUAGES]
+        if unsupported:
+            raise ValueError(f"Unsupported languages: {', '.join(unsupported)} (supported: {', '.join(LANGUAGES)})")
+        # Same order, each language once
+        languages = list(dict.fromkeys(languages))
+        if len(languages) > API_MAX_LANGUAGES:
+            raise ValueError(f"At most {API_MAX_LANGUAGES} languages per analysis")
+        mode = item.get('mode') or STAGE2_MODE
+        if mode not in MODES:
+            raise ValueError(f"'mode' must be one of {', '.join(MODES)}")
+
+        return {'video_url': item['url'], 'video_id': video_id, 'languages': languages, 'mode': mode,
+                'force_regenerate': bool(item.get('force_regenerate'))}
+
+    def submit(self, request: dict, subscription: str) -> BackgroundJob:
+        """
+            input (Parameter): A request checked by prepare() and the subscription of the client.
+            Output: Its background job, the one already in flight for an identical request.
+        """
+        return submit_analysis(
+            llm=self.llm,
+            is_local_model=self.is_local_model,
+            **request,
+            llm_cache=self.llm_cache,
+            metadata_cache=self.metadata_cache,
+            duplicates=self.duplicates,
+            transcripts=self.transcripts,
+            owner=subscription
+        )
+
+
+def job_view(job: BackgroundJob) -> dict:
+    """
+        The job as returned by the API.
+    """
+    snapshot = job.snapshot()
+    meta_data = job.info.get('meta_data') or {}
+    return {
+        'job_id': snapshot['job_id'],
+        'state': snapshot['state'],
+        'stage': snapshot['stage'],
+        'stages': [stage for stage, _ in snapshot['stages']],
+        'video_id': job.info.get('video_id'),
+        'title': meta_data.get('title'),
+        'languages': job.info.get('languages'),
+        'mode': job.info.get('mode'),
+        'partial': snapshot['partial'],
+        'result': snapshot['result'],
+        'error': snapshot['error'],
+        'elapsed_seconds': round(snapshot['elapsed_seconds'], 3),
+    }
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, service: AnalysisService):
+        self.service = service
+
+    def write_error(self, status_code: int, **kwargs):
+        self.finish({'error': self._reason})
+
+    def get_job(self, job_id: str) -> BackgroundJob:
+        job = get_coordinator().get_job(job_id)
+        if job is None:
+            raise tornado.web.HTTPError(404, reason=f"Unknown job {job_id}")
+        return job
+
+
+class AnalyzeHandler(BaseHandler):
+    def post(self):
+        try:
+            body = json.loads(self.request.body or b'{}')
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="The body must be JSON")
+
+        batch = isinstance(body, dict) and 'items' in body
+        items = body['items'] if batch else [body]
+        if not isinstance(items, list) or not items:
+            raise tornado.web.HTTPError(400, reason="'items' must be a non-empty list")
+        if len(items) > API_MAX_BATCH:
+            raise tornado.web.HTTPError(400, reason=f"At most {API_MAX_BATCH} analyses per request")
+
+        # Everything is checked before anything is submitted, so a bad item does not leave half a batch running
+        requests = []
+        for number, item in enumerate(items):
+            try:
+                requests.append(self.service.prepare(item))
+            except ValueError as e:
+                raise tornado.web.HTTPError(400, reason=f"Item {number}: {e}" if batch else str(e))
+        # Only known to this client: what it submits, it alone can cancel
+        subscription = uuid.uuid4().hex
+        jobs = [self.service.submit(request, subscription) for request in requests]
+
+        self.set_status(202)
+        self.finish({'jobs': [job_view(job) for job in jobs], 'subscription': subscription} if batch
+                    else {**job_view(jobs[0]), 'subscription': subscription})
+
+
+class JobHandler(BaseHandler):
+    def get(self, job_id: str):
+        self.finish(job_view(self.get_job(job_id)))
+
+    def delete(self, job_id: str):
+        job = self.get_job(job_id)
+        # Identical requests of other clients and app sessions share the job: only the caller's subscription is dropped
+        subscription = self.get_argument('subscription', None)
+        if not subscription or not job.cancel(subscription):
+            raise tornado.web.HTTPError(403, reason="'subscription' does not match a submission of this job")
+        self.finish(job_view(job))
+
+
+class JobStreamHandler(BaseHandler):
+    async def get(self, job_id: str):
+        job = self.get_job(job_id)
+        self.set_header('Content-Type', 'text/event-stream')
+        self.set_header('Cache-Control', 'no-cache')
+        stages_sent, sections_sent = 0, set()
+        try:
+            while True:
+                finished = job.is_finished
+                snapshot = job.snapshot()
+                for stage, _ in snapshot['stages'][stages_sent:]:
+                    self.__event('stage', {'stage': stage})
+                stages_sent = len(snapshot['stages'])
+                for section, value in snapshot['partial'].items():
+                    if section not in sections_sent:
+                        sections_sent.add(section)
+                        self.__event('section', {'section': section, 'value': value})
+                if finished:
+                    self.__event(snapshot['state'], job_view(job))
+                    break
+                await self.flush()
+                await asyncio.sleep(API_STREAM_POLL_SECONDS)
+            self.finish()
+        except StreamClosedError:
+            pass  # The client went away; the job goes on
+
+    def __event(self, name: str, data: dict):
+        self.write(f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n")
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.finish({'status': 'ok', **get_coordinator().stats(), 'models': backend_stats()})
+
+
+def make_app(service: AnalysisService) -> tornado.web.Application:
+    arguments = {'service': service}
+    return tornado.web.Application([
+        (r"/analyze", AnalyzeHandler, arguments),
+        (r"/jobs/([0-9a-f]+)", JobHandler, arguments),
+        (r"/jobs/([0-9a-f]+)/stream", JobStreamHandler, arguments),
+        (r"/health", HealthHandler, arguments),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP API of the YouTube SEO pipeline.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--backend", choices=["local", "huggingface"], default="local")
+    parser.add_argument("--api-key", default=os.environ.get("HUGGING_FACE_TOKEN", HUGGINGFACE_API_KEY), help="HuggingFace API key")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk metadata and LLM caches nor the near-duplicate index")
+    args = parser.parse_args(argv)
+
+    from utils.model_handler import get_ollama_model, get_huggingface_model
+    if args.backend == "local":
+        llm, is_local_model = get_ollama_model(), True
+    else:
+        if not args.api_key:
+            parser.error("--api-key (or HUGGING_FACE_TOKEN) is required for the huggingface backend")
+        llm, is_local_model = get_huggingface_model(args.api_key), False
+
+    service = AnalysisService(
+        llm=llm,
+        is_local_model=is_local_model,
+        llm_cache=None if args.no_cache else LLMCache(),
+        metadata_cache=None if args.no_cache else MetaDataCache(),
+        duplicates=None if args.no_cache or not NEAR_DUPLICATE_REUSE else NearDuplicateIndex(),
+        transcripts=TranscriptStore()
+    )
+    make_app(service).listen(args.port, address=args.host)
+    print(f"Serving the SEO API on http://{args.host}:{args.port}")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,17 @@ from utils.video_extraction import VideoExtraction
 from utils.analysis import Analysis
 from utils.model_handler import get_ollama_model
 import streamlit as st
-import os
-from huggingface_hub import InferenceClient
-from utils.model_handler import HuggingFaceModel
-from utils.config import HUGGINGFACE_API_KEY
+import os, uuid
+from utils.model_handler import get_huggingface_model, backend_stats
+from utils.jobs import get_coordinator
+from utils.analysis_job import submit_analysis, ANALYSIS_STAGES
+from utils.config import HUGGINGFACE_API_KEY, TRACE_METRICS_PORT, JOB_POLL_SECONDS, NEAR_DUPLICATE_REUSE, SPECULATION, LANGUAGES
+from utils.cache import MetaDataCache, LLMCache
+from utils.near_duplicates import NearDuplicateIndex
+from utils.transcript_store import TranscriptStore
+from utils.result_store import ResultStore
+from utils.speculation import Speculator
+from utils import tracing
 
 
 api_token = HUGGINGFACE_API_KEY
@@ -15,6 +22,127 @@ is_local_model = False
 if "llm" not in st.session_state:
     st.session_state.llm = None
 
+if "traces" not in st.session_state:
+    st.session_state.traces = {}
+
+
+@st.cache_resource
+def get_metadata_cache():
+    # One on-disk cache per process, shared by every session and kept across restarts
+    return MetaDataCache()
+
+
+@st.cache_resource
+def get_llm_cache():
+    return LLMCache()
+
+
+@st.cache_resource
+def get_transcript_store():
+    # Sessions only keep the small part of the meta data, the transcripts are kept here once per video
+    return TranscriptStore()
+
+
+@st.cache_resource
+def get_result_store():
+    # Recommendations of every session, the sessions only keep their key
+    return ResultStore()
+
+
+@st.cache_resource
+def get_duplicate_index():
+    # Transcripts analyzed so far, to reuse their analysis for re-uploads and mirrors
+    return NearDuplicateIndex() if NEAR_DUPLICATE_REUSE else None
+
+
+@st.cache_resource
+def get_speculator():
+    # Fetch and stage-1 analysis started as soon as a valid URL is entered
+    return Speculator(llm_cache=get_llm_cache(), metadata_cache=get_metadata_cache(), duplicates=get_duplicate_index(),
+                      transcripts=get_transcript_store()) if SPECULATION else None
+
+
+@st.cache_resource
+def start_metrics_server():
+    # Prometheus endpoint, started once per process when a port is configured
+    return tracing.start_metrics_server(TRACE_METRICS_PORT) if TRACE_METRICS_PORT else None
+
+
+def counter_total(counters: dict, name: str, *labels) -> float:
+    # Trace counters are keyed as name{label=value,...}
+    return sum(value for key, value in counters.items() if key.split("{")[0] == name and all(label in key for label in labels))
+
+
+def render_trace_panel(container):
+    """
+        Compact breakdown of the last fetch and the last analysis: time per stage, tokens,
+        cache hits and parse failures.
+    """
+    traces = st.session_state.get('traces', {})
+    if not traces:
+        return
+    with container.container():
+        st.subheader("Last Run")
+        for summary in traces.values():
+            stages = {}
+            for span in summary['spans']:
+                if span.get('parent') is None and span['name'] != 'llm_call':
+                    stages[span['name']] = stages.get(span['name'], 0.0) + span['seconds']
+            st.caption(f"**{summary['name']}** · {summary['total_seconds']:.2f}s")
+            st.dataframe([{'stage': name, 'ms': round(seconds * 1000)} for name, seconds in stages.items()], hide_index=True, use_container_width=True)
+
+            counters = summary['counters']
+            llm_calls = [span for span in summary['spans'] if span['name'] == 'llm_call']
+            details = []
+            if llm_calls:
+                completion_tokens = sum(span.get('completion_tokens', 0) for span in llm_calls)
+                llm_seconds = sum(span['seconds'] for span in llm_calls)
+                prompt_tokens = sum(span.get('prompt_tokens', 0) for span in llm_calls)
+                details.append(f"{len(llm_calls)} LLM calls, {prompt_tokens} → {completion_tokens} tokens, {completion_tokens / llm_seconds if llm_seconds else 0:.0f} tok/s")
+            hits, misses = counter_total(counters, 'cache_requests_total', 'result=hit'), counter_total(counters, 'cache_requests_total', 'result=miss')
+            if hits or misses:
+                details.append(f"cache {hits:.0f} hits / {misses:.0f} misses")
+            raw_tokens = counter_total(counters, 'transcript_tokens_total', 'stage=raw')
+            if raw_tokens:
+                clean_tokens = counter_total(counters, 'transcript_tokens_total', 'stage=clean')
+                details.append(f"transcript clean-up {raw_tokens:.0f} → {clean_tokens:.0f} tokens ({1 - clean_tokens / raw_tokens:.0%} less)")
+            if counter_total(counters, 'parse_failures_total'):
+                details.append(f"{counter_total(counters, 'parse_failures_total'):.0f} parse failures")
+            if details:
+                st.caption(" · ".join(details))
+        st.download_button("Prometheus metrics", tracing.render_prometheus(), file_name="metrics.prom", mime="text/plain")
+
+
+def render_queue_panel(container):
+    """
+        LLM calls running and queued per backend across every session, the health of the
+        model backends, and the identical requests that joined a job already in flight.
+    """
+    stats = get_coordinator().stats()
+    health = backend_stats()
+    if not stats['backends'] and not stats['coalesced_jobs'] and not health:
+        return
+    with container.container():
+        st.subheader("Server Load")
+        for backend, queue in stats['backends'].items():
+            st.caption(
+                f"**{backend}** · {queue['running']}/{queue['limit']} running, {queue['queued']} queued · "
+                f"wait {queue['avg_wait_seconds']:.1f}s avg, {queue['max_wait_seconds']:.1f}s max"
+            )
+        for backend, model in health.items():
+            if model['failures'] or model['fallbacks'] or not model['healthy']:
+                st.caption(
+                    f"**{backend}** {'⚠️ skipped for now' if not model['healthy'] else 'healthy'} · {model['failures']}/{model['calls']} calls failed · "
+                    f"{model['retries']} retries · {model['fallbacks']} sent to fallback · p95 {model['p95_seconds']:.1f}s"
+                )
+        st.caption(f"{stats['in_flight_jobs']} jobs in flight · {stats['coalesced_jobs']} identical requests joined")
+        speculation = get_speculator().stats() if get_speculator() is not None else None
+        if speculation and speculation['started']:
+            st.caption(
+                f"Prefetch: {speculation['used']}/{speculation['started']} used ({speculation['hit_rate']:.0%}) · "
+                f"{speculation['cancelled']} cancelled · {speculation['skipped']} skipped"
+            )
+
 
 st.set_page_config(page_title="Youtube Video SEO Optimizer", layout="wide", initial_sidebar_state="expanded")
 
@@ -134,8 +262,24 @@ with st.sidebar:
     
     st.divider()
     st.subheader("Language Settings")
-    LANGUAGES = ['English', 'Hindi']
     selected_language = st.selectbox("Select Language", LANGUAGES, index=0)
+    all_languages = st.checkbox("Generate every language at once", value=False, help="The video is analyzed once and the recommendations of every language are generated together; switch the language above to see them")
+
+    st.divider()
+    st.subheader("Generation Settings")
+    GENERATION_MODES = {'Single request': 'single', 'Parallel sections': 'parallel'}
+    selected_mode = st.selectbox(
+        "Generation Mode",
+        list(GENERATION_MODES),
+        index=0,
+        help="Parallel sections asks for titles, tags, description and timestamps at the same time"
+    )
+    generation_mode = GENERATION_MODES[selected_mode]
+
+    st.divider()
+    # Filled at the end of the script, once this run's traces are known
+    trace_panel = st.empty()
+    queue_panel = st.empty()
 
     st.divider()
     st.subheader("About")
@@ -152,8 +296,7 @@ if model == 'Local Model':
     is_local_model = True
 else:
     if api_token:
-        client = InferenceClient(model="mistralai/Mistral-7B-Instruct-v0.3", token=api_token)
-        st.session_state.llm = HuggingFaceModel(client)
+        st.session_state.llm = get_huggingface_model(api_token)
 
 # Main Content
 st.title("Youtube SEO Optimizer")
@@ -163,32 +306,104 @@ st.write('''
 video_url = st.text_input("Enter video URL here...", placeholder="https://www.youtube.com/watch?v=...")
 submit_button = st.button("Enter")  
 
+if 'session_key' not in st.session_state:
+    # Identifies the session's speculative work (utils/speculation.py) and its background analysis.
+    # Kept in the URL with the job, so a refreshed page still owns (and can cancel) the analysis
+    st.session_state.session_key = st.query_params.get('session') or uuid.uuid4().hex
+
+if get_speculator() is not None:
+    # The video is fetched and analyzed while the user reads its info; Generate then only waits for stage 2
+    speculative_id = VideoExtraction().get_video_id(url=video_url)
+    if speculative_id and st.session_state.llm:
+        get_speculator().start(st.session_state.llm, is_local_model, video_url, speculative_id, owner=st.session_state.session_key)
+    elif not speculative_id:
+        get_speculator().release(st.session_state.session_key)
+
 if 'analysis_complete' not in st.session_state:
     st.session_state.analysis_complete = False
 
-if 'analysis_result' not in st.session_state:
-    st.session_state.analysis_result = None
-
 if 'meta_data' not in st.session_state:
     st.session_state.meta_data = {}
 
 if 'video_url' not in st.session_state:
     st.session_state.video_url = None
 
+
+def current_job():
+    """
+        The background analysis started from this page, if it is still known.
+    """
+    job_id = st.session_state.get('job_id')
+    return get_coordinator().get_job(job_id) if job_id else None
+
+
+if 'job_id' not in st.session_state:
+    # A refreshed page starts a new session; the id in the URL brings back its running analysis
+    st.session_state.job_id = st.query_params.get('job')
+    reattached_job = current_job()
+    if reattached_job is None:
+        st.session_state.job_id = None
+        st.query_params.pop('job', None)
+        st.query_params.pop('session', None)
+    elif not st.session_state.meta_data:
+        st.session_state.meta_data = reattached_job.info.get('meta_data') or {}
+        st.session_state.video_url = reattached_job.info.get('video_url')
+
+if 'transcript' in st.session_state.meta_data and st.session_state.meta_data.get('video_id'):
+    # Meta data that still holds its transcript (from a job submitted without the transcript store): the transcript moves to the store
+    st.session_state.meta_data = get_transcript_store().put(st.session_state.meta_data)
+
+def full_meta_data() -> dict:
+    """
+        Meta data of the current video with its transcript, fetched again if the transcript
+        is no longer in the store.
+    """
+    meta_data = get_transcript_store().restore(st.session_state.meta_data)
+    if meta_data is None:
+        meta_data = VideoExtraction(cache=get_metadata_cache()).get_meta_data(video_id=st.session_state.meta_data['video_id'])
+        st.session_state.meta_data = get_transcript_store().put(meta_data)
+    return meta_data
+
+
+@st.fragment
+def transcript_pages(video_id: str):
+    """
+        The full transcript, one page at a time: only the page shown is sent to the browser,
+        and turning pages only runs this part of the script again.
+    """
+    text, pages = get_transcript_store().page(video_id, st.session_state.get('transcript_page', 1))
+    if not pages:
+        st.caption("The transcript is no longer available, enter the video URL again to see it.")
+        return
+    if pages > 1:
+        st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key='transcript_page')
+    st.markdown(f"<div class='transcript-snippet'>{text}</div>", unsafe_allow_html=True)
+
+
 tab1, tab2 = st.tabs(['Video Info', 'SEO Recommendations'])
 
 with tab1:
     if submit_button and video_url:
         st.session_state.video_url = video_url
         try:
-            video_extraction = VideoExtraction()
+            video_extraction = VideoExtraction(cache=get_metadata_cache())
             with st.spinner("Fetching video information..."):
                 platform = video_extraction.get_platform(url=video_url)
                 if platform:
                     video_id = video_extraction.get_video_id(url=video_url)
                     if video_id:
-                        meta_data = video_extraction.get_meta_data(video_id=video_id)
+                        # Already fetched (and put in the transcript store) when the URL was entered
+                        meta_data = get_speculator().meta_data(video_id) if get_speculator() is not None else None
+                        if meta_data is None:
+                            with tracing.trace("fetch_video", video_id=video_id) as run_trace:
+                                # Sessions asking for the same video at the same time share one fetch
+                                meta_data = get_coordinator().run(("fetch", video_id), video_extraction.get_meta_data, video_id=video_id)
+                            st.session_state.traces['fetch'] = run_trace.summary()
+                            meta_data = get_transcript_store().put(meta_data) if meta_data else meta_data
                         if meta_data:
+                            if meta_data.get('video_id') != st.session_state.meta_data.get('video_id'):
+                                get_result_store().clear(st.session_state.session_key)
+                                st.session_state.pop('transcript_page', None)
                             st.session_state.meta_data = meta_data
                         else:
                             st.warning("Could not extract video metadata.")
@@ -206,7 +421,7 @@ with tab1:
         duration = st.session_state.meta_data.get('duration') // 60
         views = st.session_state.meta_data.get('views')
         author = st.session_state.meta_data.get('author')
-        transcript = st.session_state.meta_data.get('transcript', "")
+        transcript_preview = st.session_state.meta_data.get('transcript_preview', "")
         thumbnail_url = st.session_state.meta_data.get('thumbnail_url')
 
         st.write(f"""<h4 class="platform">{platform}</h4>""", unsafe_allow_html=True)
@@ -253,18 +468,131 @@ with tab1:
         # Transcript snippet
         st.markdown(f"""
         <div class="transcript-title">Transcript:</div>
-        <div class="transcript-snippet">{transcript[:500]}...</div>
+        <div class="transcript-snippet">{transcript_preview}...</div>
         """, unsafe_allow_html=True)
 
         # Full transcript in expander
         with st.expander("Read more"):
-            st.markdown(f"<div class='transcript-snippet'>{transcript}</div>", unsafe_allow_html=True)
+            transcript_pages(st.session_state.meta_data['video_id'])
         
         st.image(thumbnail_url, width=600)
     # else:
     #     st.warning("Video metadata could not be retrieved.")
                             
 
+def get_analysis():
+    return Analysis(llm=st.session_state.llm, is_local_model=is_local_model, cache=get_llm_cache(), duplicates=get_duplicate_index())
+
+
+SEO_TABS = ['🏆 Titles', '📝 Description', '🔥 Tags/Hashtags', '⏱️ Timestamps']
+
+
+def render_titles(titles):
+    st.subheader("🏆 Best Titles")
+    for item in titles.values():
+        st.write(item['rank'], ": ", item['title'])
+
+
+def render_description(description):
+    st.subheader("📝 Description")
+    st.markdown(f"\n{description}\n")
+
+
+def render_tags(tags_data):
+    st.subheader("🔥 Trending Tags / Hashtags")
+    if isinstance(tags_data, dict):
+        hashtags = " ".join([f"`#{tag}`" for tag in tags_data.values()])
+    elif isinstance(tags_data, list):
+        hashtags = " ".join([f"`#{tag}`" for tag in tags_data])
+    else:
+        hashtags = ""
+    st.markdown(hashtags)
+
+
+def render_timestamps(timestamps):
+    st.subheader("⏱️ Video Chapters")
+    for i, item in enumerate(timestamps.values(), start=1):
+        st.markdown(f"`{item['time']}` — {item['description']}")
+
+
+SECTION_RENDERERS = {
+    'title': render_titles,
+    'description': render_description,
+    'tags': render_tags,
+    'timestamp': render_timestamps,
+}
+
+
+def finish_job(job):
+    """
+        Move the outcome of a finished background analysis into the session.
+    """
+    snapshot = job.snapshot()
+    if snapshot['state'] == 'done':
+        get_result_store().update(st.session_state.session_key, snapshot['result'] or {})
+        st.session_state.analysis_complete = True
+        st.session_state.last_run_metrics = job.info.get('metrics', {})
+        if job.info.get('trace'):
+            st.session_state.traces['analysis'] = job.info['trace']
+    elif snapshot['state'] == 'failed':
+        st.session_state.job_message = ('error', f"⚠️ Error generating recommendations: {snapshot['error']}")
+    else:
+        st.session_state.job_message = ('info', "Generation cancelled.")
+    forget_job()
+
+
+def forget_job():
+    """
+        The page no longer follows its background analysis.
+    """
+    st.session_state.job_id = None
+    st.query_params.pop('job', None)
+    st.query_params.pop('session', None)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress():
+    """
+        Poll the background analysis: current stage, sections ready so far and a cancel button.
+        Once the job is over the whole page runs again to show its outcome.
+    """
+    job = current_job()
+    if job is None or job.is_finished:
+        if job is not None:
+            finish_job(job)
+        else:
+            forget_job()
+        st.rerun()
+
+    snapshot = job.snapshot()
+    stage = snapshot['stage']
+    if snapshot['state'] == 'queued':
+        text = "Waiting for a free worker..."
+    else:
+        text = " → ".join(f"**{name}**" if name == stage else name for name in ANALYSIS_STAGES)
+    queued = sum(queue['queued'] for queue in get_coordinator().stats()['backends'].values())
+    text += f" · {snapshot['elapsed_seconds']:.0f}s" + (f" · {queued} model requests queued" if queued else "")
+    position = ANALYSIS_STAGES.index(stage) if stage in ANALYSIS_STAGES else 0
+    st.progress(position / len(ANALYSIS_STAGES), text=text)
+
+    if st.button("Cancel", key="cancel_job"):
+        # Only this page lets go: the job stops once no other session or API client waits for it
+        job.cancel(st.session_state.session_key)
+        st.session_state.job_message = ('info', "Generation cancelled.")
+        forget_job()
+        st.rerun()
+
+    # Sections are shown as soon as the model finishes each of them
+    partial = snapshot['partial']
+    if partial:
+        for tab, section in zip(st.tabs(SEO_TABS), SECTION_RENDERERS):
+            with tab:
+                if section in partial:
+                    SECTION_RENDERERS[section](partial[section])
+                else:
+                    st.caption("Not ready yet...")
+
+
 with tab2:
     # st.header("SEO Recommendations")
     st.markdown("""
@@ -303,54 +631,91 @@ with tab2:
     """, unsafe_allow_html=True)
 
 
+    job = current_job()
     if st.session_state.meta_data:
-        if st.button("Generate SEO Recommendations"):
-            with st.spinner("Analyzing video and generating recommendations..."):
-                try:
-                    # ollama_model = get_ollama_model()
-                    if not st.session_state.llm:
-                        st.error(f"⚠️ Please enter API Key First")
-
-                    analysis = Analysis(llm=st.session_state.llm, is_local_model=is_local_model)
-                    result = analysis.seo_analysis(video_url=st.session_state.video_url, meta_data=st.session_state.meta_data, language=selected_language)
-                    st.session_state.analysis_result = result
-                    st.session_state.analysis_complete = True
-                    # st.success("✅ SEO Recommendations generated successfully!")
-                except Exception as e:
-                    st.error(f"⚠️ Error generating recommendations: {e}")
+        force_regenerate = st.checkbox("Force regenerate", value=False, help="Ignore previously generated recommendations for this video")
+        if job is None and st.button("Generate SEO Recommendations"):
+            if not st.session_state.llm:
+                st.error(f"⚠️ Please enter API Key First")
+            else:
+                # Runs in the background: reruns of this page do not interrupt it
+                job = submit_analysis(
+                    llm=st.session_state.llm,
+                    is_local_model=is_local_model,
+                    video_url=st.session_state.video_url,
+                    video_id=st.session_state.meta_data.get('video_id'),
+                    meta_data=st.session_state.meta_data,
+                    languages=LANGUAGES if all_languages else [selected_language],
+                    mode=generation_mode,
+                    force_regenerate=force_regenerate,
+                    llm_cache=get_llm_cache(),
+                    metadata_cache=get_metadata_cache(),
+                    duplicates=get_duplicate_index(),
+                    transcripts=get_transcript_store(),
+                    speculator=get_speculator(),
+                    owner=st.session_state.session_key
+                )
+                st.session_state.job_id = job.job_id
+                st.query_params['job'] = job.job_id
+                st.query_params['session'] = st.session_state.session_key
+        if job is not None:
+            job_progress()
 
     else:
         st.info("🔹 Please enter a valid video URL in the 'Video Info' tab first.")
 
-    if st.session_state.analysis_complete and st.session_state.analysis_result:
+    if st.session_state.get('job_message'):
+        level, message = st.session_state.pop('job_message')
+        getattr(st, level)(message)
+
+    if st.session_state.get('last_run_metrics', {}).get('time_to_first_section') is not None:
+        metrics = st.session_state.last_run_metrics
+        st.caption(f"First recommendation after {metrics['time_to_first_section']:.1f}s, all done after {metrics['total_seconds']:.1f}s"
+                   + (" · video analyzed in advance" if metrics.get('stage1_reused') else ""))
+
+    near_duplicate = st.session_state.get('last_run_metrics', {}).get('near_duplicate')
+    if job is None and near_duplicate:
+        st.caption(f"Video analysis reused from [{near_duplicate['video_id']}](https://youtu.be/{near_duplicate['video_id']}), "
+                   f"{near_duplicate['similarity']:.0%} similar transcript. Tick *Force regenerate* to analyze this video on its own.")
+
+    # Recommendations of the current video, per language
+    analysis_results = get_result_store().get(st.session_state.session_key)
+    other_languages = [language for language in analysis_results if language != selected_language]
+    if job is None and other_languages:
+        # Already generated, switching the language shows them without calling the model again
+        st.caption(f"Also generated in {', '.join(other_languages)}: switch the language in the sidebar to see them.")
+
+    if job is None and st.session_state.analysis_complete and analysis_results.get(selected_language):
         # st.subheader("SEO Suggestions")
         # st.write(st.session_state.analysis_result)
-        if st.session_state.analysis_result:
-            result = st.session_state.analysis_result
-
-            title_tab, description_tab, tags_tab, timestamp_tab = st.tabs(['🏆 Titles', '📝 Description', '🔥 Tags/Hashtags', '⏱️ Timestamps'])
-
-            with title_tab:
-                st.subheader("🏆 Best Titles")
-                for item in result['title'].values():
-                    st.write(item['rank'], ": ", item['title'])
-
-            with description_tab:
-                st.subheader("📝 Description")
-                st.markdown(f"\n{result['description']}\n")
-
-            with tags_tab:
-                st.subheader("🔥 Trending Tags / Hashtags")
-                tags_data = result['tags']
-                if isinstance(tags_data, dict):
-                    hashtags = " ".join([f"`#{tag}`" for tag in tags_data.values()])
-                elif isinstance(tags_data, list):
-                    hashtags = " ".join([f"`#{tag}`" for tag in tags_data])
-                else:
-                    hashtags = ""
-                st.markdown(hashtags)
+        if analysis_results.get(selected_language):
+            result = analysis_results[selected_language]
 
-            with timestamp_tab:
-                st.subheader("⏱️ Video Chapters")
-                for i, item in enumerate(result['timestamp'].values(), start=1):
-                    st.markdown(f"`{item['time']}` — {item['description']}")
+            for tab, section in zip(st.tabs(SEO_TABS), SECTION_RENDERERS):
+                with tab:
+                    if result.get(section):
+                        SECTION_RENDERERS[section](result[section])
+                    else:
+                        st.warning("⚠️ This section could not be generated, please try again.")
+
+                    # Only this section is generated again, the others are kept as they are
+                    if st.button("🔄 Regenerate", key=f"regenerate_{section}"):
+                        with st.spinner("Regenerating..."):
+                            try:
+                                analysis = get_analysis()
+                                with tracing.trace("regenerate_section", section=section) as run_trace:
+                                    value = analysis.regenerate_section(section, video_url=st.session_state.video_url, meta_data=full_meta_data(), language=selected_language)
+                                st.session_state.traces['analysis'] = run_trace.summary()
+                                # The timings of the full run no longer describe what is shown
+                                st.session_state.last_run_metrics = analysis.last_run_metrics
+                            except Exception as e:
+                                value = None
+                                st.error(f"⚠️ Error regenerating: {e}")
+                        if value is not None:
+                            get_result_store().update(st.session_state.session_key, {selected_language: {**result, section: value}})
+                            st.rerun()
+
+# Sidebar trace panel and metrics endpoint
+start_metrics_server()
+render_trace_panel(trace_panel)
+render_queue_panel(queue_panel)
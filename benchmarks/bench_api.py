@@ -0,0 +1,217 @@
+"""
+    Throughput of the HTTP API (api.py) against driving the Streamlit app for the same
+    analyses: every fixture video in English and Hindi, in single and parallel mode, against
+    the local YouTube stand-in and the stub LLM.
+
+    - API: the server runs in its own process; a client submits with POST /analyze and
+      reads GET /jobs/{id}/stream until the job is over. Measured with one client and with
+      --clients clients at the same time.
+    - App: every request is a new Streamlit session (AppTest) that enters the URL, picks the
+      language and mode, clicks Generate and reruns every JOB_POLL_SECONDS, as the page does,
+      until the recommendations are shown. AppTest runs one session at a time per process,
+      so the app is only measured with one client.
+
+    Both sides use the same caches (in an empty directory) and the same job coordinator
+    settings, so the difference is the interface. Reports completed analyses per minute and
+    latency percentiles per side.
+
+    Usage:
+        python -m benchmarks.bench_api [--clients 4] [--rounds 1] [--token-latency 0.002] [--json]
+"""
+import argparse, json, os, queue, subprocess, sys, tempfile, threading, time
+import requests
+from benchmarks.fixtures import SIZES, video_id_for
+from benchmarks.youtube_stub import running_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SETUP = """
+import json, logging, sys
+import utils.config
+utils.config.YOUTUBE_BASE_URL = %(base_url)r
+utils.config.CACHE_DIR = %(cache_dir)r
+logging.getLogger("youtube_seo.trace").disabled = True
+from benchmarks.stub_llm import StubLLM
+llm = StubLLM(prefill_latency=%(prefill_latency)r, token_latency=%(token_latency)r, max_concurrency=%(server_slots)d)
+"""
+
+_API_SERVER = _SETUP + """
+import socket, tornado.ioloop
+from api import AnalysisService, make_app
+from utils.cache import LLMCache, MetaDataCache
+from utils.near_duplicates import NearDuplicateIndex
+from utils.transcript_store import TranscriptStore
+service = AnalysisService(llm, False, llm_cache=LLMCache(), metadata_cache=MetaDataCache(), duplicates=NearDuplicateIndex(), transcripts=TranscriptStore())
+sock = socket.socket(); sock.bind(("127.0.0.1", 0)); port = sock.getsockname()[1]; sock.close()
+make_app(service).listen(port, address="127.0.0.1")
+print(port, flush=True)
+tornado.ioloop.IOLoop.current().start()
+"""
+
+_APP_CLIENTS = _SETUP + """
+import queue, time
+from streamlit.testing.v1 import AppTest
+from utils.config import JOB_POLL_SECONDS
+work, records = queue.Queue(), []
+for item in %(items)r:
+    work.put(item)
+
+def client():
+    while True:
+        try:
+            item = work.get_nowait()
+        except queue.Empty:
+            return
+        started = time.perf_counter()
+        try:
+            at = AppTest.from_file("app.py", default_timeout=120)
+            at.session_state["llm"] = llm
+            at.run()
+            at.text_input[0].input(item["url"])
+            [button for button in at.button if button.label == "Enter"][0].click()
+            at.run()
+            [box for box in at.sidebar.selectbox if box.label == "Select Language"][0].select(item["languages"][0])
+            [box for box in at.sidebar.selectbox if box.label == "Generation Mode"][0].select(item["mode_label"])
+            [button for button in at.button if button.label == "Generate SEO Recommendations"][0].click()
+            at.run()
+            while at.session_state["job_id"] is not None:
+                time.sleep(JOB_POLL_SECONDS)
+                at.run()
+            ok = bool(at.session_state["analysis_results"].get(item["languages"][0]))
+            record = {"status": "ok" if ok else "error", "error": None if ok else "no result"}
+        except Exception as e:
+            record = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        record["seconds"] = time.perf_counter() - started
+        records.append(record)
+
+# AppTest sessions of one process cannot run at the same time: one client only
+started = time.perf_counter()
+client()
+print(json.dumps({"records": records, "elapsed": time.perf_counter() - started}))
+"""
+
+MODE_LABELS = {"single": "Single request", "parallel": "Parallel sections"}
+
+
+def make_items(fixtures: list, rounds: int) -> list:
+    return [
+        {"url": f"https://www.youtube.com/watch?v={video_id_for(name)}", "languages": [language], "mode": mode, "mode_label": MODE_LABELS[mode]}
+        for _ in range(rounds)
+        for name in fixtures
+        for language in ("English", "Hindi")
+        for mode in MODE_LABELS
+    ]
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))] if values else 0.0
+
+
+def summary(records: list, elapsed: float) -> dict:
+    ok = [record["seconds"] for record in records if record["status"] == "ok"]
+    return {
+        "completed": len(ok),
+        "errors": len(records) - len(ok),
+        "elapsed_seconds": round(elapsed, 2),
+        "analyses_per_minute": round(len(ok) / elapsed * 60, 1) if elapsed else 0.0,
+        "p50_seconds": round(percentile(ok, 0.5), 2),
+        "p95_seconds": round(percentile(ok, 0.95), 2),
+    }
+
+
+def api_request(base: str, item: dict) -> dict:
+    """
+        Submit one analysis and follow its event stream until the job is over.
+    """
+    started = time.perf_counter()
+    try:
+        response = requests.post(f"{base}/analyze", json={key: item[key] for key in ("url", "languages", "mode")}, timeout=30)
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        state = None
+        with requests.get(f"{base}/jobs/{job_id}/stream", stream=True, timeout=300) as stream:
+            for line in stream.iter_lines(decode_unicode=True):
+                if line.startswith("event: ") and line[7:] in ("done", "failed", "cancelled"):
+                    state = line[7:]
+                    break
+        record = {"status": "ok" if state == "done" else "error", "error": None if state == "done" else state}
+    except Exception as e:
+        record = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    record["seconds"] = time.perf_counter() - started
+    return record
+
+
+def run_api(settings: dict, items: list, clients: int) -> dict:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = subprocess.Popen([sys.executable, "-c", _API_SERVER % {**settings, "cache_dir": cache_dir}], cwd=ROOT,
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            base = f"http://127.0.0.1:{server.stdout.readline().strip()}"
+            work, records, lock = queue.Queue(), [], threading.Lock()
+            for item in items:
+                work.put(item)
+
+            def client():
+                while True:
+                    try:
+                        item = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    record = api_request(base, item)
+                    with lock:
+                        records.append(record)
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=client) for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return summary(records, time.perf_counter() - started)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def run_app(settings: dict, items: list) -> dict:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        code = _APP_CLIENTS % {**settings, "cache_dir": cache_dir, "items": items}
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+    return summary(sample["records"], sample["elapsed"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=4, help="Clients sending requests at the same time")
+    parser.add_argument("--rounds", type=int, default=1, help="Times every analysis is requested")
+    parser.add_argument("--fixtures", nargs="+", choices=list(SIZES), default=["5min", "1h"])
+    parser.add_argument("--youtube-latency", type=float, default=0.05, help="Seconds the YouTube stand-in waits before every response")
+    parser.add_argument("--prefill-latency", type=float, default=0.0001, help="Stub LLM seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Stub LLM seconds per generated token")
+    parser.add_argument("--llm-server-slots", type=int, default=8, help="Requests the stub LLM server decodes at the same time")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    items = make_items(args.fixtures, args.rounds)
+    with running_server(latency=args.youtube_latency) as base_url:
+        settings = {"base_url": base_url, "prefill_latency": args.prefill_latency, "token_latency": args.token_latency,
+                    "server_slots": args.llm_server_slots}
+        results = {"requests": len(items), "runs": []}
+        for clients in sorted({1, args.clients}):
+            results["runs"].append({"interface": "api", "clients": clients, **run_api(settings, items, clients)})
+        results["runs"].append({"interface": "app", "clients": 1, **run_app(settings, items)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{len(items)} analyses")
+    print(f"{'interface':<11}{'clients':>8}{'done':>6}{'errors':>8}{'per min':>9}{'p50 s':>8}{'p95 s':>8}")
+    for row in results["runs"]:
+        print(f"{row['interface']:<11}{row['clients']:>8}{row['completed']:>6}{row['errors']:>8}{row['analyses_per_minute']:>9.1f}{row['p50_seconds']:>8.2f}{row['p95_seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+    Chapter detection over the timed transcript fixtures: detection time and how many
+    of the true topic changes are found within a tolerance.
+
+    Usage:
+        python -m benchmarks.bench_chapters [--seeds 7 8 9] [--tolerance 30] [--json]
+"""
+import argparse, json, time
+from benchmarks.fixtures import SIZES, make_transcript_events
+from utils.chapters import detect_chapters
+from utils.video_extraction import join_caption_events
+
+
+def run(name: str, duration: int, seed: int, tolerance: int) -> dict:
+    payload, boundaries = make_transcript_events(duration, seed=seed)
+    text, segments = join_caption_events(payload["events"])
+
+    started = time.perf_counter()
+    # Same chapter limit as the recommendation prompt
+    chapters = detect_chapters(text, segments, duration=duration, max_chapters=max(6, min(duration // 60 // 5, 60)))
+    seconds = time.perf_counter() - started
+
+    found = [chapter["start"] for chapter in chapters]
+    return {
+        "fixture": name,
+        "seed": seed,
+        "segments": len(segments["starts"]),
+        "true_chapters": len(boundaries),
+        "detected_chapters": len(found),
+        "recall": sum(any(abs(f - b) <= tolerance for f in found) for b in boundaries) / len(boundaries),
+        "precision": sum(any(abs(f - b) <= tolerance for b in boundaries) for f in found) / len(found) if found else 0.0,
+        "milliseconds": round(seconds * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[7, 8, 9])
+    parser.add_argument("--tolerance", type=int, default=30, help="Seconds a detected boundary may be off")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    rows = [run(name, duration, seed, args.tolerance) for name, duration in SIZES.items() for seed in args.seeds]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'fixture':<10}{'seed':>5}{'segments':>10}{'true':>6}{'found':>7}{'recall':>8}{'precision':>11}{'ms':>8}")
+    for row in rows:
+        print(
+            f"{row['fixture']:<10}{row['seed']:>5}{row['segments']:>10}{row['true_chapters']:>6}{row['detected_chapters']:>7}"
+            f"{row['recall']:>8.2f}{row['precision']:>11.2f}{row['milliseconds']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
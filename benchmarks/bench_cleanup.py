@@ -0,0 +1,71 @@
+"""
+    Transcript clean-up: tokens removed from each fixture transcript, time the clean-up
+    takes, and end-to-end latency of the pipeline with and without it (stub LLM with
+    per-token latency, so fewer prompt tokens show up as a shorter run).
+
+    Usage:
+        python -m benchmarks.bench_cleanup [--repeat 3] [--prefill-latency 0.0002] [--token-latency 0.001] [--json]
+"""
+import argparse, json, statistics, time
+from benchmarks.fixtures import SIZES, ensure_fixtures
+from benchmarks import bench_pipeline
+from utils.transcript_cleanup import TranscriptCleaner
+from utils.video_extraction import join_caption_events
+from utils import tracing
+
+
+def cleanup_stats(path: str, repeat: int) -> dict:
+    with open(path, encoding="utf-8") as file:
+        events = json.load(file)["events"]
+    seconds = []
+    for _ in range(repeat):
+        cleaner = TranscriptCleaner()
+        started = time.perf_counter()
+        join_caption_events(events, cleaner=cleaner)
+        seconds.append(time.perf_counter() - started)
+    stats = cleaner.stats()
+    stats["milliseconds"] = round(statistics.median(seconds) * 1000, 2)
+    stats["reduction"] = round(1 - stats["tokens_after"] / stats["tokens_before"], 3) if stats["tokens_before"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--prefill-latency", type=float, default=0.0002, help="Stub LLM seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.001, help="Stub LLM seconds per generated token")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    tracing.logger.disabled = True
+
+    paths = ensure_fixtures()
+    llm_options = {"prefill_latency": args.prefill_latency, "token_latency": args.token_latency}
+    end_to_end = {
+        cleanup: bench_pipeline.run(args.fixtures, args.repeat, llm_options, "single", 0.0, extraction_options={"cleanup": cleanup})
+        for cleanup in (False, True)
+    }
+
+    rows = []
+    for name in args.fixtures:
+        row = {"fixture": name, **cleanup_stats(paths[name]["transcript"], args.repeat)}
+        for cleanup, label in ((False, "raw"), (True, "clean")):
+            timings = end_to_end[cleanup][name]["timings"]
+            row[f"{label}_seconds"] = round(timings["get_meta_data"] + timings["seo_analysis"], 3)
+        row["latency_change"] = round(row["clean_seconds"] / row["raw_seconds"] - 1, 3) if row["raw_seconds"] else 0.0
+        rows.append(row)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'fixture':<9}{'tokens':>9}{'cleaned':>9}{'saved':>7}{'markers':>9}{'fillers':>9}{'repeats':>9}{'ms':>7}{'raw s':>8}{'clean s':>9}{'change':>8}")
+    for row in rows:
+        print(
+            f"{row['fixture']:<9}{row['tokens_before']:>9}{row['tokens_after']:>9}{row['reduction']:>7.0%}{row['markers']:>9}{row['fillers']:>9}"
+            f"{row['repeated_words']:>9}{row['milliseconds']:>7.1f}{row['raw_seconds']:>8.2f}{row['clean_seconds']:>9.2f}{row['latency_change']:>+8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
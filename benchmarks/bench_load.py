@@ -0,0 +1,219 @@
+"""
+    Load test: simulated users running the whole pipeline (VideoExtraction.get_meta_data ->
+    Analysis.seo_analysis) at the same time, against the local YouTube stand-in and the stub
+    LLM, without caches. The number of users is ramped up level by level; every level
+    reports throughput, latency percentiles, error rate, LLM queue wait and peak RSS.
+
+    A level is saturated when its p95 latency is more than --slo-factor times the p95 of
+    the first level, or its error rate is above --max-error-rate; the ramp stops at the
+    first saturated level (unless --keep-going) and the level before it is reported as the
+    most users the instance sustains.
+
+    Usage:
+        python -m benchmarks.bench_load [--users 1 2 4 8 16 32] [--duration 10] [--token-latency 0.002]
+                                        [--llm-server-slots 8] [--llm-slots 4] [--output load.json] [--json]
+"""
+import argparse, datetime, json, os, platform, resource, sys, threading, time
+from benchmarks.fixtures import SIZES, video_id_for
+from benchmarks.stub_llm import StubLLM
+from benchmarks.youtube_stub import running_server
+from utils.config import LLM_MAX_CONCURRENCY
+from utils.video_extraction import VideoExtraction
+from utils.analysis import Analysis
+from utils.jobs import get_coordinator
+from utils import tracing
+
+
+def current_rss() -> int:
+    """
+        Resident memory of the process in bytes (peak so far where /proc is not available).
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RSSSampler:
+    """
+        Highest resident memory seen while the block runs, sampled on a background thread.
+    """
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self.__stop = threading.Event()
+
+    def __sample(self):
+        while not self.__stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self.__stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self.__thread = threading.Thread(target=self.__sample, daemon=True)
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.__stop.set()
+        self.__thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def user(number: int, base_url: str, llm, video_ids: list, mode: str, deadline: float, think: float, records: list, lock: threading.Lock):
+    """
+        One simulated user: requests analyses back to back (with `think` seconds between
+        them) until the deadline; the request in progress at the deadline is finished.
+    """
+    extraction = VideoExtraction(base_url=base_url)
+    request = 0
+    while time.perf_counter() < deadline:
+        video_id = video_ids[(number + request) % len(video_ids)]
+        request += 1
+        record = {"video_id": video_id}
+        started = time.perf_counter()
+        try:
+            meta_data = extraction.get_meta_data(video_id=video_id)
+            if not meta_data:
+                raise ValueError("No meta data")
+            record["fetch"] = time.perf_counter() - started
+            analysis = Analysis(llm=llm, is_local_model=False)
+            result = analysis.seo_analysis(video_url=f"https://www.youtube.com/watch?v={video_id}", meta_data=meta_data, mode=mode)
+            if not result:
+                raise ValueError("No recommendation could be parsed")
+            record["status"] = "ok"
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record["seconds"] = time.perf_counter() - started
+        with lock:
+            records.append(record)
+        if think:
+            time.sleep(think)
+
+
+def run_level(users: int, args, base_url: str, llm) -> dict:
+    video_ids = [video_id_for(name) for name in args.fixtures]
+    records, lock = [], threading.Lock()
+    calls_before = get_coordinator().stats()["backends"].get("StubLLM", {}).get("calls", 0)
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    with RSSSampler() as rss:
+        threads = [
+            threading.Thread(target=user, args=(number, base_url, llm, video_ids, args.mode, deadline, args.think, records, lock), daemon=True)
+            for number in range(users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    ok = [record for record in records if record["status"] == "ok"]
+    latencies = [record["seconds"] for record in ok]
+    fetches = [record["fetch"] for record in records if "fetch" in record]
+    queue = get_coordinator().stats()["backends"].get("StubLLM", {})
+    errors = {}
+    for record in records:
+        if record["status"] == "error":
+            errors[record["error"]] = errors.get(record["error"], 0) + 1
+    return {
+        "users": users,
+        "requests": len(records),
+        "completed": len(ok),
+        "throughput_per_second": round(len(ok) / elapsed, 3),
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else 0.0,
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies, default=0.0), 3),
+        },
+        "fetch_p95_seconds": round(percentile(fetches, 0.95), 3),
+        "llm_calls": queue.get("calls", 0) - calls_before,
+        # Over the last calls of the level (utils/jobs.py keeps the most recent wait times)
+        "llm_avg_wait_seconds": round(queue.get("avg_wait_seconds", 0.0), 3),
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+        "elapsed_seconds": round(elapsed, 2),
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Concurrent users of each level of the ramp")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds new requests are started at each level")
+    parser.add_argument("--think", type=float, default=0.0, help="Seconds a user waits between two requests")
+    parser.add_argument("--fixtures", nargs="+", choices=list(SIZES), default=["5min", "1h"], help="Videos the users ask for, in turn")
+    parser.add_argument("--mode", choices=["single", "parallel"], default="single")
+    parser.add_argument("--youtube-latency", type=float, default=0.05, help="Seconds the YouTube stand-in waits before every response")
+    parser.add_argument("--prefill-latency", type=float, default=0.0001, help="Stub LLM seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Stub LLM seconds per generated token")
+    parser.add_argument("--llm-server-slots", type=int, default=8, help="Requests the stub LLM server decodes at the same time")
+    parser.add_argument("--llm-slots", type=int, default=None, help="LLM calls the app lets through at the same time (LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--slo-factor", type=float, default=3.0, help="p95 latency, relative to the first level, at which a level is saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate at which a level is saturated")
+    parser.add_argument("--keep-going", action="store_true", help="Run every level, even after saturation")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    tracing.logger.disabled = True
+
+    if args.llm_slots:
+        # Read when the coordinator is created, i.e. on the first LLM call
+        LLM_MAX_CONCURRENCY["StubLLM"] = args.llm_slots
+    llm = StubLLM(prefill_latency=args.prefill_latency, token_latency=args.token_latency, max_concurrency=args.llm_server_slots)
+
+    levels = []
+    with running_server(latency=args.youtube_latency) as base_url:
+        for users in args.users:
+            level = run_level(users, args, base_url, llm)
+            reference = levels[0]["latency_seconds"]["p95"] if levels else level["latency_seconds"]["p95"]
+            level["saturated"] = level["error_rate"] > args.max_error_rate or level["latency_seconds"]["p95"] > args.slo_factor * reference
+            levels.append(level)
+            if level["saturated"] and not args.keep_going:
+                break
+
+    sustained = None
+    for level in levels:
+        if level["saturated"]:
+            break
+        sustained = level["users"]
+
+    results = {
+        "benchmark": "load",
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "json")},
+        "levels": levels,
+        "max_sustained_users": sustained,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'users':>6}{'done':>7}{'req/s':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'errors':>8}{'LLM wait s':>12}{'RSS MB':>8}")
+    for level in levels:
+        latency = level["latency_seconds"]
+        print(
+            f"{level['users']:>6}{level['completed']:>7}{level['throughput_per_second']:>8.2f}{latency['p50']:>8.2f}{latency['p95']:>8.2f}"
+            f"{latency['p99']:>8.2f}{level['error_rate']:>8.1%}{level['llm_avg_wait_seconds']:>12.2f}{level['peak_rss_mb']:>8.1f}"
+            + ("  saturated" if level["saturated"] else "")
+        )
+    print(f"most users sustained: {sustained}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+    Near-duplicate index: signature time per transcript size, lookup time with an index of
+    --videos transcripts, and which variants of an indexed transcript are found (re-upload
+    with caption differences, clip, mirror with an extra intro) against unrelated videos.
+    Also the stage-1 calls saved on the re-upload with the stub LLM.
+
+    Usage:
+        python -m benchmarks.bench_near_duplicates [--videos 5000] [--lookups 2000] [--json]
+"""
+import argparse, json, os, random, statistics, tempfile, time
+from benchmarks.fixtures import TOPICS, COMMON_WORDS
+from benchmarks.stub_llm import StubLLM
+from utils.analysis import Analysis
+from utils.near_duplicates import NearDuplicateIndex
+from utils import tracing
+
+# Spoken words per minute of video
+WORDS_PER_MINUTE = 150
+
+
+def make_transcript(minutes: int, seed: int) -> list:
+    rng = random.Random(seed)
+    vocabulary = [word for words in TOPICS.values() for word in words.split()] + COMMON_WORDS
+    return [rng.choice(vocabulary) for _ in range(minutes * WORDS_PER_MINUTE)]
+
+
+def variants(words: list, seed: int) -> dict:
+    rng = random.Random(seed)
+    edited = [rng.choice(COMMON_WORDS) if rng.random() < 0.01 else word for word in words]
+    return {
+        "re-upload (1% words changed)": edited,
+        "clip (first 85%)": words[:int(len(words) * 0.85)],
+        "mirror (+10% intro)": make_transcript(max(1, len(words) // WORDS_PER_MINUTE // 10), seed + 1) + words,
+        "unrelated video": make_transcript(len(words) // WORDS_PER_MINUTE, seed + 2),
+    }
+
+
+def jaccard(a: list, b: list, n: int) -> float:
+    shingles_a = {" ".join(a[i:i + n]) for i in range(len(a) - n + 1)}
+    shingles_b = {" ".join(b[i:i + n]) for i in range(len(b) - n + 1)}
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=5000, help="Transcripts in the index")
+    parser.add_argument("--minutes", type=int, default=10, help="Length of the indexed transcripts")
+    parser.add_argument("--lookups", type=int, default=2000, help="Lookups timed")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    tracing.logger.disabled = True
+
+    results = {"signature_ms": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(path=os.path.join(directory, "index.sqlite3"), max_entries=args.videos + 10)
+        for minutes in (5, 60, 180):
+            text = " ".join(make_transcript(minutes, seed=minutes))
+            started = time.perf_counter()
+            index.signature(text)
+            results["signature_ms"][f"{minutes}min"] = round((time.perf_counter() - started) * 1000, 1)
+
+        originals = {}
+        started = time.perf_counter()
+        for i in range(args.videos):
+            words = make_transcript(args.minutes, seed=1000 + i)
+            if i < 20:
+                originals[f"video{i:05d}"] = words
+            index.add(f"video{i:05d}", index.signature(" ".join(words)), analysis=f"analysis of video {i}")
+        results["add_ms"] = round((time.perf_counter() - started) * 1000 / args.videos, 2)
+
+        started = time.perf_counter()
+        NearDuplicateIndex(path=index.path, max_entries=args.videos + 10)
+        results["load_seconds"] = round(time.perf_counter() - started, 3)
+
+        probes = [index.signature(" ".join(make_transcript(args.minutes, seed=10 ** 6 + i))) for i in range(20)]
+        probes += [index.signature(" ".join(words)) for words in originals.values()]
+        timings = []
+        for i in range(args.lookups):
+            started = time.perf_counter()
+            index.find(probes[i % len(probes)])
+            timings.append(time.perf_counter() - started)
+        results["lookup_us"] = {"median": round(statistics.median(timings) * 1e6, 1), "p99": round(sorted(timings)[int(len(timings) * 0.99)] * 1e6, 1)}
+
+        variant_rows = {}
+        for number, (video_id, words) in enumerate(originals.items()):
+            for name, variant in variants(words, seed=number).items():
+                match = index.find(index.signature(" ".join(variant)))
+                row = variant_rows.setdefault(name, {"found": 0, "jaccard": [], "estimated": []})
+                row["found"] += bool(match and match["video_id"] == video_id)
+                row["jaccard"].append(jaccard(words, variant, index.shingle_words))
+                row["estimated"].append(index.similarity(index.signature(" ".join(words)), index.signature(" ".join(variant))))
+        results["variants"] = {
+            name: {"found": f"{row['found']}/{len(originals)}", "jaccard": round(statistics.mean(row["jaccard"]), 3),
+                   "estimated": round(statistics.mean(row["estimated"]), 3)}
+            for name, row in variant_rows.items()
+        }
+
+        # Stage-1 calls of a re-upload, with and without the index
+        words = make_transcript(args.minutes, seed=42)
+        meta_data = {"platform": "Youtube", "title": "Benchmark video", "description": "", "duration": args.minutes * 60, "video_id": "original001",
+                     "transcript": " ".join(words)}
+        reupload = {**meta_data, "video_id": "reupload001", "transcript": " ".join(variants(words, seed=42)["re-upload (1% words changed)"])}
+        calls = {}
+        for label, duplicates in (("without index", None), ("with index", index)):
+            llm = StubLLM()
+            Analysis(llm=llm, is_local_model=False, duplicates=duplicates).seo_analysis(video_url="https://youtu.be/original001", meta_data=meta_data)
+            before = len(llm.calls)
+            Analysis(llm=llm, is_local_model=False, duplicates=duplicates).seo_analysis(video_url="https://youtu.be/reupload001", meta_data=reupload)
+            calls[label] = len(llm.calls) - before
+        results["reupload_llm_calls"] = calls
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("signature: " + ", ".join(f"{size} {ms:.1f}ms" for size, ms in results["signature_ms"].items()))
+    print(f"index of {args.videos} videos: add {results['add_ms']:.2f}ms/video, load {results['load_seconds']:.2f}s, "
+          f"lookup {results['lookup_us']['median']:.0f}µs median / {results['lookup_us']['p99']:.0f}µs p99")
+    print(f"{'variant':<30}{'found':>8}{'jaccard':>9}{'estimated':>11}")
+    for name, row in results["variants"].items():
+        print(f"{name:<30}{row['found']:>8}{row['jaccard']:>9.3f}{row['estimated']:>11.3f}")
+    print("LLM calls for the re-upload: " + ", ".join(f"{label} {count}" for label, count in results["reupload_llm_calls"].items()))
+
+
+if __name__ == "__main__":
+    main()
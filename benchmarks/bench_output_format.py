@@ -0,0 +1,141 @@
+"""
+    Stage 2 with and without constrained decoding on the Ollama backend (OLLAMA_OUTPUT_FORMAT):
+    how often the first answer parses into every section, how many model calls and generated
+    tokens a complete result takes (repairs included), and the tokens of the stage-2 prompt
+    spent on instructions. The budget they free goes to the stage-1 analysis (__fit_inputs),
+    so the whole prompt does not get shorter when the analysis had to be compacted.
+
+    By default the model is a stub standing in for ChatOllama. Unconstrained, --malformed-rate
+    of its answers go wrong the way small local models do: JSON wrapped in prose, cut off,
+    or written with single quotes. Constrained, it always follows the format, as Ollama's
+    grammar-based decoding does. With --ollama the local Ollama server is used instead
+    (--model, llava by default) and the failure rate is the model's own.
+
+    Usage:
+        python -m benchmarks.bench_output_format [--trials 20] [--malformed-rate 0.3] [--mode single] [--json]
+        python -m benchmarks.bench_output_format --ollama [--model llava] [--trials 5]
+"""
+import argparse, json, random, re, time
+from typing import Any
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_ollama import ChatOllama
+from benchmarks.fixtures import SIZES, video_id_for
+from benchmarks.stub_llm import StubLLM
+from benchmarks.youtube_stub import running_server
+from utils.analysis import Analysis
+from utils.video_extraction import VideoExtraction
+from utils import tracing
+
+_TOKEN = re.compile(r"\S+\s*")
+
+FORMATS = {"none": None, "json": "json", "schema": "schema"}
+
+
+class StubOllama(ChatOllama):
+    """
+        ChatOllama answering like benchmarks.stub_llm.StubLLM, without a server. The fields
+        holding the random generator and the calls are shared by copies (model_copy).
+    """
+    malformed_rate: float = 0.0
+    token_latency: float = 0.0
+    noise: Any = None
+    calls: list = []
+
+    def __completion(self, prompt: str) -> list:
+        text = StubLLM().completion_for(prompt)
+        if isinstance(self.format, dict):
+            # The schema asks for lists where the instructions ask for "0", "1", ... objects
+            data = json.loads(text)
+            text = json.dumps({key: list(value.values()) if isinstance(value, dict) else value for key, value in data.items()}, indent=2)
+        elif not self.format and self.noise.random() < self.malformed_rate:
+            failure = self.noise.choice(("prose", "cut", "quotes"))
+            if failure == "prose":
+                text = f"Sure! Here are the SEO recommendations for your video:\n\n```json\n{text}\n```\n\nLet me know if you need anything else."
+            elif failure == "cut":
+                text = text[:int(len(text) * self.noise.uniform(0.3, 0.9))] + "\n\nI hope these recommendations help your video grow!"
+            else:
+                text = text.replace('"', "'")
+        tokens = _TOKEN.findall(text)
+        if self.num_predict:
+            tokens = tokens[:self.num_predict]
+        self.calls.append({"format": bool(self.format), "completion_tokens": len(tokens)})
+        return tokens
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self.__completion(str(messages[-1].content))
+        time.sleep(self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for token in self.__completion(str(messages[-1].content)):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def run(llm, meta_data: dict, stage1: dict, output_format: str, args) -> dict:
+    analysis = Analysis(llm=llm, is_local_model=True, output_format=output_format)
+    first_pass, complete, calls, completion_tokens, prompt_tokens, instruction_tokens = 0, 0, 0, 0, [], []
+    for _ in range(args.trials):
+        with tracing.trace("bench_output_format") as run_trace:
+            result = analysis.seo_analysis(video_url=f"https://www.youtube.com/watch?v={meta_data['video_id']}", meta_data=meta_data,
+                                           mode=args.mode, stage1=stage1)
+        parse = analysis.last_run_metrics.get("parse", {})
+        instruction_tokens.append(analysis.last_run_metrics["budget"]["stage2"]["instruction_tokens"])
+        spans = [span for span in run_trace.summary()["spans"] if span["name"] == "llm_call"]
+        calls += len(spans)
+        completion_tokens += sum(span.get("completion_tokens", 0) for span in spans)
+        if spans:
+            prompt_tokens.append(spans[0].get("prompt_tokens", 0))
+        first_pass += not parse.get("repaired_sections") and not parse.get("missing_sections")
+        complete += len(result) == 4
+    return {
+        "format": output_format or "none",
+        "trials": args.trials,
+        "first_pass_rate": round(first_pass / args.trials, 3),
+        "complete_rate": round(complete / args.trials, 3),
+        "calls_per_result": round(calls / complete, 2) if complete else None,
+        "tokens_per_result": round(completion_tokens / complete) if complete else None,
+        "stage2_instruction_tokens": round(sum(instruction_tokens) / len(instruction_tokens)),
+        "stage2_prompt_tokens": round(sum(prompt_tokens) / len(prompt_tokens)) if prompt_tokens else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=20, help="Stage-2 runs per format")
+    parser.add_argument("--fixture", choices=list(SIZES), default="5min")
+    parser.add_argument("--mode", choices=["single", "parallel"], default="single")
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--malformed-rate", type=float, default=0.3, help="Share of the stub's unconstrained answers that go wrong")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Stub seconds per generated token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ollama", action="store_true", help="Use the local Ollama server instead of the stub")
+    parser.add_argument("--model", default=None, help="Ollama model (LOCAL_MODEL by default)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    tracing.logger.disabled = True
+
+    if args.ollama:
+        from utils.model_handler import get_model
+        llm = get_model("ollama", model=args.model, warm_up=False)
+    else:
+        llm = StubOllama(model="stub", malformed_rate=args.malformed_rate, token_latency=args.token_latency, noise=random.Random(args.seed))
+
+    with running_server() as base_url:
+        meta_data = VideoExtraction(base_url=base_url).get_meta_data(video_id=video_id_for(args.fixture))
+    # Stage 1 once, every trial only runs stage 2
+    stage1 = Analysis(llm=llm, is_local_model=True).content_analysis(video_url=f"https://www.youtube.com/watch?v={meta_data['video_id']}", meta_data=meta_data)
+    rows = [run(llm, meta_data, stage1, FORMATS[name], args) for name in args.formats]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'format':<8}{'first pass':>11}{'complete':>10}{'calls/result':>14}{'tokens/result':>15}{'instructions':>14}{'prompt':>8}")
+    for row in rows:
+        print(f"{row['format']:<8}{row['first_pass_rate']:>11.0%}{row['complete_rate']:>10.0%}{row['calls_per_result'] or 0:>14.2f}"
+              f"{row['tokens_per_result'] or 0:>15}{row['stage2_instruction_tokens']:>14}{row['stage2_prompt_tokens'] or 0:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+    End-to-end offline benchmark of the pipeline: fixtures served by the local YouTube
+    stand-in, the stub LLM instead of a real model and no caches.
+
+    Reports the median time of every stage (get_video_id, get_meta_data, prompt formatting,
+    both LLM calls, JSON parsing) and the peak traced memory per fixture, and compares
+    them with a stored baseline.
+
+    Usage:
+        python -m benchmarks.bench_pipeline --save-baseline benchmarks/baseline.json
+        python -m benchmarks.bench_pipeline --baseline benchmarks/baseline.json [--tolerance 0.2]
+"""
+import argparse, json, statistics, sys, time, tracemalloc
+from benchmarks.fixtures import SIZES, video_id_for
+from benchmarks.stub_llm import StubLLM
+from benchmarks.youtube_stub import running_server
+from utils.video_extraction import VideoExtraction
+from utils.analysis import Analysis
+from utils import tracing
+
+# Stage differences smaller than this (in seconds) are treated as noise when comparing with the baseline
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def run_once(name: str, base_url: str, llm_options: dict, mode: str, trace_memory: bool = False, extraction_options: dict = None) -> dict:
+    url = f"https://www.youtube.com/watch?v={video_id_for(name)}"
+    extraction = VideoExtraction(base_url=base_url, **(extraction_options or {}))
+    timings = {}
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    video_id = extraction.get_video_id(url=url)
+    timings["get_video_id"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    meta_data = extraction.get_meta_data(video_id=video_id)
+    timings["get_meta_data"] = time.perf_counter() - started
+
+    analysis = Analysis(llm=StubLLM(**llm_options), is_local_model=False)
+    started = time.perf_counter()
+    result = analysis.seo_analysis(video_url=url, meta_data=meta_data, mode=mode)
+    timings["seo_analysis"] = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    tracemalloc.stop()
+
+    timings.update(analysis.last_run_metrics.get("timings", {}))
+    return {
+        "timings": timings,
+        "peak_memory_mb": peak / 2 ** 20,
+        "bytes_downloaded": extraction.get_request_stats()["total_bytes"],
+        "sections": sorted(result),
+    }
+
+
+def run(names: list, repeat: int, llm_options: dict, mode: str, latency: float, extraction_options: dict = None) -> dict:
+    """
+        Output: fixture -> median stage timings, peak memory and the sections produced.
+    """
+    results = {}
+    with running_server(latency=latency) as base_url:
+        for name in names:
+            runs = [run_once(name, base_url, llm_options, mode, extraction_options=extraction_options) for _ in range(repeat)]
+            # tracemalloc slows allocation-heavy stages down a lot, so memory is measured in a separate run
+            traced = run_once(name, base_url, llm_options, mode, trace_memory=True, extraction_options=extraction_options)
+            stages = {stage for r in runs for stage in r["timings"]}
+            results[name] = {
+                "timings": {stage: round(statistics.median(r["timings"].get(stage, 0.0) for r in runs), 6) for stage in sorted(stages)},
+                "peak_memory_mb": round(traced["peak_memory_mb"], 2),
+                "bytes_downloaded": runs[-1]["bytes_downloaded"],
+                "sections": runs[-1]["sections"],
+            }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+        Output: List of regressions (fixture, metric, baseline value, current value).
+        A metric regresses when it grows by more than `tolerance` (0.2 = 20%) over the baseline.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for stage, seconds in current["timings"].items():
+            before = previous["timings"].get(stage)
+            if before is not None and seconds > before * (1 + tolerance) and seconds - before > MIN_REGRESSION_SECONDS:
+                regressions.append((name, stage, before, seconds))
+        if current["peak_memory_mb"] > previous["peak_memory_mb"] * (1 + tolerance):
+            regressions.append((name, "peak_memory_mb", previous["peak_memory_mb"], current["peak_memory_mb"]))
+        if current["sections"] != previous["sections"]:
+            regressions.append((name, "sections", previous["sections"], current["sections"]))
+    return regressions
+
+
+def print_table(results: dict, baseline: dict):
+    for name, current in results.items():
+        previous = baseline.get(name, {})
+        print(f"\n{name}  (peak memory {current['peak_memory_mb']:.1f} MB, {current['bytes_downloaded'] / 1024:.0f} KB downloaded)")
+        print(f"  {'stage':<16}{'ms':>10}{'baseline ms':>13}{'change':>9}")
+        for stage, seconds in current["timings"].items():
+            before = previous.get("timings", {}).get(stage)
+            change = f"{(seconds - before) / before:+.0%}" if before else ""
+            before_text = f"{before * 1000:.1f}" if before is not None else "-"
+            print(f"  {stage:<16}{seconds * 1000:>10.1f}{before_text:>13}{change:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mode", choices=["single", "parallel"], default="single", help="Stage-2 generation mode")
+    parser.add_argument("--prefill-latency", type=float, default=0.0, help="Stub LLM seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Stub LLM seconds per generated token")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="Seconds the YouTube stand-in waits before responding")
+    parser.add_argument("--baseline", help="Compare with this baseline file and exit with status 1 on regressions")
+    parser.add_argument("--save-baseline", help="Write the results to this file as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed growth over the baseline (0.2 = 20%%)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    tracing.logger.disabled = True  # JSON span logs would drown the table
+
+    llm_options = {"prefill_latency": args.prefill_latency, "token_latency": args.token_latency}
+    results = run(args.fixtures, args.repeat, llm_options, args.mode, args.http_latency)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name} {metric}: {before} -> {after}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+    Compare the streaming ytInitialPlayerResponse extractor with the previous regex
+    over whole saved watch pages: bytes read, wall time and correctness.
+
+    Usage:
+        python -m benchmarks.bench_player_response [--repeat 5] [--json]
+"""
+import argparse, json, os, re, statistics, time
+from benchmarks.fixtures import FIXTURE_DIR, saved_pages
+from utils.player_response import extract_player_response
+from utils.video_extraction import STREAM_CHUNK_SIZE
+
+
+def regex_extract(page: bytes):
+    """
+        The extraction used before the streaming extractor: decode the whole page and
+        search it with a non-greedy regex.
+    """
+    match = re.search(r'ytInitialPlayerResponse\s*=\s*({.+?});', page.decode("utf-8", errors="replace"))
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return None
+
+
+def streaming_extract(page: bytes):
+    chunks = (page[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(page), STREAM_CHUNK_SIZE))
+    return extract_player_response(chunks)
+
+
+def expected_for(name: str):
+    path = os.path.join(FIXTURE_DIR, f"{name}.player.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def measure(function, page: bytes, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(page)
+        timings.append(time.perf_counter() - started)
+    return result, statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for name, path in saved_pages().items():
+        with open(path, "rb") as file:
+            page = file.read()
+        expected = expected_for(name)
+
+        regex_result, regex_seconds = measure(regex_extract, page, args.repeat)
+        (stream_result, bytes_read), stream_seconds = measure(streaming_extract, page, args.repeat)
+
+        def correct(result):
+            # Without a stored expectation (user-saved page) a parsed object is the best we can check
+            return result is not None if expected is None else result == expected
+
+        rows.append({
+            "fixture": name,
+            "page_bytes": len(page),
+            "regex": {"bytes_read": len(page), "seconds": regex_seconds, "correct": correct(regex_result)},
+            "streaming": {"bytes_read": bytes_read, "seconds": stream_seconds, "correct": correct(stream_result)},
+        })
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'fixture':<12}{'page KB':>10}{'regex KB':>10}{'regex ms':>10}{'ok':>5}{'stream KB':>11}{'stream ms':>11}{'ok':>5}")
+    for row in rows:
+        regex, stream = row["regex"], row["streaming"]
+        print(
+            f"{row['fixture']:<12}{row['page_bytes'] / 1024:>10.0f}"
+            f"{regex['bytes_read'] / 1024:>10.0f}{regex['seconds'] * 1000:>10.1f}{'yes' if regex['correct'] else 'no':>5}"
+            f"{stream['bytes_read'] / 1024:>11.0f}{stream['seconds'] * 1000:>11.1f}{'yes' if stream['correct'] else 'no':>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
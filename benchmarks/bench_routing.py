@@ -0,0 +1,116 @@
+"""
+    Model routing (RoutedModel in utils/model_handler.py) against a backend with a slow tail
+    and outages: --stall-rate of its calls hang for --stall-seconds and --error-rate of them
+    fail. A second stub backend is the fallback. Compares calling the backend directly with
+    the router without and with hedging: latency percentiles, failed calls, retries, hedges
+    and fallbacks.
+
+    Usage:
+        python -m benchmarks.bench_routing [--calls 200] [--stall-rate 0.05] [--error-rate 0.05] [--timeout 2] [--json]
+"""
+import argparse, json, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stub_llm import StubLLM
+from utils import model_handler, tracing
+from utils.model_handler import RoutedModel, backend_stats
+
+
+class FlakyLLM(StubLLM):
+    """
+        Stub LLM whose calls sometimes hang or fail, at rates drawn from a seeded generator.
+    """
+    def __init__(self, stall_rate: float, stall_seconds: float, error_rate: float, seed: int, **kwargs):
+        super().__init__(**kwargs)
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.error_rate = error_rate
+        self.__random = random.Random(seed)
+        self.__random_lock = threading.Lock()
+
+    def invoke(self, input, config=None):
+        with self.__random_lock:
+            draw = self.__random.random()
+        if draw < self.error_rate:
+            raise ConnectionError("Stub backend unavailable")
+        if draw < self.error_rate + self.stall_rate:
+            time.sleep(self.stall_seconds)
+        return super().invoke(input, config)
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))] if values else 0.0
+
+
+def run(name: str, llm, args) -> dict:
+    prompt = "You are summarizing part of a video transcript. " + "word " * 200
+    latencies, failures = [], 0
+
+    def call(_):
+        started = time.perf_counter()
+        try:
+            llm.invoke(prompt)
+            return time.perf_counter() - started
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for seconds in executor.map(call, range(args.calls)):
+            if seconds is None:
+                failures += 1
+            else:
+                latencies.append(seconds)
+    stats = backend_stats().get(name, {})
+    return {
+        "setup": name,
+        "completed": len(latencies),
+        "failed": failures,
+        "p50_seconds": round(percentile(latencies, 0.5), 3),
+        "p95_seconds": round(percentile(latencies, 0.95), 3),
+        "p99_seconds": round(percentile(latencies, 0.99), 3),
+        "max_seconds": round(max(latencies, default=0.0), 3),
+        "retries": stats.get("retries", 0),
+        "hedges": stats.get("hedges", 0),
+        "fallbacks": stats.get("fallbacks", 0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="Calls per setup")
+    parser.add_argument("--concurrency", type=int, default=4, help="Calls running at the same time")
+    parser.add_argument("--stall-rate", type=float, default=0.05, help="Share of the calls that hang")
+    parser.add_argument("--stall-seconds", type=float, default=10.0, help="How long a hanging call takes")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of the calls that fail at once")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Deadline of an attempt (MODEL_CALL_TIMEOUT)")
+    parser.add_argument("--token-latency", type=float, default=0.001, help="Stub LLM seconds per generated token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    tracing.logger.disabled = True
+    model_handler.MODEL_CALL_TIMEOUT = args.timeout
+    model_handler.MODEL_RETRY_BACKOFF = 0.05
+
+    def flaky():
+        return FlakyLLM(args.stall_rate, args.stall_seconds, args.error_rate, args.seed, token_latency=args.token_latency)
+
+    fallback = StubLLM(token_latency=args.token_latency * 2)
+    rows = [run("direct", flaky(), args)]
+    model_handler.MODEL_HEDGING = False
+    rows.append(run("router", RoutedModel([("router", flaky), ("fallback", lambda: fallback)]), args))
+    model_handler.MODEL_HEDGING = True
+    # Hedging starts from the latencies of the earlier calls, hedge after the p95 rather than a fixed floor
+    model_handler.MODEL_HEDGE_MIN_SECONDS = 0.0
+    rows.append(run("router+hedging", RoutedModel([("router+hedging", flaky), ("fallback", lambda: fallback)]), args))
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'setup':<16}{'done':>6}{'failed':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max s':>8}{'retries':>9}{'hedges':>8}{'fallbacks':>10}")
+    for row in rows:
+        print(f"{row['setup']:<16}{row['completed']:>6}{row['failed']:>8}{row['p50_seconds']:>8.2f}{row['p95_seconds']:>8.2f}{row['p99_seconds']:>8.2f}"
+              f"{row['max_seconds']:>8.2f}{row['retries']:>9}{row['hedges']:>8}{row['fallbacks']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+    Stage-2 latency of the single-call mode against the parallel per-section mode,
+    using the stub LLM with a configurable per-token latency.
+
+    Usage:
+        python -m benchmarks.bench_section_modes --token-latency 0.002 0.005 --slots 1 4
+"""
+import argparse, json, time
+from benchmarks.stub_llm import StubLLM
+from utils.analysis import Analysis
+from utils import tracing
+
+META_DATA = {
+    "platform": "Youtube",
+    "title": "Benchmark video",
+    "description": "A video used to benchmark the SEO pipeline.",
+    "duration": 30 * 60,
+    "transcript": "welcome to the channel " * 200,
+}
+
+
+def run(mode: str, token_latency: float, slots: int) -> dict:
+    llm = StubLLM(token_latency=token_latency, max_concurrency=slots)
+    analysis = Analysis(llm=llm, is_local_model=False)
+
+    started = time.perf_counter()
+    for section, _ in analysis.seo_analysis_stream(video_url="https://youtu.be/benchmark01", meta_data=META_DATA, mode=mode):
+        pass
+    total = time.perf_counter() - started
+
+    metrics = analysis.last_run_metrics
+    return {
+        "mode": mode,
+        "token_latency": token_latency,
+        "server_slots": slots,
+        "total_seconds": round(total, 3),
+        "stage2_seconds": round(total - metrics["stage1_seconds"], 3),
+        "time_to_first_section": round(metrics["time_to_first_section"] - metrics["stage1_seconds"], 3),
+        "completion_tokens": sum(call["completion_tokens"] for call in llm.calls),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token-latency", type=float, nargs="+", default=[0.002, 0.005], help="Seconds per generated token")
+    parser.add_argument("--slots", type=int, nargs="+", default=[1, 4], help="Requests the stub server decodes at the same time")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    tracing.logger.disabled = True  # JSON span logs would drown the table
+
+    rows = [
+        run(mode, token_latency, slots)
+        for token_latency in args.token_latency
+        for slots in args.slots
+        for mode in ("single", "parallel")
+    ]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'mode':<10}{'s/token':>9}{'slots':>7}{'stage 2 s':>11}{'1st section s':>15}{'tokens':>8}")
+    for row in rows:
+        print(
+            f"{row['mode']:<10}{row['token_latency']:>9}{row['server_slots']:>7}"
+            f"{row['stage2_seconds']:>11.2f}{row['time_to_first_section']:>15.2f}{row['completion_tokens']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
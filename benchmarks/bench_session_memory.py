@@ -0,0 +1,73 @@
+"""
+    Per-session cost of a fetched video in the app: bytes kept in the session state, bytes
+    of text rendered (and sent to the browser) on every rerun, and the median rerun time,
+    per fixture. The video is fetched through the app from the local YouTube stand-in,
+    in a fresh interpreter with an empty cache directory.
+
+    Usage:
+        python -m benchmarks.bench_session_memory [--reruns 10] [--json]
+"""
+import argparse, json, os, subprocess, sys, tempfile
+from benchmarks.fixtures import SIZES, video_id_for
+from benchmarks.youtube_stub import running_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_APP = """
+import json, logging, pickle, time
+import utils.config
+utils.config.YOUTUBE_BASE_URL = %(base_url)r
+utils.config.CACHE_DIR = %(cache_dir)r
+from streamlit.testing.v1 import AppTest
+logging.getLogger("youtube_seo.trace").disabled = True
+at = AppTest.from_file("app.py", default_timeout=120)
+at.run()
+at.text_input[0].input(%(url)r)
+[button for button in at.button if button.label == "Enter"][0].click()
+at.run()
+session_bytes = 0
+for key, value in at.session_state.filtered_state.items():
+    try:
+        session_bytes += len(pickle.dumps(value))
+    except Exception:
+        pass  # model clients and other objects shared between sessions
+reruns = []
+for _ in range(%(reruns)d):
+    started = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - started)
+rendered = sum(len(str(getattr(element, "value", "") or "")) for element in at.main.markdown)
+print(json.dumps({"session_bytes": session_bytes, "rendered_bytes": rendered, "rerun": sorted(reruns)[len(reruns) // 2],
+                  "errors": [e.value for e in at.exception]}))
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--reruns", type=int, default=10, help="Reruns timed after the fetch")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    rows = []
+    with running_server() as base_url:
+        for name in args.fixtures:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                code = _APP % {"base_url": base_url, "cache_dir": cache_dir, "reruns": args.reruns,
+                               "url": f"https://www.youtube.com/watch?v={video_id_for(name)}"}
+                result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+                sample = json.loads(result.stdout.strip().splitlines()[-1])
+            rows.append({"fixture": name, "session_kb": round(sample["session_bytes"] / 1024, 1), "rendered_kb": round(sample["rendered_bytes"] / 1024, 1),
+                         "rerun_ms": round(sample["rerun"] * 1000, 1), "errors": sample["errors"]})
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'fixture':<9}{'session KB':>12}{'rendered KB':>13}{'rerun ms':>10}")
+    for row in rows:
+        print(f"{row['fixture']:<9}{row['session_kb']:>12.1f}{row['rendered_kb']:>13.1f}{row['rerun_ms']:>10.1f}" + (f"  errors: {row['errors']}" if row["errors"] else ""))
+
+
+if __name__ == "__main__":
+    main()
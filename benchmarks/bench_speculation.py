@@ -0,0 +1,110 @@
+"""
+    Speculative prefetch (utils/speculation.py): time from clicking Generate to the
+    recommendations, with and without the fetch and stage-1 analysis started when the URL is
+    entered, against the local YouTube stand-in and the stub LLM, without caches.
+
+    Every visit enters a URL, reads the video info for --read-seconds, then clicks Generate;
+    a share of the visits (--abandon-rate) leaves without generating instead, so their
+    speculation is cancelled. Reports click-to-result latency, LLM calls and the hit rate.
+
+    Usage:
+        python -m benchmarks.bench_speculation [--visits 10] [--read-seconds 3] [--abandon-rate 0.2] [--json]
+"""
+import argparse, json, random, statistics, tempfile, time
+from benchmarks.fixtures import SIZES, video_id_for
+from benchmarks.stub_llm import StubLLM
+from benchmarks.youtube_stub import running_server
+from utils.analysis_job import submit_analysis
+from utils.speculation import Speculator
+from utils.transcript_store import TranscriptStore
+from utils.video_extraction import VideoExtraction
+from utils.jobs import get_coordinator
+from utils import tracing
+
+
+def visit(base_url: str, llm, video_id: str, speculate: bool, read_seconds: float, abandon: bool, transcripts: TranscriptStore) -> dict:
+    """
+        One user on the page. Output: click-to-result seconds (None when the user left) and the
+        speculator's stats.
+    """
+    video_url = f"https://www.youtube.com/watch?v={video_id}"
+    # A new speculator per visit, so no visit reuses the work of the one before
+    speculator = Speculator(transcripts=transcripts, base_url=base_url) if speculate else None
+    if speculator is not None:
+        speculator.start(llm, False, video_url, video_id, owner="visit")
+    meta_data = speculator.meta_data(video_id) if speculator is not None else None
+    if meta_data is None:
+        meta_data = transcripts.put(get_coordinator().run(("fetch", video_id), VideoExtraction(base_url=base_url).get_meta_data, video_id=video_id))
+    time.sleep(read_seconds)
+
+    if abandon:
+        if speculator is not None:
+            speculator.release("visit")
+        return {"seconds": None, "speculation": speculator.stats() if speculator is not None else None}
+
+    started = time.perf_counter()
+    job = submit_analysis(llm=llm, is_local_model=False, video_url=video_url, video_id=video_id, meta_data=meta_data,
+                          transcripts=transcripts, speculator=speculator)
+    job.wait()
+    if job.state != "done":
+        raise RuntimeError(f"Analysis {job.state}: {job.error}")
+    return {"seconds": time.perf_counter() - started, "speculation": speculator.stats() if speculator is not None else None}
+
+
+def run(args, base_url: str, fixture: str, speculate: bool) -> dict:
+    llm = StubLLM(prefill_latency=args.prefill_latency, token_latency=args.token_latency)
+    rng = random.Random(args.seed)
+    latencies, outcomes = [], {"started": 0, "used": 0, "cancelled": 0}
+    with tempfile.TemporaryDirectory() as directory:
+        transcripts = TranscriptStore(path=f"{directory}/transcripts.sqlite3")
+        for _ in range(args.visits):
+            result = visit(base_url, llm, video_id_for(fixture), speculate, args.read_seconds, rng.random() < args.abandon_rate, transcripts)
+            if result["seconds"] is not None:
+                latencies.append(result["seconds"])
+            for outcome in outcomes:
+                outcomes[outcome] += (result["speculation"] or {}).get(outcome, 0)
+    return {
+        "fixture": fixture,
+        "speculation": speculate,
+        "generated": len(latencies),
+        "median_seconds": round(statistics.median(latencies), 3) if latencies else None,
+        "max_seconds": round(max(latencies), 3) if latencies else None,
+        "llm_calls": len(llm.calls),
+        **outcomes,
+        "hit_rate": round(outcomes["used"] / outcomes["started"], 3) if outcomes["started"] else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, default=10, help="Visits per fixture and setting")
+    parser.add_argument("--read-seconds", type=float, default=3.0, help="Seconds between entering the URL and clicking Generate")
+    parser.add_argument("--abandon-rate", type=float, default=0.2, help="Share of the visits that leave without generating")
+    parser.add_argument("--fixtures", nargs="+", choices=list(SIZES), default=["5min", "1h"])
+    parser.add_argument("--youtube-latency", type=float, default=0.05, help="Seconds the YouTube stand-in waits before every response")
+    parser.add_argument("--prefill-latency", type=float, default=0.0001, help="Stub LLM seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Stub LLM seconds per generated token")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the visits that leave")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+    tracing.logger.disabled = True
+
+    rows = []
+    with running_server(latency=args.youtube_latency) as base_url:
+        for fixture in args.fixtures:
+            for speculate in (False, True):
+                rows.append(run(args, base_url, fixture, speculate))
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'fixture':<8}{'prefetch':>9}{'generated':>10}{'median s':>10}{'max s':>8}{'LLM calls':>10}{'used':>6}{'cancelled':>10}{'hit rate':>9}")
+    for row in rows:
+        hit_rate = f"{row['hit_rate']:.0%}" if row["hit_rate"] is not None else "-"
+        print(f"{row['fixture']:<8}{'on' if row['speculation'] else 'off':>9}{row['generated']:>10}{row['median_seconds']:>10.2f}{row['max_seconds']:>8.2f}"
+              f"{row['llm_calls']:>10}{row['used']:>6}{row['cancelled']:>10}{hit_rate:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+    App start-up: time to import the app's modules, the first (cold) run of app.py and the
+    median time of the reruns Streamlit does on every widget interaction, for each backend.
+    Every sample runs in a fresh interpreter, so nothing is imported or cached beforehand.
+    No model is called; the HuggingFace backend gets a dummy API key.
+
+    Usage:
+        python -m benchmarks.bench_startup [--samples 3] [--reruns 10] [--json]
+"""
+import argparse, json, os, statistics, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORTS = """
+import json, time
+started = time.perf_counter()
+import utils.video_extraction, utils.analysis, utils.model_handler
+print(json.dumps({"imports": time.perf_counter() - started}))
+"""
+
+_APP = """
+import json, logging, time
+import utils.config
+utils.config.HUGGINGFACE_API_KEY = "hf_benchmark"  # as if a key was configured
+from streamlit.testing.v1 import AppTest
+logging.getLogger("youtube_seo.trace").disabled = True
+at = AppTest.from_file("app.py", default_timeout=120)
+started = time.perf_counter()
+at.run()
+if %(backend)r == "ollama":
+    at.sidebar.selectbox[0].select("Local Model")
+at.run()
+cold = time.perf_counter() - started
+reruns = []
+for _ in range(%(reruns)d):
+    started = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - started)
+print(json.dumps({"cold": cold, "rerun": sorted(reruns)[len(reruns) // 2], "errors": [e.value for e in at.exception]}))
+"""
+
+
+def run_child(code: str) -> dict:
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=3, help="Fresh interpreters per measurement")
+    parser.add_argument("--reruns", type=int, default=10, help="Reruns timed after the cold run")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    results = {"imports_seconds": round(statistics.median(run_child(_IMPORTS)["imports"] for _ in range(args.samples)), 3)}
+    for backend in ("huggingface", "ollama"):
+        samples = [run_child(_APP % {"backend": backend, "reruns": args.reruns}) for _ in range(args.samples)]
+        results[backend] = {
+            "cold_seconds": round(statistics.median(sample["cold"] for sample in samples), 3),
+            "rerun_ms": round(statistics.median(sample["rerun"] for sample in samples) * 1000, 1),
+            "errors": samples[-1]["errors"],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"module imports: {results['imports_seconds']:.3f}s")
+    print(f"{'backend':<13}{'cold run s':>12}{'rerun ms':>10}")
+    for backend in ("huggingface", "ollama"):
+        row = results[backend]
+        print(f"{backend:<13}{row['cold_seconds']:>12.3f}{row['rerun_ms']:>10.1f}" + (f"  errors: {row['errors']}" if row["errors"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+    Deterministic watch-page and transcript fixtures for the offline benchmarks.
+
+    The fixtures are generated once and saved under benchmarks/fixtures/. Real pages
+    saved from YouTube can be dropped in the same folder as <name>.html and are picked
+    up by the benchmarks as well.
+"""
+import json, os, random
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Fixture name -> video duration in seconds
+SIZES = {"5min": 5 * 60, "1h": 60 * 60, "3h": 3 * 60 * 60}
+
+TOPICS = {
+    "intro": "welcome channel today video subscribe guest story journey talk show episode",
+    "python": "python code function variable loop list dictionary class module import syntax interpreter",
+    "cooking": "recipe kitchen onion garlic spices oven bake flour butter salt pepper taste",
+    "fitness": "workout muscle training cardio strength sets reps protein recovery stretch gym",
+    "finance": "money invest stocks savings budget market risk portfolio interest returns inflation",
+    "travel": "flight hotel city mountains beach passport luggage culture food map journey",
+    "music": "guitar chords melody rhythm song album studio band drums vocals concert",
+    "startups": "founder product customers funding investors growth team launch revenue market pitch",
+    "outro": "thanks watching like comment subscribe next episode bell notification see bye",
+}
+COMMON_WORDS = "the a and so we you it is that this to of in for on with really just very about like".split()
+FILLERS = ["um", "uh", "you know", "like", "I mean"]
+MARKERS = ["[Music]", "[Applause]", "[Laughter]"]
+
+
+def video_id_for(name: str) -> str:
+    return (f"bench{name}" + "x" * 11)[:11]
+
+
+def make_transcript_events(duration: int, seed: int = 7, chapters: int = None) -> tuple:
+    """
+        input (Parameter): Duration in seconds.
+        Output: (json3 caption payload, list of true chapter start times in seconds).
+        Topics change at the chapter boundaries; captions include fillers, non-speech
+        markers and rolling lines repeated from the previous caption, like auto-captions do.
+    """
+    rng = random.Random(seed + duration)
+    topics = [name for name in TOPICS if name not in ("intro", "outro")]
+    chapters = chapters or max(3, min(duration // 600, 12))
+
+    cuts = sorted(rng.sample(range(60, max(61, duration - 60), 30), k=min(chapters - 1, max(0, (duration - 120) // 30))))
+    boundaries = [0] + cuts
+    sequence = ["intro"] + [topics[i % len(topics)] for i in range(len(cuts) - 1)] + ["outro"] if cuts else ["intro"]
+
+    events = []
+    time_ms = 0
+    previous_tail = ""
+    while time_ms < duration * 1000:
+        chapter = max(i for i, start in enumerate(boundaries) if start * 1000 <= time_ms)
+        vocabulary = TOPICS[sequence[min(chapter, len(sequence) - 1)]].split()
+        length = rng.randint(3000, 5000)
+
+        if rng.random() < 0.03:
+            text = rng.choice(MARKERS)
+        else:
+            words = [rng.choice(vocabulary) if rng.random() < 0.6 else rng.choice(COMMON_WORDS) for _ in range(rng.randint(6, 11))]
+            if rng.random() < 0.25:
+                words.insert(rng.randint(0, len(words)), rng.choice(FILLERS))
+            text = " ".join(words)
+            if previous_tail and rng.random() < 0.3:
+                text = previous_tail + "\n" + text
+            previous_tail = " ".join(words[-3:])
+
+        events.append({"tStartMs": time_ms, "dDurationMs": length, "segs": [{"utf8": text}]})
+        time_ms += length
+
+    return {"wireMagic": "pb3", "events": events}, boundaries
+
+
+def make_player_response(name: str, duration: int) -> dict:
+    rng = random.Random(duration)
+    video_id = video_id_for(name)
+    description = "\n".join(
+        [
+            f"Benchmark video {name}. Snippet: function f() {{ return {{a: 1}}; }}; done.",
+            "Links: https://example.com/a?x=1&y=2",
+            "Quotes \"inside\" the description and a backslash \\ too.",
+        ]
+        + [f"{i:02d}:00 Section {i} " + " ".join(rng.choice(COMMON_WORDS) for _ in range(12)) for i in range(duration // 600 + 3)]
+    )
+    return {
+        "responseContext": {"serviceTrackingParams": [{"service": "GFEEDBACK", "params": [{"key": "e", "value": "1,2,3"}]}]},
+        "playabilityStatus": {"status": "OK"},
+        "streamingData": {
+            "expiresInSeconds": "21540",
+            "adaptiveFormats": [
+                {
+                    "itag": 130 + i,
+                    "url": f"https://rr1---sn.googlevideo.com/videoplayback?expire=1&ei=abc&id={video_id}&itag={130 + i}\u0026source=youtube",
+                    "mimeType": "video/mp4; codecs=\"avc1.4d401f\"",
+                    "bitrate": rng.randint(100000, 5000000),
+                    "signatureCipher": "s=" + "".join(rng.choice("abcdef0123456789{};") for _ in range(200)),
+                }
+                for i in range(120)
+            ],
+        },
+        "captions": {
+            "playerCaptionsTracklistRenderer": {
+                "captionTracks": [
+                    {
+                        "baseUrl": f"/api/timedtext?v={video_id}&lang=en&kind=asr",
+                        "name": {"simpleText": "English (auto-generated)"},
+                        "languageCode": "en",
+                        "kind": "asr",
+                    }
+                ]
+            }
+        },
+        "videoDetails": {
+            "videoId": video_id,
+            "title": f"Benchmark video ({name})",
+            "lengthSeconds": str(duration),
+            "keywords": ["benchmark", name],
+            "shortDescription": description,
+            "thumbnail": {"thumbnails": [{"url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg?sqp=1", "width": 480, "height": 360}]},
+            "viewCount": str(rng.randint(1000, 10_000_000)),
+            "author": "Benchmark Channel",
+        },
+    }
+
+
+def make_watch_page(player_response: dict, seed: int = 1) -> str:
+    """
+        Wrap a player response in roughly the layout of a real watch page: a few hundred
+        KB of scripts before it and a large ytInitialData blob after it.
+    """
+    rng = random.Random(seed)
+    scripts = "".join(
+        f"<script>var f{i}=function(a){{return a.split('').map(function(c){{return c}})}};window[\"ytInitialPlayerResponse\"] = null;</script>"
+        if i % 50 == 0 else
+        f"<script>(function(){{var x{i}={{k:{rng.randint(0, 999)},s:\"{'z' * rng.randint(50, 400)}\"}};}})();</script>"
+        for i in range(1500)
+    )
+    initial_data = {"contents": [{"itemSectionRenderer": {"text": "".join(rng.choice("abc {};\"") for _ in range(300))}} for _ in range(4000)]}
+    return (
+        "<!DOCTYPE html><html><head><title>Benchmark - YouTube</title>"
+        + scripts
+        + "</head><body><script nonce=\"bench\">var ytInitialPlayerResponse = "
+        + json.dumps(player_response)
+        + ";var meta = document.createElement('meta');</script>"
+        + "<script nonce=\"bench\">var ytInitialData = "
+        + json.dumps(initial_data)
+        + ";</script></body></html>"
+    )
+
+
+def ensure_fixtures() -> dict:
+    """
+        Generate the fixtures that do not exist yet.
+        Output: name -> {'html', 'player_response', 'transcript'} file paths.
+    """
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    fixtures = {}
+    for name, duration in SIZES.items():
+        paths = {
+            "html": os.path.join(FIXTURE_DIR, f"{name}.html"),
+            "player_response": os.path.join(FIXTURE_DIR, f"{name}.player.json"),
+            "transcript": os.path.join(FIXTURE_DIR, f"{name}.json3"),
+        }
+        if not all(os.path.exists(path) for path in paths.values()):
+            player_response = make_player_response(name, duration)
+            transcript, _ = make_transcript_events(duration)
+            with open(paths["html"], "w", encoding="utf-8") as file:
+                file.write(make_watch_page(player_response))
+            with open(paths["player_response"], "w", encoding="utf-8") as file:
+                json.dump(player_response, file)
+            with open(paths["transcript"], "w", encoding="utf-8") as file:
+                json.dump(transcript, file)
+        fixtures[name] = paths
+    return fixtures
+
+
+def saved_pages() -> dict:
+    """
+        All watch pages in the fixture folder (generated and user-saved), name -> path.
+    """
+    ensure_fixtures()
+    return {
+        file_name[:-len(".html")]: os.path.join(FIXTURE_DIR, file_name)
+        for file_name in sorted(os.listdir(FIXTURE_DIR))
+        if file_name.endswith(".html")
+    }
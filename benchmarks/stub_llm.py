@@ -0,0 +1,95 @@
+"""
+    Fake LLM for offline benchmarks. It can stand in for ChatOllama or HuggingFaceModel
+    (it returns plain strings like the HuggingFace backend, so use is_local_model=False).
+
+    Latency is simulated per prompt token (prefill) and per generated token, and
+    `max_concurrency` models the number of requests the server decodes at the same time.
+"""
+import json, re, threading, time
+from langchain_core.runnables import Runnable
+from utils.text_processing import estimate_tokens
+
+_TOKEN = re.compile(r"\S+\s*")
+_SECTION_KEY = re.compile(r'containing just the "(\w+)" key')
+_NUM_TIMESTAMPS = re.compile(r"Generate (\d+) \*\*evenly")
+_DURATION = re.compile(r"lasting approximately (\d+) seconds")
+_NUM_CHAPTERS = re.compile(r"for each of these (\d+) chapters")
+
+WORDS = (
+    "video creators learn practical tips growth audience engagement strategy content "
+    "quality editing storytelling keywords ranking discovery viewers watch time retention"
+).split()
+
+
+def _words(count: int, offset: int = 0) -> str:
+    return " ".join(WORDS[(i + offset) % len(WORDS)] for i in range(count))
+
+
+class StubLLM(Runnable):
+    def __init__(self, prefill_latency: float = 0.0, token_latency: float = 0.0, max_concurrency: int = 64,
+                 model: str = "stub", temperature: float = 0.7, max_new_tokens: int = None, description_words: int = 700):
+        self.model = model
+        self.temperature = temperature
+        self.max_new_tokens = max_new_tokens
+        self.prefill_latency = prefill_latency
+        self.token_latency = token_latency
+        self.description_words = description_words
+        # Shared by copies made through with_max_tokens, like a single server would be
+        self.slots = threading.Semaphore(max_concurrency)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def completion_for(self, prompt: str) -> str:
+        if "You are summarizing part" in prompt:
+            return _words(120)
+        if "SEO specialist" not in prompt:
+            return "### Analysis Report\n" + _words(400)
+
+        match = _SECTION_KEY.search(prompt)
+        sections = [match.group(1)] if match else ["title", "tags", "description", "timestamp"]
+        num_timestamps = int(_NUM_TIMESTAMPS.search(prompt).group(1)) if _NUM_TIMESTAMPS.search(prompt) else 6
+        duration = int(_DURATION.search(prompt).group(1)) if _DURATION.search(prompt) else 600
+
+        data = {}
+        for section in sections:
+            if section == "title":
+                data["title"] = {str(i): {"rank": i + 1, "title": _words(6, i)} for i in range(7)}
+            elif section == "tags":
+                data["tags"] = {str(i): WORDS[i % len(WORDS)] + str(i) for i in range(35)}
+            elif section == "description":
+                data["description"] = _words(self.description_words)
+            elif section == "timestamp" and _NUM_CHAPTERS.search(prompt):
+                data["timestamp"] = {str(i): _words(4, i) for i in range(int(_NUM_CHAPTERS.search(prompt).group(1)))}
+            elif section == "timestamp":
+                step = max(1, duration // num_timestamps)
+                data["timestamp"] = {
+                    str(i): {"time": f"{i * step // 60:02d}:{i * step % 60:02d}", "description": _words(4, i)}
+                    for i in range(num_timestamps)
+                }
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+    def __generate(self, prompt: str):
+        tokens = _TOKEN.findall(self.completion_for(prompt))
+        if self.max_new_tokens:
+            tokens = tokens[:self.max_new_tokens]
+
+        with self.slots:
+            started = time.perf_counter()
+            time.sleep(self.prefill_latency * estimate_tokens(prompt))
+            for token in tokens:
+                if self.token_latency:
+                    time.sleep(self.token_latency)
+                yield token
+
+        with self.lock:
+            self.calls.append({
+                "prompt_tokens": estimate_tokens(prompt),
+                "completion_tokens": len(tokens),
+                "seconds": time.perf_counter() - started,
+            })
+
+    def invoke(self, input, config=None):
+        return "".join(self.__generate(str(input)))
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.__generate(str(input))
@@ -0,0 +1,101 @@
+"""
+    Local HTTP stand-in for YouTube that serves the benchmark fixtures.
+
+    Routes:
+        /watch?v=<video_id>          saved watch page of the fixture
+        /api/timedtext?v=<video_id>  json3 caption track of the fixture
+
+    Run it on its own and set YOUTUBE_BASE_URL in utils/config.py to its address to try
+    the app offline:
+        python -m benchmarks.youtube_stub --port 8765 [--latency 0.05]
+"""
+import argparse, threading, time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from benchmarks.fixtures import ensure_fixtures, video_id_for
+
+# Bytes written to the socket at a time, so a client that stops reading early really saves the rest
+WRITE_CHUNK_SIZE = 64 * 1024
+
+
+class YoutubeStubHandler(BaseHTTPRequestHandler):
+    # Set on the subclass made by make_server
+    routes = {}
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        video_id = parse_qs(url.query).get("v", [""])[0]
+        paths = self.routes.get(video_id)
+        kind = {"/watch": "html", "/api/timedtext": "transcript"}.get(url.path)
+        if not paths or not kind:
+            self.send_error(404)
+            return
+
+        time.sleep(self.latency)
+        with open(paths[kind], "rb") as file:
+            body = file.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8" if kind == "html" else "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            for i in range(0, len(body), WRITE_CHUNK_SIZE):
+                self.wfile.write(body[i:i + WRITE_CHUNK_SIZE])
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client closed the connection once it had what it needed
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """
+        input (Parameter): Address to listen on (port 0 picks a free one) and the delay added before every response.
+        Output: Server (not started yet) that serves every fixture under its benchmark video id.
+    """
+    routes = {video_id_for(name): paths for name, paths in ensure_fixtures().items()}
+    handler = type("Handler", (YoutubeStubHandler,), {"routes": routes, "latency": latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+@contextmanager
+def running_server(latency: float = 0.0):
+    """
+        Serve the fixtures on a background thread for the duration of the block.
+        Output: Base URL to pass to VideoExtraction(base_url=...).
+    """
+    server = make_server(latency=latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{server.server_address[0]}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added before every response")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.latency)
+    print(f"Serving {len(server.RequestHandlerClass.routes)} fixture videos on http://{args.host}:{args.port}")
+    for video_id in server.RequestHandlerClass.routes:
+        print(f"  http://{args.host}:{args.port}/watch?v={video_id}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import pytest
+from utils import cache
+from utils.cache import LLMCache, MetaDataCache, SQLiteCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def test_values_round_trip_as_json(tmp_path):
+    store = SQLiteCache(path=str(tmp_path / "cache.sqlite3"))
+    store.set("video", {"title": "नमस्ते", "views": 10, "tags": ["a", "b"]})
+    assert store.get("video") == {"title": "नमस्ते", "views": 10, "tags": ["a", "b"]}
+    assert store.get("other") is None
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    store = SQLiteCache(path=str(tmp_path / "cache.sqlite3"))
+    store.set("a", 1)
+    store.get("a")
+    store.get("a")
+    store.get("b")
+    assert store.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "entries": 1}
+
+
+def test_expired_value_is_a_miss_and_removed(tmp_path, clock):
+    store = SQLiteCache(path=str(tmp_path / "cache.sqlite3"))
+    store.set("a", 1)
+    clock.now += 10
+    assert store.get("a", ttl=10) == 1
+    clock.now += 1
+    assert store.get("a", ttl=10) is None
+    assert len(store) == 0
+    assert store.stats()["misses"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    store = SQLiteCache(path=str(tmp_path / "cache.sqlite3"), max_entries=2)
+    store.set("a", 1)
+    clock.now += 1
+    store.set("b", 2)
+    clock.now += 1
+    # Reading "a" makes "b" the least recently used
+    store.get("a")
+    clock.now += 1
+    store.set("c", 3)
+    assert len(store) == 2
+    assert store.get("b") is None
+    assert store.get("a") == 1 and store.get("c") == 3
+
+
+def test_metadata_fields_expire_on_their_own(tmp_path, clock):
+    metadata = MetaDataCache(path=str(tmp_path / "metadata.sqlite3"), ttl={"details": 60, "transcript": 3600})
+    metadata.set("video", "details", {"views": 10})
+    metadata.set("video", "transcript", "hello")
+    clock.now += 61
+    assert metadata.get("video", "details") is None
+    assert metadata.get("video", "transcript") == "hello"
+    assert metadata.stats()["fields"]["details"] == {"hits": 0, "misses": 1}
+    assert metadata.stats()["fields"]["transcript"] == {"hits": 1, "misses": 0}
+
+
+def test_invalidate_drops_every_field(tmp_path):
+    metadata = MetaDataCache(path=str(tmp_path / "metadata.sqlite3"))
+    for field in MetaDataCache.FIELDS:
+        metadata.set("video", field, field)
+    metadata.set("other", "details", {})
+    metadata.invalidate("video")
+    assert all(metadata.get("video", field) is None for field in MetaDataCache.FIELDS)
+    assert metadata.get("other", "details") == {}
+
+
+def test_llm_keys_change_with_any_part_of_the_request():
+    key = LLMCache.make_key("ollama", "llava", "prompt", {"temperature": 0})
+    assert key == LLMCache.make_key("ollama", "llava", "prompt", {"temperature": 0})
+    assert key != LLMCache.make_key("huggingface", "llava", "prompt", {"temperature": 0})
+    assert key != LLMCache.make_key("ollama", "mistral", "prompt", {"temperature": 0})
+    assert key != LLMCache.make_key("ollama", "llava", "prompt.", {"temperature": 0})
+    assert key != LLMCache.make_key("ollama", "llava", "prompt", {"temperature": 0.7})
+
+
+def test_llm_completions_expire(tmp_path, clock):
+    completions = LLMCache(path=str(tmp_path / "llm.sqlite3"), ttl=60)
+    completions.set("key", "completion")
+    assert completions.get("key") == "completion"
+    clock.now += 61
+    assert completions.get("key") is None
+    assert completions.stats()["hits"] == 1 and completions.stats()["misses"] == 1
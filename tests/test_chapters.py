@@ -0,0 +1,71 @@
+from utils.chapters import detect_chapters, format_time, tokenize
+
+TOPICS = [
+    "guitar chords strings fret strumming pick tuning melody",
+    "kitchen recipe flour oven baking dough butter sugar",
+    "football goal striker penalty referee stadium league match",
+    "rocket orbit launch satellite astronaut engine fuel mission",
+]
+
+
+def timed_transcript(topics: list, seconds_per_topic: int, caption_seconds: int = 5) -> tuple:
+    """
+        Captions every caption_seconds, each topic's words for seconds_per_topic seconds.
+        Output: (text, segments) as join_caption_events builds them.
+    """
+    captions, starts, offsets, length = [], [], [], 0
+    for n, topic in enumerate(topics):
+        words = topic.split()
+        for i, start in enumerate(range(n * seconds_per_topic, (n + 1) * seconds_per_topic, caption_seconds)):
+            caption = " ".join(words[(i + k) % len(words)] for k in range(4))
+            if captions:
+                length += 1
+            starts.append(start * 1000)
+            offsets.append(length)
+            captions.append(caption)
+            length += len(caption)
+    return " ".join(captions), {"starts": starts, "offsets": offsets}
+
+
+def test_boundaries_at_the_topic_changes():
+    text, segments = timed_transcript(TOPICS, 180)
+    chapters = detect_chapters(text, segments, duration=720)
+    assert [chapter["start"] for chapter in chapters] == [0, 180, 360, 540]
+    assert all(set(chapter["keywords"]) <= set(topic.split()) for chapter, topic in zip(chapters, TOPICS))
+
+
+def test_first_chapter_starts_at_zero():
+    text, segments = timed_transcript(TOPICS, 180)
+    assert detect_chapters(text, segments, duration=720)[0]["time"] == "00:00"
+
+
+def test_max_chapters_is_respected():
+    text, segments = timed_transcript(TOPICS, 180)
+    assert len(detect_chapters(text, segments, duration=720, max_chapters=3, min_chapters=2)) == 3
+
+
+def test_fewer_chapters_than_the_minimum_returns_none():
+    # A two-minute video with a single change of topic: two chapters, below the default minimum of 3
+    text, segments = timed_transcript(TOPICS[:2], 60)
+    assert detect_chapters(text, segments, duration=120) == []
+    assert [chapter["start"] for chapter in detect_chapters(text, segments, duration=120, min_chapters=2)] == [0, 60]
+
+
+def test_short_or_flat_transcript_returns_none():
+    text, segments = timed_transcript(TOPICS[:1], 60)
+    assert detect_chapters(text, segments, duration=60) == []
+
+
+def test_transcript_without_timing_returns_none():
+    assert detect_chapters("some words", {}) == []
+    assert detect_chapters("some words", {"starts": [0, 1000], "offsets": [0]}) == []
+
+
+def test_format_time():
+    assert format_time(0) == "00:00"
+    assert format_time(61) == "01:01"
+    assert format_time(3725) == "1:02:05"
+
+
+def test_tokenize_drops_stop_words_markers_and_numbers():
+    assert tokenize("[Music] So the Guitar is 42 really नमस्ते और दोस्तों") == ["guitar", "नमस्ते", "दोस्तों"]
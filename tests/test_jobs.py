@@ -0,0 +1,189 @@
+import threading, time
+import pytest
+from utils.jobs import JobCoordinator
+
+TIMEOUT = 5
+
+
+class Stopped(BaseException):
+    """Stands in for the exception Streamlit stops a script with."""
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def start(target, *args) -> threading.Thread:
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def coordinator():
+    return JobCoordinator(limits={"one": 1, "two": 2})
+
+
+def test_identical_jobs_run_once(coordinator):
+    release, calls, results = threading.Event(), [], []
+
+    def fetch():
+        calls.append(1)
+        assert release.wait(TIMEOUT)
+        return "meta data"
+
+    leader = start(lambda: results.append(coordinator.run(("fetch", "video"), fetch)))
+    wait_until(lambda: calls)
+    follower = start(lambda: results.append(coordinator.run(("fetch", "video"), fetch)))
+    wait_until(lambda: coordinator.stats()["coalesced_jobs"] == 1)
+    release.set()
+    leader.join(TIMEOUT)
+    follower.join(TIMEOUT)
+    assert results == ["meta data", "meta data"]
+    assert len(calls) == 1
+    assert coordinator.stats()["in_flight_jobs"] == 0
+
+
+def test_different_keys_are_not_coalesced(coordinator):
+    assert coordinator.run(("fetch", "a"), lambda: "a") == "a"
+    assert coordinator.run(("fetch", "b"), lambda: "b") == "b"
+    assert coordinator.stats()["coalesced_jobs"] == 0
+
+
+def test_waiting_callers_get_the_error(coordinator):
+    release, errors = threading.Event(), []
+
+    def fetch():
+        assert release.wait(TIMEOUT)
+        raise ValueError("no video")
+
+    def call():
+        try:
+            coordinator.run(("fetch", "video"), fetch)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [start(call)]
+    wait_until(lambda: coordinator.stats()["in_flight_jobs"] == 1)
+    threads.append(start(call))
+    wait_until(lambda: coordinator.stats()["coalesced_jobs"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert errors == ["no video", "no video"]
+
+
+def test_stopped_job_is_taken_over_by_a_waiting_caller(coordinator):
+    release, results, stopped = threading.Event(), [], []
+
+    def stopped_fetch():
+        assert release.wait(TIMEOUT)
+        raise Stopped()
+
+    def leader():
+        try:
+            coordinator.run(("fetch", "video"), stopped_fetch)
+        except Stopped:
+            stopped.append(1)
+
+    threads = [start(leader)]
+    wait_until(lambda: coordinator.stats()["in_flight_jobs"] == 1)
+    threads.append(start(lambda: results.append(coordinator.run(("fetch", "video"), lambda: "fetched again"))))
+    wait_until(lambda: coordinator.stats()["coalesced_jobs"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    # The stop stays with the session it was meant for, the other caller runs the job itself
+    assert stopped == [1]
+    assert results == ["fetched again"]
+
+
+def test_slots_are_capped_per_backend(coordinator):
+    release, running, peak, lock = threading.Event(), [0], [0], threading.Lock()
+
+    def call():
+        with coordinator.llm_slot("two"):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            assert release.wait(TIMEOUT)
+            with lock:
+                running[0] -= 1
+
+    threads = [start(call) for _ in range(4)]
+    wait_until(lambda: coordinator.stats()["backends"]["two"]["queued"] == 2)
+    assert coordinator.stats()["backends"]["two"]["running"] == 2
+    # Another backend has slots of its own
+    with coordinator.llm_slot("one") as waited:
+        assert waited < TIMEOUT
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert peak[0] == 2
+    stats = coordinator.stats()["backends"]["two"]
+    assert (stats["running"], stats["queued"], stats["calls"]) == (0, 0, 4)
+
+
+def test_slots_are_handed_out_in_arrival_order(coordinator):
+    order = []
+
+    def call(number):
+        with coordinator.llm_slot("one"):
+            order.append(number)
+
+    with coordinator.llm_slot("one"):
+        threads = []
+        for number in range(5):
+            threads.append(start(call, number))
+            wait_until(lambda: coordinator.stats()["backends"]["one"]["queued"] == number + 1)
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_slot_is_released_when_the_call_fails(coordinator):
+    with pytest.raises(ValueError):
+        with coordinator.llm_slot("one"):
+            raise ValueError()
+    with coordinator.llm_slot("one"):
+        assert coordinator.stats()["backends"]["one"]["running"] == 1
+    assert coordinator.stats()["backends"]["one"]["running"] == 0
+
+
+def test_job_is_cancelled_when_its_last_owner_leaves(coordinator):
+    started = threading.Event()
+
+    def analysis(job):
+        started.set()
+        while True:
+            job.set_stage("analyzing")
+            time.sleep(0.001)
+
+    job = coordinator.submit(("analysis", "video"), analysis, owner="first")
+    assert coordinator.submit(("analysis", "video"), analysis, owner="second") is job
+    assert started.wait(TIMEOUT)
+    assert not job.cancel("stranger")
+    assert job.cancel("first")
+    assert not job.cancel_requested
+    assert job.cancel("second")
+    assert job.wait(TIMEOUT) and job.state == "cancelled"
+
+
+def test_cancelled_job_is_not_joined(coordinator):
+    release = threading.Event()
+
+    def analysis(job):
+        assert release.wait(TIMEOUT)
+        job.set_stage("analyzing")
+        return "result"
+
+    cancelled = coordinator.submit(("analysis", "video"), analysis, owner="first")
+    cancelled.cancel("first")
+    job = coordinator.submit(("analysis", "video"), analysis, owner="second")
+    assert job is not cancelled
+    release.set()
+    assert cancelled.wait(TIMEOUT) and cancelled.state == "cancelled"
+    assert job.wait(TIMEOUT) and job.result == "result"
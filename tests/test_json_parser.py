@@ -0,0 +1,78 @@
+import pytest
+from utils.json_parser import IncrementalJSONParser, parse_sections, repair_json
+
+
+def feed_all(pieces: list) -> tuple:
+    parser = IncrementalJSONParser()
+    members = []
+    for piece in pieces:
+        members.extend(parser.feed(piece))
+    return parser, members
+
+
+def test_members_complete_as_they_are_generated():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"title": "a", "ta') == [("title", "a")]
+    assert parser.feed('gs": ["x"]}') == [("tags", ["x"])]
+    assert parser.done
+
+
+def test_prose_and_code_fence_before_the_object_are_skipped():
+    _, members = feed_all(["Sure! Here you go:\n```json\n", '{"description": "d"}\n```'])
+    assert members == [("description", "d")]
+
+
+def test_braces_and_semicolons_inside_strings_do_not_end_the_member():
+    _, members = feed_all(['{"title": {"0": "a};', ' b}"}, "tags": ["}", "]"]}'])
+    assert members == [("title", {"0": "a}; b}"}), ("tags", ["}", "]"])]
+
+
+def test_escaped_quote_split_across_pieces():
+    _, members = feed_all(['{"title": "say \\', '"hi\\"", "tags": []}'])
+    assert members == [("title", 'say "hi"'), ("tags", [])]
+
+
+def test_invalid_member_is_kept_aside():
+    parser, members = feed_all(['{"title": "a", "tags": [1,, 2], "description": "d"}'])
+    assert members == [("title", "a"), ("description", "d")]
+    assert parser.invalid_members == [' "tags": [1,, 2]']
+
+
+def test_pending_member_of_truncated_output():
+    parser, _ = feed_all(['{"title": "a", "tags": ["x", "y'])
+    assert not parser.done
+    assert parser.pending_member() == ' "tags": ["x", "y'
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"tags": ["a", "b",]}', {"tags": ["a", "b"]}),
+    ('{"tags": ["a", {"b": 1},]}', {"tags": ["a", {"b": 1}]}),
+])
+def test_repair_drops_trailing_commas(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_repair_truncated_array_drops_the_half_written_string():
+    assert repair_json('{"tags": ["a", "b", "c', truncated=True) == {"tags": ["a", "b"]}
+
+
+def test_repair_truncated_array_after_a_comma():
+    assert repair_json('{"tags": ["a", "b", ', truncated=True) == {"tags": ["a", "b"]}
+
+
+def test_repair_gives_up_on_a_single_cut_string():
+    assert repair_json('{"description": "half writ', truncated=True) is None
+
+
+def test_parse_sections_whole_object():
+    assert parse_sections('```json\n{"title": "t", "tags": ["a"]}\n```') == {"title": "t", "tags": ["a"]}
+
+
+def test_parse_sections_keeps_the_complete_members_of_a_truncated_object():
+    assert parse_sections('{"title": "ok", "description": "d", "tags": ["a", "b", "c') == {
+        "title": "ok", "description": "d", "tags": ["a", "b"],
+    }
+
+
+def test_parse_sections_without_json():
+    assert parse_sections("I cannot help with that.") == {}
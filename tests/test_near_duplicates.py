@@ -0,0 +1,76 @@
+import random
+import pytest
+from utils.near_duplicates import NearDuplicateIndex
+
+VOCABULARY = [f"word{i}" for i in range(2000)]
+
+
+def words(seed: int, count: int = 1000) -> list:
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) for _ in range(count)]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(path=str(tmp_path / "near_duplicates.sqlite3"))
+
+
+def test_empty_or_short_transcript_has_no_signature(index):
+    assert index.signature("") is None
+    assert index.signature("   ") is None
+    assert index.signature(" ".join(words(1, index.min_words - 1))) is None
+
+
+def test_signature_ignores_case_and_punctuation(index):
+    text = words(1)
+    assert index.signature(" ".join(text)) == index.signature(" ".join(word.upper() + "," for word in text))
+
+
+def test_similarity_of_identical_and_unrelated_transcripts(index):
+    signature = index.signature(" ".join(words(1)))
+    assert index.similarity(signature, signature) == 1.0
+    assert index.similarity(signature, index.signature(" ".join(words(2)))) < 0.1
+
+
+def test_reupload_with_a_new_intro_is_found(index):
+    original = words(1)
+    index.add("original", index.signature(" ".join(original)), "analysis of the original")
+    reupload = words(3, 30) + original
+    match = index.find(index.signature(" ".join(reupload)))
+    assert match["video_id"] == "original"
+    assert match["analysis"] == "analysis of the original"
+    assert match["similarity"] >= index.threshold
+
+
+def test_unrelated_transcript_is_not_found(index):
+    index.add("original", index.signature(" ".join(words(1))), "analysis")
+    assert index.find(index.signature(" ".join(words(2)))) is None
+
+
+def test_video_itself_can_be_excluded(index):
+    signature = index.signature(" ".join(words(1)))
+    index.add("original", signature, "analysis")
+    assert index.find(signature, exclude="original") is None
+
+
+def test_index_is_persisted(tmp_path):
+    path = str(tmp_path / "near_duplicates.sqlite3")
+    first = NearDuplicateIndex(path=path)
+    signature = first.signature(" ".join(words(1)))
+    first.add("original", signature, "analysis")
+    assert NearDuplicateIndex(path=path).find(signature)["video_id"] == "original"
+
+
+def test_oldest_videos_are_evicted(tmp_path):
+    index = NearDuplicateIndex(path=str(tmp_path / "near_duplicates.sqlite3"), max_entries=2)
+    signatures = [index.signature(" ".join(words(seed))) for seed in range(3)]
+    for seed, signature in enumerate(signatures):
+        index.add(f"video{seed}", signature, "analysis")
+    assert len(index) == 2
+    assert index.find(signatures[0]) is None
+    assert index.find(signatures[2])["video_id"] == "video2"
+
+
+def test_permutations_must_split_into_bands(tmp_path):
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(path=str(tmp_path / "near_duplicates.sqlite3"), permutations=100, bands=16)
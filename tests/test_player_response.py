@@ -0,0 +1,69 @@
+import json
+import pytest
+from utils.player_response import PlayerResponseExtractor, extract_player_response
+
+PLAYER_RESPONSE = {
+    "videoDetails": {"title": 'Braces } and "quotes"; ytInitialPlayerResponse = {', "shortDescription": "};\\ done – ünïcode"},
+    "captions": {"tracks": [{"baseUrl": "/api/timedtext?v=x"}]},
+}
+
+
+def page(player_response: dict = PLAYER_RESPONSE) -> bytes:
+    return ('<html><script>var ytInitialPlayerResponse = ' + json.dumps(player_response, ensure_ascii=False)
+            + ';var meta = {"a": 1};</script>' + "x" * 1000 + '</html>').encode("utf-8")
+
+
+def chunked(data: bytes, size: int) -> list:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_object_is_found_whatever_the_chunk_size(size):
+    player_response, _ = extract_player_response(chunked(page(), size))
+    assert player_response == PLAYER_RESPONSE
+
+
+def test_reading_stops_at_the_end_of_the_object():
+    data = page()
+    _, bytes_read = extract_player_response(chunked(data, 16))
+    end = data.index(b';var meta')
+    assert end <= bytes_read < end + 16
+
+
+def test_closing_sequence_inside_a_string_does_not_end_the_object():
+    extractor = PlayerResponseExtractor()
+    assert not extractor.feed(b'ytInitialPlayerResponse = {"a": "};"')
+    assert extractor.feed(b'};')
+    assert extractor.result() == {"a": "};"}
+
+
+def test_escaped_quote_at_a_chunk_boundary():
+    extractor = PlayerResponseExtractor()
+    for chunk in (b'ytInitialPlayerResponse = {"a": "x\\', b'"}"', b', "b": 1};'):
+        extractor.feed(chunk)
+    assert extractor.result() == {"a": 'x"}', "b": 1}
+
+
+def test_assignment_split_across_chunks():
+    extractor = PlayerResponseExtractor()
+    for chunk in (b'<script>ytInitialPlayer', b'Response = {', b'"a": {"b": 2}}', b';'):
+        extractor.feed(chunk)
+    assert extractor.result() == {"a": {"b": 2}}
+
+
+def test_multibyte_character_split_across_chunks():
+    data = 'ytInitialPlayerResponse = {"a": "ü"};'.encode("utf-8")
+    split = data.index("ü".encode("utf-8")) + 1
+    player_response, _ = extract_player_response([data[:split], data[split:]])
+    assert player_response == {"a": "ü"}
+
+
+def test_page_without_player_response():
+    assert extract_player_response(chunked(b"<html>consent page</html>", 8)) == (None, 25)
+
+
+def test_truncated_object():
+    extractor = PlayerResponseExtractor()
+    extractor.feed(b'ytInitialPlayerResponse = {"a": {"b": 1}')
+    assert not extractor.done
+    assert extractor.result() is None
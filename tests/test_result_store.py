@@ -0,0 +1,21 @@
+from utils.result_store import ResultStore
+
+
+def test_languages_are_merged_per_session(tmp_path):
+    store = ResultStore(path=str(tmp_path / "results.sqlite3"))
+    assert store.get("session") == {}
+    store.update("session", {"English": {"title": "a"}})
+    store.update("session", {"Hindi": {"title": "b"}})
+    store.update("session", {"English": {"title": "c"}})
+    assert store.get("session") == {"English": {"title": "c"}, "Hindi": {"title": "b"}}
+    assert store.get("other") == {}
+
+
+def test_cleared_and_evicted_sessions_have_no_results(tmp_path):
+    store = ResultStore(path=str(tmp_path / "results.sqlite3"), max_entries=2)
+    for session in ("a", "b", "c"):
+        store.update(session, {"English": {"title": session}})
+    assert store.get("c") == {"English": {"title": "c"}}
+    assert store.stats()["entries"] == 2
+    store.clear("c")
+    assert store.get("c") == {}
@@ -0,0 +1,167 @@
+import threading, time
+import pytest
+from utils import model_handler
+from utils.model_handler import RoutedModel, backend_stats
+
+RETRIES = 2
+TRIP = 3
+COOLDOWN = 60
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedLLM:
+    """
+        Stub backend answering each call with the next outcome of its script (the last one
+        repeats): a text, an exception to raise or, for stream(), a list of pieces and exceptions.
+    """
+    def __init__(self, *outcomes, num_ctx: int = None):
+        self.outcomes = list(outcomes)
+        self.num_ctx = num_ctx
+        self.calls = 0
+        self.__lock = threading.Lock()
+
+    def __next_outcome(self):
+        with self.__lock:
+            self.calls += 1
+            return self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+
+    def invoke(self, input, config=None):
+        outcome = self.__next_outcome()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def stream(self, input, config=None, **kwargs):
+        outcome = self.__next_outcome()
+        for piece in outcome if isinstance(outcome, list) else [outcome]:
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(model_handler, "_health", {})
+    monkeypatch.setattr(model_handler, "MODEL_RETRIES", RETRIES)
+    monkeypatch.setattr(model_handler, "MODEL_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(model_handler, "MODEL_FAILURES_TO_TRIP", TRIP)
+    monkeypatch.setattr(model_handler, "MODEL_COOLDOWN_SECONDS", COOLDOWN)
+    monkeypatch.setattr(model_handler, "MODEL_HEDGING", False)
+
+
+def router(primary: ScriptedLLM, fallback: ScriptedLLM) -> RoutedModel:
+    return RoutedModel([("primary", lambda: primary), ("fallback", lambda: fallback)])
+
+
+def test_client_error_goes_to_the_fallback_without_a_retry():
+    primary, fallback = ScriptedLLM(HTTPError(401)), ScriptedLLM("answer")
+    assert router(primary, fallback).invoke("prompt") == "answer"
+    assert (primary.calls, fallback.calls) == (1, 1)
+    stats = backend_stats()
+    assert stats["primary"]["retries"] == 0 and stats["primary"]["fallbacks"] == 1
+    assert stats["primary"]["failures"] == 1
+
+
+def test_bug_is_raised_and_not_counted_against_the_backend():
+    primary, fallback = ScriptedLLM(TypeError("bad argument")), ScriptedLLM("answer")
+    with pytest.raises(TypeError):
+        router(primary, fallback).invoke("prompt")
+    assert (primary.calls, fallback.calls) == (1, 0)
+    assert backend_stats()["primary"]["failures"] == 0
+
+
+@pytest.mark.parametrize("error", [HTTPError(429), HTTPError(503), HTTPError(408), TimeoutError("slow"), ConnectionError("refused")])
+def test_transient_errors_are_retried(error):
+    primary, fallback = ScriptedLLM(error), ScriptedLLM("answer")
+    assert router(primary, fallback).invoke("prompt") == "answer"
+    assert primary.calls == 1 + RETRIES
+    assert backend_stats()["primary"]["retries"] == RETRIES
+
+
+def test_retry_that_succeeds_stays_on_the_primary():
+    primary, fallback = ScriptedLLM(HTTPError(503), "answer"), ScriptedLLM("fallback answer")
+    assert router(primary, fallback).invoke("prompt") == "answer"
+    assert (primary.calls, fallback.calls) == (2, 0)
+
+
+def test_call_past_its_deadline_is_retried(monkeypatch):
+    monkeypatch.setattr(model_handler, "MODEL_CALL_TIMEOUT", 0.05)
+
+    class SlowLLM(ScriptedLLM):
+        def invoke(self, input, config=None):
+            answer = super().invoke(input, config)
+            time.sleep(0.2)
+            return answer
+
+    primary, fallback = SlowLLM("late"), ScriptedLLM("answer")
+    assert router(primary, fallback).invoke("prompt") == "answer"
+    assert primary.calls == 1 + RETRIES
+    assert backend_stats()["primary"]["last_error"].startswith("TimeoutError")
+
+
+def test_primary_error_is_raised_caused_by_the_fallback_error():
+    unauthorized, refused = HTTPError(401), ConnectionError("refused")
+    with pytest.raises(HTTPError) as raised:
+        router(ScriptedLLM(unauthorized), ScriptedLLM(refused)).invoke("prompt")
+    assert raised.value is unauthorized
+    assert raised.value.__cause__ is refused
+
+
+def test_fallback_with_a_too_small_context_is_skipped():
+    primary, fallback = ScriptedLLM(HTTPError(503)), ScriptedLLM("answer", num_ctx=100)
+    with pytest.raises(HTTPError):
+        router(primary, fallback).invoke("word " * 1000)
+    assert fallback.calls == 0
+    # A prompt that fits goes to it
+    assert router(ScriptedLLM(HTTPError(503)), fallback).invoke("short prompt") == "answer"
+
+
+def test_circuit_opens_after_failures_in_a_row_and_closes_after_the_cooldown(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_handler.time, "time", clock)
+    primary, fallback = ScriptedLLM(HTTPError(401)), ScriptedLLM("answer")
+    llm = router(primary, fallback)
+    for _ in range(TRIP):
+        assert llm.invoke("prompt") == "answer"
+    assert primary.calls == TRIP
+    assert not backend_stats()["primary"]["healthy"]
+
+    # Skipped while it is down
+    assert llm.invoke("prompt") == "answer"
+    assert primary.calls == TRIP
+
+    clock.now += COOLDOWN + 1
+    primary.outcomes = ["primary answer"]
+    assert llm.invoke("prompt") == "primary answer"
+    stats = backend_stats()["primary"]
+    assert stats["healthy"] and stats["consecutive_failures"] == 0
+
+
+def test_stream_falls_back_before_its_first_piece():
+    primary, fallback = ScriptedLLM([ConnectionError("refused")]), ScriptedLLM(["an", "swer"])
+    assert list(router(primary, fallback).stream("prompt")) == ["an", "swer"]
+    assert primary.calls == 1 + RETRIES
+
+
+def test_stream_failing_after_its_first_piece_is_not_restarted():
+    primary, fallback = ScriptedLLM(["an", ConnectionError("reset")]), ScriptedLLM(["answer"])
+    pieces = []
+    with pytest.raises(ConnectionError):
+        for piece in router(primary, fallback).stream("prompt"):
+            pieces.append(piece)
+    assert pieces == ["an"]
+    assert (primary.calls, fallback.calls) == (1, 0)
+    assert backend_stats()["primary"]["failures"] == 1
@@ -0,0 +1,69 @@
+import pytest
+from utils.config import BUDGET_MIN_INPUT_TOKENS
+from utils.text_processing import estimate_tokens
+from utils.token_budget import allocate, compact, context_window, truncate
+
+
+def transcript(sentences: int) -> str:
+    return " ".join(f"Part {i} talks about topic{i} and detail{i} in depth." for i in range(sentences))
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd" * 10) == 10
+    # Devanagari characters take 3 bytes each
+    assert estimate_tokens("नमस्ते") == 5
+
+
+def test_inputs_that_fit_keep_their_size():
+    assert allocate(4096, 500, 1000, {"transcript": 1000, "description": 200}) == {"transcript": 1000, "description": 200}
+
+
+def test_capped_input_leaves_the_rest_to_the_others():
+    budget = allocate(4096, 96, 1000, {"transcript": 10000, "description": 5000}, shares={"description": 0.25})
+    assert budget == {"description": 750, "transcript": 2250}
+
+
+def test_unused_share_goes_to_the_other_inputs():
+    budget = allocate(4096, 96, 1000, {"transcript": 10000, "description": 100}, shares={"description": 0.25})
+    assert budget == {"description": 100, "transcript": 2900}
+
+
+def test_inputs_keep_a_minimum_when_the_instructions_fill_the_context():
+    assert allocate(1000, 900, 500, {"transcript": 10000}) == {"transcript": BUDGET_MIN_INPUT_TOKENS}
+
+
+def test_truncate_cuts_at_a_sentence_boundary():
+    text = transcript(50)
+    cut = truncate(text, 100)
+    assert estimate_tokens(cut) <= 100
+    assert text.startswith(cut) and cut.endswith(".")
+
+
+def test_text_within_budget_is_unchanged():
+    text = transcript(5)
+    assert truncate(text, 1000) == compact(text, 1000) == text
+
+
+@pytest.mark.parametrize("strategy", ["salient", "windows"])
+def test_compact_stays_within_the_budget(strategy):
+    assert estimate_tokens(compact(transcript(500), 800, strategy=strategy)) <= 800
+
+
+def test_salient_sentences_cover_the_whole_video():
+    compacted = compact(transcript(500), 800, strategy="salient")
+    assert "Part 0 " in compacted or "Part 1 " in compacted
+    assert any(f"Part {i} " in compacted for i in range(450, 500))
+
+
+@pytest.mark.parametrize("strategy", ["salient", "windows"])
+def test_compact_empty_text(strategy):
+    assert compact("", 10, strategy=strategy) == ""
+
+
+class _Local:
+    num_ctx = 8192
+
+
+def test_context_window_of_a_model_with_num_ctx():
+    assert context_window(_Local()) == 8192
@@ -0,0 +1,46 @@
+from utils.transcript_cleanup import TranscriptCleaner
+
+
+def clean(lines: list, **kwargs) -> list:
+    cleaner = TranscriptCleaner(**kwargs)
+    return [cleaner.clean_line(line) for line in lines]
+
+
+def test_non_speech_markers_are_removed():
+    assert clean(["[Music] hello >> there ♪♪", "(applause)", "[संगीत] नमस्ते"]) == ["hello there", "", "नमस्ते"]
+
+
+def test_rolling_caption_overlap_is_dropped():
+    assert clean(["today we are", "today we are going to cook", "going to cook some dal"]) == [
+        "today we are", "going to cook", "some dal",
+    ]
+
+
+def test_single_repeated_word_is_kept():
+    # "the the" may be speech; only runs of two words or more are treated as caption overlap
+    assert clean(["the the best dal"]) == ["the the best dal"]
+
+
+def test_fillers_are_removed_only_when_asked():
+    assert clean(["Um, so uh we start"], remove_fillers=True) == ["so we start"]
+    assert clean(["Um, so uh we start"], remove_fillers=False) == ["Um, so uh we start"]
+    assert clean(["उम्म नमस्ते दोस्तों"], remove_fillers=True) == ["नमस्ते दोस्तों"]
+
+
+def test_html_entities_are_decoded():
+    assert clean(["rock &amp; roll, it&#39;s"]) == ["rock & roll, it's"]
+
+
+def test_empty_transcript():
+    cleaner = TranscriptCleaner()
+    assert cleaner.clean_text("") == ""
+    assert cleaner.stats()["tokens_before"] == cleaner.stats()["tokens_after"] == 0
+
+
+def test_stats_count_what_was_removed():
+    cleaner = TranscriptCleaner(remove_fillers=True)
+    for line in ["[Music] um today we are", "today we are going"]:
+        cleaner.clean_line(line)
+    stats = cleaner.stats()
+    assert (stats["markers"], stats["fillers"], stats["repeated_words"]) == (1, 1, 3)
+    assert stats["tokens_after"] < stats["tokens_before"]
@@ -1,36 +1,314 @@
-from langchain.prompts import PromptTemplate
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
-import json
+from langchain_core.prompts import PromptTemplate
+from utils.cache import LLMCache
+from utils.near_duplicates import NearDuplicateIndex
+from utils.model_handler import describe_llm, with_max_tokens, with_output_format, supports_output_format
+from utils.text_processing import estimate_tokens, split_into_chunks
+from utils.chapters import detect_chapters
+from utils.token_budget import get_token_counter, context_window, allocate, compact, truncate
+from utils.config import TRANSCRIPT_CHUNK_THRESHOLD, TRANSCRIPT_CHUNK_TOKENS, TRANSCRIPT_CHUNK_WORKERS, SECTION_REPAIR_RETRIES, SECTION_MAX_TOKENS, STAGE2_MODE
+from utils.config import STAGE1_OUTPUT_TOKENS, STAGE2_OUTPUT_TOKENS, DESCRIPTION_BUDGET_SHARE, TRANSCRIPT_COMPACTION, ANALYSIS_LANGUAGE, OLLAMA_OUTPUT_FORMAT
+from utils.config import LANGUAGE_WORKERS
+from utils.json_parser import IncrementalJSONParser, parse_sections
+from utils.jobs import JobCancelled, get_coordinator
+from utils import tracing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import threading, time
 
 
 class Analysis:
-    def __init__(self, llm, is_local_model):
+    def __init__(self, llm, is_local_model, cache: LLMCache = None,
+                 chunk_threshold: int = TRANSCRIPT_CHUNK_THRESHOLD,
+                 chunk_tokens: int = TRANSCRIPT_CHUNK_TOKENS,
+                 chunk_workers: int = TRANSCRIPT_CHUNK_WORKERS,
+                 repair_retries: int = SECTION_REPAIR_RETRIES,
+                 section_max_tokens: dict = None,
+                 compaction: str = TRANSCRIPT_COMPACTION,
+                 duplicates: NearDuplicateIndex = None,
+                 output_format: str = OLLAMA_OUTPUT_FORMAT,
+                 cancelled=None):
         self.__llm = llm
         self.__is_local_model = is_local_model
+        self.__cache = cache
+        self.__duplicates = duplicates
+        self.__chunk_threshold = chunk_threshold
+        self.__chunk_tokens = chunk_tokens
+        self.__chunk_workers = chunk_workers
+        self.__repair_retries = repair_retries
+        self.__section_max_tokens = {**SECTION_MAX_TOKENS, **(section_max_tokens or {})}
+        self.__timings_lock = threading.Lock()
+        self.__compaction = compaction
+        # Stage 2 is generated under constrained decoding when the backend can do it
+        self.__output_format = output_format if supports_output_format(llm) else None
+        self.__count_tokens = None
+        # Function returning True once the run is no longer wanted: model calls are then streamed
+        # and JobCancelled stops the run at the next piece, including the call in progress
+        self.__cancelled = cancelled
+        self.last_run_metrics = {}
+
+    def __cache_key(self, prompt: str, llm=None) -> str:
+        backend, model, params = describe_llm(llm or self.__llm)
+        return LLMCache.make_key(backend=backend, model=model, prompt=prompt, params=params)
+
+    def __record_timing(self, stage: str, started: float):
+        """
+            Add the time since `started` to the stage timings of the current run (last_run_metrics['timings'])
+            and record it as a tracing span.
+        """
+        tracing.record_span(stage, started)
+        self.__add_timing(stage, time.perf_counter() - started)
+
+    def __add_timing(self, stage: str, seconds: float):
+        with self.__timings_lock:
+            timings = self.last_run_metrics.setdefault('timings', {})
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def __stage(self, stage: str, **attributes):
+        """
+            Time a stage as a tracing span; LLM calls made inside it become its children.
+        """
+        started = time.perf_counter()
+        try:
+            with tracing.span(stage, **attributes) as span:
+                yield span
+        finally:
+            self.__add_timing(stage, time.perf_counter() - started)
+
+    def __record_usage(self, span: dict, llm, prompt: str, completion: str, usage: dict = None):
+        """
+            Token counts of one LLM call: reported by the backend when available, estimated otherwise.
+        """
+        backend, model, _ = describe_llm(llm)
+        span.update(
+            backend=backend,
+            model=model,
+            prompt_tokens=(usage or {}).get('input_tokens') or estimate_tokens(prompt),
+            completion_tokens=(usage or {}).get('output_tokens') or estimate_tokens(completion),
+            estimated=not usage,
+        )
+        tracing.count("llm_calls_total", backend=backend, model=model)
+        tracing.count("llm_prompt_tokens_total", span['prompt_tokens'], backend=backend, model=model)
+        tracing.count("llm_completion_tokens_total", span['completion_tokens'], backend=backend, model=model)
 
-    def __seo_response_schema(self):
+    def __fit_inputs(self, stage: str, instructions: str, inputs: dict, output_tokens: int, shares: dict = None) -> dict:
+        """
+            Fit the prompt inputs into the model context next to the instructions (the prompt
+            formatted with empty inputs) and the tokens reserved for the answer.
+            The description is cut at a sentence boundary, other inputs are compacted.
+            The budget and the compression ratio of every input are kept in last_run_metrics['budget'].
+            Output: Input name -> text that fits its budget.
+        """
+        if self.__count_tokens is None:
+            self.__count_tokens = get_token_counter(self.__llm)
+        count_tokens = self.__count_tokens
+
+        sizes = {name: count_tokens(text) for name, text in inputs.items()}
+        context_tokens = context_window(self.__llm)
+        instruction_tokens = count_tokens(instructions)
+        budget = allocate(context_tokens, instruction_tokens, output_tokens, sizes, shares)
+
+        fitted, report = {}, {}
+        for name, text in inputs.items():
+            if sizes[name] <= budget[name]:
+                fitted[name] = text
+            elif name == 'description':
+                fitted[name] = truncate(text, budget[name], count_tokens=count_tokens)
+            else:
+                fitted[name] = compact(text, budget[name], strategy=self.__compaction, count_tokens=count_tokens)
+            kept = sizes[name] if fitted[name] is text else count_tokens(fitted[name])
+            report[name] = {'tokens': sizes[name], 'budget': budget[name], 'kept': kept, 'ratio': round(kept / sizes[name], 3) if sizes[name] else 1.0}
+            if kept < sizes[name]:
+                tracing.count("inputs_compacted_total", stage=stage, input=name)
+
+        self.last_run_metrics.setdefault('budget', {})[stage] = {
+            'context_tokens': context_tokens,
+            'instruction_tokens': instruction_tokens,
+            'output_tokens': output_tokens,
+            'inputs': report,
+        }
+        tracing.log("token_budget", stage=stage, **self.last_run_metrics['budget'][stage])
+        return fitted
+
+    def __invoke(self, prompt: str, use_cache: bool = True, llm=None) -> str:
+        """
+            Call the LLM (or the given variant of it) and return the raw completion text.
+            Completions are looked up in (and written to) the cache when one is configured.
+        """
+        llm = llm or self.__llm
+        key = self.__cache_key(prompt, llm) if self.__cache is not None else None
+        if key and use_cache:
+            cached = self.__cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self.__cancelled is not None:
+            # Streamed, so a cancellation does not wait for the whole completion
+            response = "".join(self.__stream(prompt, use_cache=False, llm=llm))
+        else:
+            # Every session shares the backend, so the call waits for a free slot first
+            with get_coordinator().llm_slot(describe_llm(llm)[0]) as waited, tracing.span("llm_call", queue_seconds=waited) as span:
+                response = llm.invoke(prompt)
+                usage = getattr(response, 'usage_metadata', None)
+                if self.__is_local_model:
+                    response = str(response.content)
+                self.__record_usage(span, llm, prompt, response, usage)
+
+        if key:
+            self.__cache.set(key, response)
+        return response
+
+    def __stream(self, prompt: str, use_cache: bool = True, llm=None):
+        """
+            Yield the completion text piece by piece as the model (or the given variant of it) generates it.
+            A cached completion is yielded at once; storing the completion is left to the caller.
+            Raises JobCancelled at the next piece once the run is cancelled, closing the model's stream.
+        """
+        llm = llm or self.__llm
+        if self.__cache is not None and use_cache:
+            cached = self.__cache.get(self.__cache_key(prompt, llm))
+            if cached is not None:
+                yield cached
+                return
+
+        self.__check_cancelled()
+        with get_coordinator().llm_slot(describe_llm(llm)[0]) as waited:
+            # Recorded with record_span: a span context cannot stay open across the yields
+            started = time.perf_counter()
+            pieces = []
+            usage = None
+            chunks = iter(llm.stream(prompt))
+            try:
+                for chunk in chunks:
+                    self.__check_cancelled()
+                    text = chunk.content if self.__is_local_model else chunk
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    if text:
+                        if not pieces:
+                            time_to_first_token = time.perf_counter() - started
+                        pieces.append(str(text))
+                        yield str(text)
+            finally:
+                # Ends the request, so the backend stops generating
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+
+        span = {'stream': True, 'queue_seconds': waited, 'time_to_first_token': time_to_first_token if pieces else None}
+        self.__record_usage(span, llm, prompt, "".join(pieces), usage)
+        tracing.record_span("llm_call", started, **span)
+
+    def __check_cancelled(self):
+        if self.__cancelled is not None and self.__cancelled():
+            raise JobCancelled()
+
+    def __seo_response_schema(self, chapters: bool = False):
         """
             Create a Structured Output for SEO Recommendations.
+            With chapters detected from the transcript, the timestamps only need their labels.
         """
+        # The langchain package takes most of a second to import, so it is only loaded once an analysis runs
+        from langchain.output_parsers import StructuredOutputParser, ResponseSchema
         response_schema = [
             ResponseSchema(name="title", description="A list of title suggestion objects with 'rank', 'title' and 'reason' fields"),
             ResponseSchema(name="description", description="An SEO optimized video description between 400-500 words."),
             ResponseSchema(name="tags", description="A list of exactly 35 trending tags/hashtags."),
-            ResponseSchema(name="timestamp", description="A list timestamp objects with 'time' and 'description' fields more the 5 timestamps of video.")   
+            ResponseSchema(name="timestamp", description="An object mapping every chapter number to its short label." if chapters else "A list timestamp objects with 'time' and 'description' fields more the 5 timestamps of video.")   
         ]
         return StructuredOutputParser.from_response_schemas(response_schema)
     
-    def seo_analysis(self, video_url: str, meta_data: dict, language: str='English'):
+    def __output_schema(self, sections: list, context: dict) -> dict:
         """
-            Runs a SEO Analysis using agents.
+            JSON schema of a stage-2 answer with the given sections, after __seo_response_schema:
+            the shape of every section as the instructions ask for it, with its counts.
+            Lists are used instead of the "0", "1", ... objects, so the counts can be enforced.
+        """
+        chapters = bool(context.get('chapters'))
+        descriptions = {schema.name: schema.description for schema in self.__seo_response_schema(chapters=chapters).response_schemas}
+
+        def items(item: dict, count: int) -> dict:
+            return {"type": "array", "items": item, "minItems": count, "maxItems": count}
+
+        shapes = {
+            'title': items({"type": "object", "properties": {"rank": {"type": "integer"}, "title": {"type": "string"}}, "required": ["rank", "title"]}, 7),
+            'tags': items({"type": "string"}, 35),
+            'description': {"type": "string"},
+            'timestamp': items({"type": "string"}, context['num_of_chapters']) if chapters
+                         else items({"type": "object", "properties": {"time": {"type": "string"}, "description": {"type": "string"}},
+                                     "required": ["time", "description"]}, context['num_of_timestamps']),
+        }
+        return {
+            "type": "object",
+            "properties": {section: {**shapes[section], "description": descriptions[section]} for section in sections},
+            "required": list(sections),
+        }
+
+    def __constrained(self, llm, sections: list, context: dict):
+        """
+            The LLM constrained to a stage-2 answer with these sections, when constrained decoding is on.
+        """
+        if not self.__output_format:
+            return llm
+        return with_output_format(llm, self.__output_schema(sections, context) if self.__output_format == "schema" else "json")
+
+    def __summarize_transcript(self, platform: str, title: str, transcript: str, language: str) -> str:
+        """
+            Map step for long transcripts: summarize token-bounded chunks concurrently
+            and return the summaries in order, ready to replace the raw transcript.
+        """
+        chunks = split_into_chunks(transcript, max_tokens=self.__chunk_tokens)
+
+        chunk_template = PromptTemplate(
+            template="""
+        You are summarizing part {part} of {total} of the transcript of the {platform} video titled '{title}'.
+
+        Transcript part:
+        {chunk}
+
+        Summarize this part in {language} in at most 150 words.
+        Keep the key points, topics discussed and any notable moments, in the order they appear.
+        """,
+            input_variables=['part', 'total', 'platform', 'title', 'chunk', 'language']
+        )
+        prompts = [
+            chunk_template.format(part=i, total=len(chunks), platform=platform, title=title, chunk=chunk, language=language)
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+
+        with ThreadPoolExecutor(max_workers=max(1, self.__chunk_workers)) as executor:
+            summaries = list(executor.map(tracing.bind(self.__invoke), prompts))
+
+        parts = [f"Part {i}/{len(summaries)}: {summary.strip()}" for i, summary in enumerate(summaries, start=1)]
+        return f"[Condensed from the full transcript in {len(parts)} parts]\n" + "\n\n".join(parts)
+
+    def __content_analysis(self, video_url: str, meta_data: dict, reuse_duplicates: bool = True) -> str:
         """
+            Stage 1: analyze the video content (summary, topics, tone, audience, structure).
+            Always written in ANALYSIS_LANGUAGE: it does not depend on the language of the
+            recommendations, so every language shares it (and its cache entry).
+            With a near-duplicate index, the analysis of an earlier video with nearly the same
+            transcript (re-upload, mirror) is reused instead, unless reuse_duplicates is False.
+        """
+        language = ANALYSIS_LANGUAGE
         platform = meta_data.get('platform', 'Youtube')
         title = meta_data.get('title', '')
         transcript = meta_data.get('transcript', '')
-        duration = meta_data.get('duration', 0)
-        duration_in_minutes = duration // 60
-        num_of_timestamps = max(6, min(duration_in_minutes // 5, 60))
-        
+        video_id = meta_data.get('video_id')
+
+        signature = self.__duplicates.signature(transcript) if self.__duplicates is not None else None
+        if signature is not None and reuse_duplicates:
+            with self.__stage('near_duplicate') as span:
+                match = self.__duplicates.find(signature, exclude=video_id)
+                span['matched'] = match['video_id'] if match else None
+            if match:
+                self.last_run_metrics['near_duplicate'] = {'video_id': match['video_id'], 'similarity': match['similarity']}
+                return match['analysis']
+
+        # Long transcripts are summarized chunk by chunk first; short ones stay single-shot
+        if estimate_tokens(transcript) > self.__chunk_threshold:
+            with self.__stage('summarize'):
+                transcript = self.__summarize_transcript(platform=platform, title=title, transcript=transcript, language=language)
+
+        started = time.perf_counter()
         template1 = PromptTemplate(
             template="""
         You are a video content analyst specialized in understanding {platform} videos, their structure, and audience appeal.
@@ -69,36 +347,37 @@ class Analysis:
             input_variables=['platform', 'video_url', 'title', 'transcript', 'language', 'description']
         )
 
+        # The transcript and description must fit in the model context next to the instructions and the answer
+        fitted = self.__fit_inputs(
+            'stage1',
+            instructions=template1.format(platform=platform, video_url=video_url, title=title, transcript="", description="", language=language),
+            inputs={'transcript': transcript, 'description': meta_data['description']},
+            output_tokens=STAGE1_OUTPUT_TOKENS,
+            shares={'description': DESCRIPTION_BUDGET_SHARE}
+        )
+
         # analysis_chain = template1 | self.__ollama_llm
         # analysis_response = analysis_chain.invoke({'platform': platform, 'video_url': video_url, 'title': title, 'transcript': transcript, 'description': meta_data['description'], 'language': language,})
         formatted_prompt1 = template1.format(
             platform=platform,
             video_url=video_url,
             title=title,
-            transcript=transcript,
-            description=meta_data['description'],
+            transcript=fitted['transcript'],
+            description=fitted['description'],
             language=language
         )
-
-        analysis_response = self.__llm.invoke(formatted_prompt1)
-        if self.__is_local_model:
-            analysis_response = str(analysis_response.content)
-        print(analysis_response)
-
-        parser = self.__seo_response_schema()
-        format_instructions = parser.get_format_instructions()
-
-        template2 = PromptTemplate(
-            template="""
-                You are an SEO specialist focusing on optimizing {platform} content for maximum discovery and engagement.
-
-                Based on the detailed transcript analysis of a {platform} video titled "{title}", lasting approximately {duration} seconds:
-
-                {analysis}
-
-                Generate comprehensive SEO recommendations specifically for {platform} including:
-
-                1. 7 alternative title suggestions ranked by SEO potential, each under 60 characters. Titles must be catchy, keyword-optimized, and diverse. 
+        self.__record_timing('format_stage1', started)
+
+        with self.__stage('invoke_stage1') as span:
+            analysis_response = self.__invoke(formatted_prompt1)
+            span['response_chars'] = len(analysis_response)
+        if signature is not None and video_id:
+            self.__duplicates.add(video_id, signature, analysis_response)
+        return analysis_response
+
+    # Output instructions of every stage-2 section, shared by the full prompt and the repair prompts
+    SECTION_INSTRUCTIONS = {
+        'title': """{num}7 alternative title suggestions ranked by SEO potential, each under 60 characters. Titles must be catchy, keyword-optimized, and diverse. 
                 Output format:
                 "title": {{
                     "0": {{"rank": 1, "title": "Alternative title 1"}},
@@ -108,9 +387,8 @@ class Analysis:
                     "4": {{"rank": 5, "title": "Alternative title 5"}},
                     "5": {{"rank": 6, "title": "Alternative title 6"}},
                     "6": {{"rank": 7, "title": "Alternative title 7"}}
-                }}
-
-                2. Exactly 35 trending tags or hashtags relevant to the video content.
+                }}""",
+        'tags': """{num}Exactly 35 trending tags or hashtags relevant to the video content.
                 Output format:
                 "tags": {{
                     "0": "tag1",
@@ -118,60 +396,463 @@ class Analysis:
                     "2": "tag3",
                     ...
                     "34": "tag35"
-                }}
-
-                3. A detailed and SEO-Optimized video description (500–1000 words) with:
+                }}""",
+        'description': """{num}A detailed and SEO-Optimized video description (500–1000 words) with:
                     - A hook in the first 2–3 sentences
                     - Clear value proposition
                     - Key discussion points and topics with proper keywords
                     - A strong call-to-action (CTA)
                     - Paragraphs for readability
-
-                4. Generate {num_of_timestamps} **evenly distributed and content-aware timestamps** across the full video duration (≈{duration} seconds). Analyze the full transcript to identify major sections, topic shifts, and natural transitions.
+                Output format:
+                "description": "..." """,
+        'timestamp': """{num}Generate {num_of_timestamps} **evenly distributed and content-aware timestamps** across the full video duration (≈{duration} seconds). Analyze the full transcript to identify major sections, topic shifts, and natural transitions.
                 Output format:
                 "timestamp": {{
                     "0": {{"time": "00:00", "description": "Intro"}},
                     "1": {{"time": "HH:MM", "description": "Next Key Topic"}},
                     ...
                     "{{last}}": {{"time": "HH:MM", "description": "Conclusion"}}
-                }}
+                }}""",
+    }
+
+    # Used instead of the timestamp instructions when the chapters were detected from the timed transcript
+    CHAPTER_INSTRUCTIONS = """{num}Write a short, keyword-rich label (at most 8 words) for each of these {num_of_chapters} chapters. The chapter times were detected from the transcript, keep them in the same order.
+                {chapter_list}
+                Output format:
+                "timestamp": {{
+                    "0": "Label of chapter 0",
+                    "1": "Label of chapter 1",
+                    ...
+                }}"""
+
+    def __section_instructions(self, section: str, num: str = "", context: dict = None) -> str:
+        # The instructions are template text themselves, only the numbering is filled in here
+        if section == 'timestamp' and context and context.get('chapters'):
+            return self.CHAPTER_INSTRUCTIONS.replace("{num}", num)
+        return self.SECTION_INSTRUCTIONS[section].replace("{num}", num)
+
+    def __chapters(self, meta_data: dict, max_chapters: int) -> list:
+        """
+            Chapter boundaries found locally in the timed transcript, or an empty list when the
+            transcript has no timing or too few chapters were found (the LLM then places the
+            timestamps itself).
+        """
+        if not meta_data.get('segments'):
+            return []
+        started = time.perf_counter()
+        chapters = detect_chapters(meta_data.get('transcript', ''), meta_data['segments'], duration=meta_data.get('duration', 0), max_chapters=max_chapters)
+        self.last_run_metrics['chapters'] = {'count': len(chapters), 'seconds': time.perf_counter() - started}
+        self.__record_timing('chapters', started)
+        return chapters
+
+    def __recommendation_context(self, meta_data: dict, analysis_response: str, language: str) -> dict:
+        duration = meta_data.get('duration', 0)
+        duration_in_minutes = duration // 60
+        num_of_timestamps = max(6, min(duration_in_minutes // 5, 60))
+        chapters = self.__chapters(meta_data, max_chapters=num_of_timestamps)
+        context = {
+            'platform': meta_data.get('platform', 'Youtube'),
+            'title': meta_data.get('title', ''),
+            'analysis': analysis_response,
+            'num_of_timestamps': num_of_timestamps,
+            'duration': duration,
+            'language': language,
+            'chapters': chapters,
+            'num_of_chapters': len(chapters),
+            'chapter_list': "\n                ".join(
+                f"{i}. [{chapter['time']}] keywords: {', '.join(chapter['keywords'])} | starts with: \"{chapter['excerpt'][:120]}\""
+                for i, chapter in enumerate(chapters)
+            ),
+        }
+        # Sized for the full prompt, the per-section prompts are shorter
+        context['analysis'] = self.__fit_inputs(
+            'stage2',
+            instructions=self.__recommendation_prompt({**context, 'analysis': ""}),
+            inputs={'analysis': analysis_response},
+            output_tokens=STAGE2_OUTPUT_TOKENS
+        )['analysis']
+        return context
+
+    def __recommendation_prompt(self, context: dict) -> str:
+        """
+            Stage 2 prompt: SEO recommendations based on the stage-1 analysis.
+        """
+        parser = self.__seo_response_schema(chapters=bool(context['chapters']))
+        # Under constrained decoding the model cannot leave the schema, the instructions would only cost prompt tokens
+        format_instructions = "" if self.__output_format else parser.get_format_instructions()
+
+        template2 = PromptTemplate(
+            template="""
+                You are an SEO specialist focusing on optimizing {platform} content for maximum discovery and engagement.
+
+                Based on the detailed transcript analysis of a {platform} video titled "{title}", lasting approximately {duration} seconds:
+
+                {analysis}
+
+                Generate comprehensive SEO recommendations specifically for {platform} including:
+
+                """ + self.__section_instructions('title', "1. ", context) + """
+
+                """ + self.__section_instructions('tags', "2. ", context) + """
+
+                """ + self.__section_instructions('description', "3. ", context) + """
+
+                """ + self.__section_instructions('timestamp', "4. ", context) + """
 
                 {format_instructions}
 
                 Respond ONLY in VALID JSON format.
                 All content must be in {language}.
             """,
-            input_variables=['platform', 'title', 'analysis', 'num_of_timestamps', 'duration', 'language'],
+            input_variables=['platform', 'title', 'analysis', 'num_of_timestamps', 'duration', 'language', 'num_of_chapters', 'chapter_list'],
             partial_variables={'format_instructions': format_instructions}
         )
 
         # recommendation_chain = template2 | self.__ollama_llm
         # response = recommendation_chain.invoke({'platform': platform, 'title': title, 'analysis': str(analysis_response), 'num_of_timestamps': num_of_timestamps, 'duration': duration, 'language': language})
-        formatted_prompt2 = template2.format(
-            platform=platform,
-            title=title,
-            analysis=analysis_response,
-            num_of_timestamps=num_of_timestamps,
-            duration=duration,
-            language=language
+        return template2.format(**context)
+
+    def __section_prompt(self, section: str, context: dict) -> str:
+        """
+            Short prompt that asks for a single stage-2 section only.
+        """
+        template = PromptTemplate(
+            template="""
+                You are an SEO specialist focusing on optimizing {platform} content for maximum discovery and engagement.
+
+                Based on the detailed transcript analysis of a {platform} video titled "{title}", lasting approximately {duration} seconds:
+
+                {analysis}
+
+                Generate only the following for {platform}:
+
+                """ + self.__section_instructions(section, context=context) + """
+
+                Respond ONLY with a VALID JSON object containing just the "{section}" key.
+                All content must be in {language}.
+            """,
+            input_variables=['platform', 'title', 'analysis', 'num_of_timestamps', 'duration', 'language', 'num_of_chapters', 'chapter_list'],
+            partial_variables={'section': section}
         )
+        return template.format(**context)
+
+    def __chapter_labels(self, value, chapters: list):
+        """
+            Pair the labels written by the model with the detected chapters. Chapters the
+            model skipped are labelled with their keywords.
+        """
+        items = list(value.values()) if isinstance(value, dict) else value
+        if not isinstance(items, list):
+            return None
+        labels = []
+        for item in items:
+            if isinstance(item, dict):
+                item = item.get('description') or item.get('label') or item.get('title')
+            labels.append(str(item).strip() if isinstance(item, (str, int, float)) else "")
+        if not any(labels):
+            return None
+
+        timestamps = {}
+        for i, chapter in enumerate(chapters):
+            label = labels[i] if i < len(labels) and labels[i] else ", ".join(chapter['keywords'][:3]).capitalize()
+            timestamps[str(i)] = {'time': chapter['time'], 'description': label}
+        return timestamps
+
+    def __section_names(self) -> list:
+        return [schema.name for schema in self.__seo_response_schema().response_schemas]
+
+    def __validate_section(self, section: str, value, context: dict = None):
+        """
+            Check a parsed section against its expected shape and normalize it
+            (lists become the "0", "1", ... dicts the UI expects).
+            Output: The normalized value, or None if the section is unusable.
+        """
+        if section == 'timestamp' and context and context.get('chapters'):
+            return self.__chapter_labels(value, context['chapters'])
+        if section == 'description':
+            if isinstance(value, list):
+                value = "\n\n".join(str(item) for item in value)
+            return value.strip() if isinstance(value, str) and value.strip() else None
+
+        items = list(value.values()) if isinstance(value, dict) else value
+        if section == 'tags' and isinstance(items, str):
+            items = items.split(",")
+        if not isinstance(items, list):
+            return None
+
+        normalized = []
+        for i, item in enumerate(items):
+            if section == 'tags':
+                if isinstance(item, str) and item.strip().lstrip('#').strip():
+                    normalized.append(item.strip().lstrip('#').strip())
+            elif section == 'title':
+                if isinstance(item, str):
+                    item = {'title': item}
+                if isinstance(item, dict) and isinstance(item.get('title'), str) and item['title'].strip():
+                    normalized.append({**item, 'rank': item.get('rank', i + 1)})
+            elif section == 'timestamp':
+                if isinstance(item, dict) and item.get('time') is not None and item.get('description') is not None:
+                    normalized.append({**item, 'time': str(item['time']), 'description': str(item['description'])})
+
+        return {str(i): item for i, item in enumerate(normalized)} if normalized else None
+
+    def __generate_section(self, section: str, context: dict, attempts: int, use_cache: bool = True) -> tuple:
+        """
+            Generate a single section with its own prompt and output token budget.
+            Output: (validated value or None, number of model calls made).
+        """
+        prompt = self.__section_prompt(section, context)
+        llm = self.__constrained(with_max_tokens(self.__llm, self.__section_max_tokens[section]), [section], context)
+        for attempt in range(1, attempts + 1):
+            with tracing.span("section", section=section, attempt=attempt):
+                raw_response = self.__invoke(prompt, use_cache=use_cache and attempt == 1, llm=llm)
+                value = self.__validate_section(section, parse_sections(raw_response).get(section), context)
+            if value is not None:
+                return value, attempt
+            tracing.count("parse_failures_total", section=section, prompt="section")
+            # Never serve the invalid completion again, the next attempt must be a fresh generation
+            if self.__cache is not None:
+                self.__cache.delete(self.__cache_key(prompt, llm))
+        return None, attempts
+
+    def __generate_sections_parallel(self, context: dict, use_cache: bool = True):
+        """
+            Parallel stage 2: every section is requested with its own prompt at the same time.
+            Yields (section, value) pairs in completion order.
+        """
+        metrics = {'recovered_sections': [], 'repaired_sections': [], 'missing_sections': [], 'retries': 0}
+        sections = self.__section_names()
+        with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+            futures = {
+                executor.submit(tracing.bind(self.__generate_section), section, context, 1 + self.__repair_retries, use_cache): section
+                for section in sections
+            }
+            for future in as_completed(futures):
+                section = futures[future]
+                value, calls = future.result()
+                metrics['retries'] += calls - 1
+                if value is None:
+                    metrics['missing_sections'].append(section)
+                    continue
+                metrics['recovered_sections' if calls == 1 else 'repaired_sections'].append(section)
+                yield section, value
+
+        self.last_run_metrics['parse'] = metrics
+        tracing.log("sections", **metrics)
+
+    def __parse_recommendations(self, raw_response: str, prompt: str, context: dict, llm=None) -> dict:
+        """
+            Tolerant stage-2 parsing: every valid section of the response is kept and only
+            the missing or invalid ones are generated again with a short targeted prompt.
+            llm is the variant of the model the response came from (for its cache entry).
+        """
+        metrics = {'recovered_sections': [], 'repaired_sections': [], 'missing_sections': [], 'retries': 0}
+        sections = {}
+        started = time.perf_counter()
+        parsed = parse_sections(raw_response)
+        for section in self.__section_names():
+            value = self.__validate_section(section, parsed.get(section), context)
+            if value is not None:
+                sections[section] = value
+            else:
+                tracing.count("parse_failures_total", section=section, prompt="full")
+        metrics['recovered_sections'] = list(sections)
+        self.__record_timing('parse', started)
+
+        if self.__cache is not None:
+            if sections:
+                self.__cache.set(self.__cache_key(prompt, llm), raw_response)
+            else:
+                # Do not serve a useless completion again on the next try
+                self.__cache.delete(self.__cache_key(prompt, llm))
+
+        missing = [section for section in self.__section_names() if section not in sections]
+        if missing:
+            with self.__stage('repair', sections=missing):
+                for section in missing:
+                    value, calls = self.__generate_section(section, context, attempts=self.__repair_retries)
+                    metrics['retries'] += calls
+                    if value is not None:
+                        sections[section] = value
+                        metrics['repaired_sections'].append(section)
+                    else:
+                        metrics['missing_sections'].append(section)
+        for section in metrics['missing_sections']:
+            tracing.count("sections_missing_total", section=section)
+
+        self.last_run_metrics['parse'] = metrics
+        tracing.log("sections", **metrics)
+        return sections
+
+    def __fork(self):
+        """
+            A new Analysis with the same model, cache and settings, so a concurrent run keeps its own metrics.
+        """
+        return Analysis(llm=self.__llm, is_local_model=self.__is_local_model, cache=self.__cache,
+                        chunk_threshold=self.__chunk_threshold, chunk_tokens=self.__chunk_tokens, chunk_workers=self.__chunk_workers,
+                        repair_retries=self.__repair_retries, section_max_tokens=self.__section_max_tokens, compaction=self.__compaction,
+                        duplicates=self.__duplicates, output_format=self.__output_format, cancelled=self.__cancelled)
 
-        raw_response = self.__llm.invoke(formatted_prompt2)
+    def __languages_fan_out(self, context: dict, languages: list, mode: str, force_regenerate: bool) -> dict:
+        """
+            Stage 2 of every language at the same time, all from the same stage-1 analysis.
+            Output: language -> sections. The metrics of every language are kept in last_run_metrics['languages'].
+        """
+        forks = {language: self.__fork() for language in languages}
+        with self.__stage('languages', languages=list(languages)), ThreadPoolExecutor(max_workers=min(len(languages), LANGUAGE_WORKERS)) as executor:
+            futures = {
+                language: executor.submit(tracing.bind(fork.__recommendations), {**context, 'language': language}, mode, force_regenerate)
+                for language, fork in forks.items()
+            }
+            results = {language: future.result() for language, future in futures.items()}
+        self.last_run_metrics['languages'] = {language: fork.last_run_metrics for language, fork in forks.items()}
+        return results
+
+    def __recommendations(self, context: dict, mode: str, force_regenerate: bool) -> dict:
+        """
+            Stage 2 without streaming: all sections in one call, or one call per section in parallel mode.
+        """
+        if mode == 'parallel':
+            with self.__stage('sections'):
+                return dict(self.__generate_sections_parallel(context, use_cache=not force_regenerate))
 
-        if self.__is_local_model:
-            raw_response = raw_response.content
+        started = time.perf_counter()
+        formatted_prompt2 = self.__recommendation_prompt(context)
+        self.__record_timing('format_stage2', started)
 
-        start = raw_response.find('{')
-        end = raw_response.rfind('}') + 1
-        json_substring = raw_response[start:end]
+        llm = self.__constrained(self.__llm, list(self.SECTION_INSTRUCTIONS), context)
+        with self.__stage('invoke_stage2'):
+            raw_response = self.__invoke(formatted_prompt2, use_cache=not force_regenerate, llm=llm)
+        return self.__parse_recommendations(raw_response, formatted_prompt2, context, llm=llm)
 
-        try:
-            data = json.loads(json_substring)
-            print(data)
-            return data
-        except json.JSONDecodeError as e:
-            print("Invalid JSON:", e)
-            return "Data not founf in JSON format"
+    def content_analysis(self, video_url: str, meta_data: dict) -> dict:
+        """
+            Stage 1 on its own, to be handed to seo_analysis / seo_analysis_stream later (stage1=).
+            Output: {'analysis': the content analysis, 'near_duplicate': the video it was reused from, or None}.
+        """
+        self.last_run_metrics = {}
+        analysis_response = self.__content_analysis(video_url=video_url, meta_data=meta_data)
+        return {'analysis': analysis_response, 'near_duplicate': self.last_run_metrics.get('near_duplicate')}
+
+    def __stage1(self, video_url: str, meta_data: dict, force_regenerate: bool, stage1: dict = None) -> str:
+        if stage1 is not None:
+            # Computed ahead of time (utils/speculation.py)
+            self.last_run_metrics['stage1_reused'] = True
+            if stage1.get('near_duplicate'):
+                self.last_run_metrics['near_duplicate'] = stage1['near_duplicate']
+            return stage1['analysis']
+        return self.__content_analysis(video_url=video_url, meta_data=meta_data, reuse_duplicates=not force_regenerate)
+
+    def seo_analysis(self, video_url: str, meta_data: dict, language: str='English', force_regenerate: bool=False, mode: str=STAGE2_MODE,
+                     languages: list = None, on_stage=None, stage1: dict = None):
+        """
+            Runs a SEO Analysis using agents.
+            With force_regenerate the cached recommendations are ignored; the stage-1
+            content analysis is still reused since it does not change between runs (but not
+            the analysis of a near-duplicate video).
+            mode='single' asks for all sections in one call, mode='parallel' issues one
+            prompt per section concurrently.
+            With a list of `languages` the content analysis runs once and the recommendations
+            of every language are generated concurrently; the result is then {language: sections}.
+            on_stage and stage1 work as in seo_analysis_stream.
+            Sections that could not be generated are left out of the result
+            (see last_run_metrics['parse']). Time spent per stage is kept in last_run_metrics['timings'].
+        """
+        on_stage = on_stage or (lambda stage: None)
+        self.last_run_metrics = {}
+        on_stage('analyzing')
+        analysis_response = self.__stage1(video_url, meta_data, force_regenerate, stage1)
+
+        context = self.__recommendation_context(meta_data=meta_data, analysis_response=analysis_response, language=(languages or [language])[0])
+        on_stage('generating')
+        if languages:
+            return self.__languages_fan_out(context, languages, mode, force_regenerate)
+        return self.__recommendations(context, mode, force_regenerate)
+
+    def seo_analysis_stream(self, video_url: str, meta_data: dict, language: str='English', force_regenerate: bool=False, mode: str=STAGE2_MODE,
+                            on_stage=None, stage1: dict = None):
+        """
+            Streaming variant of seo_analysis.
+            Yields (section, value) pairs ('title', 'tags', 'description', 'timestamp') as soon
+            as each one is complete in the generated JSON, then ('result', full result) last.
+            on_stage, when given, is called with 'analyzing', 'generating' and 'parsing' as the
+            run reaches each of them; an exception it raises stops the run.
+            stage1, a result of content_analysis() for this video, skips the content analysis.
+            Timings, including the time to the first complete section, are kept in last_run_metrics.
+        """
+        on_stage = on_stage or (lambda stage: None)
+        started = time.perf_counter()
+        self.last_run_metrics = {"sections": {}}
+
+        on_stage('analyzing')
+        analysis_response = self.__stage1(video_url, meta_data, force_regenerate, stage1)
+        self.last_run_metrics["stage1_seconds"] = time.perf_counter() - started
+
+        context = self.__recommendation_context(meta_data=meta_data, analysis_response=analysis_response, language=language)
+        on_stage('generating')
+        stage2_started = time.perf_counter()
+        if mode == 'parallel':
+            result = {}
+            for key, value in self.__generate_sections_parallel(context, use_cache=not force_regenerate):
+                elapsed = time.perf_counter() - started
+                self.last_run_metrics.setdefault("time_to_first_section", elapsed)
+                self.last_run_metrics["sections"][key] = elapsed
+                result[key] = value
+                yield key, value
+            self.__record_timing('sections', stage2_started)
+            on_stage('parsing')
+            self.last_run_metrics["total_seconds"] = time.perf_counter() - started
+            tracing.log("run", **self.last_run_metrics)
+            yield "result", result
+            return
+
+        formatted_prompt2 = self.__recommendation_prompt(context)
+
+        parser = IncrementalJSONParser()
+        emitted = set()
+        pieces = []
+        llm = self.__constrained(self.__llm, list(self.SECTION_INSTRUCTIONS), context)
+        for piece in self.__stream(formatted_prompt2, use_cache=not force_regenerate, llm=llm):
+            if not pieces:
+                self.last_run_metrics["time_to_first_token"] = time.perf_counter() - started
+            pieces.append(piece)
+            for key, value in parser.feed(piece):
+                value = self.__validate_section(key, value, context) if key in self.SECTION_INSTRUCTIONS else None
+                if value is None:
+                    continue
+                elapsed = time.perf_counter() - started
+                self.last_run_metrics.setdefault("time_to_first_section", elapsed)
+                self.last_run_metrics["sections"][key] = elapsed
+                emitted.add(key)
+                yield key, value
+
+        # Includes the time the caller spent rendering the sections streamed so far
+        self.__record_timing('invoke_stage2', stage2_started)
+        on_stage('parsing')
+        result = self.__parse_recommendations("".join(pieces), formatted_prompt2, context, llm=llm)
+        for key, value in result.items():
+            if key not in emitted:
+                self.last_run_metrics["sections"][key] = time.perf_counter() - started
+                yield key, value
+
+        self.last_run_metrics["total_seconds"] = time.perf_counter() - started
+        tracing.log("run", **self.last_run_metrics)
+        yield "result", result
+
+    def regenerate_section(self, section: str, video_url: str, meta_data: dict, language: str='English'):
+        """
+            Generate one section again without touching the others.
+            The stage-1 analysis comes from the cache when it was computed before.
+            The metrics of the previous run are replaced by those of this section (last_run_metrics).
+            Output: The new section value, or None if it could not be generated.
+        """
+        started = time.perf_counter()
+        self.last_run_metrics = {'regenerated_section': section}
+        analysis_response = self.__content_analysis(video_url=video_url, meta_data=meta_data)
+        context = self.__recommendation_context(meta_data=meta_data, analysis_response=analysis_response, language=language)
+        value, _ = self.__generate_section(section, context, attempts=1 + self.__repair_retries, use_cache=False)
+        self.last_run_metrics['total_seconds'] = time.perf_counter() - started
+        return value
 
 
 # v = VideoExtraction()
@@ -0,0 +1,80 @@
+"""
+    The fetch + SEO analysis pipeline as a background job (see utils/jobs.py), so a caller
+    does not have to wait for it: it polls the job for its stage and finished sections,
+    can cancel it, and gets the result from the job once it is done.
+"""
+from utils import tracing
+from utils.analysis import Analysis
+from utils.cache import LLMCache, MetaDataCache
+from utils.near_duplicates import NearDuplicateIndex
+from utils.transcript_store import TranscriptStore
+from utils.speculation import Speculator
+from utils.jobs import BackgroundJob, get_coordinator
+from utils.model_handler import describe_llm
+from utils.video_extraction import VideoExtraction
+from utils.config import STAGE2_MODE
+
+# Stages a job goes through, in order
+ANALYSIS_STAGES = ['fetching', 'analyzing', 'generating', 'parsing']
+
+
+def _run_analysis(job: BackgroundJob, llm, is_local_model: bool, video_url: str, video_id: str, meta_data: dict,
+                  languages: list, mode: str, force_regenerate: bool, llm_cache: LLMCache, metadata_cache: MetaDataCache,
+                  duplicates: NearDuplicateIndex, transcripts: TranscriptStore, speculator: Speculator) -> dict:
+    job.set_stage('fetching')
+    if meta_data and transcripts is not None:
+        # None when the transcript was evicted from the store: fetched again below
+        meta_data = transcripts.restore(meta_data)
+    if not meta_data:
+        extraction = VideoExtraction(cache=metadata_cache)
+        meta_data = get_coordinator().run(("fetch", video_id), extraction.get_meta_data, video_id=video_id)
+        job.info['meta_data'] = transcripts.put(meta_data) if transcripts is not None and meta_data else meta_data
+    # Stage 1 computed while the user was reading the video info (a forced run analyzes the video again)
+    stage1 = speculator.take(video_id, llm, waiting_job=job) if speculator is not None and not force_regenerate else None
+
+    # Checked on every streamed piece of every model call, so Cancel also stops the call in progress
+    analysis = Analysis(llm=llm, is_local_model=is_local_model, cache=llm_cache, duplicates=duplicates,
+                        cancelled=lambda: job.cancel_requested)
+    results = {}
+    with tracing.trace("seo_analysis", mode=mode, languages=languages, job_id=job.job_id) as run_trace:
+        if len(languages) > 1:
+            # One stage-1 analysis for every language; partial sections are only streamed for a single language
+            results = analysis.seo_analysis(video_url=video_url, meta_data=meta_data, languages=languages,
+                                            force_regenerate=force_regenerate, mode=mode, on_stage=job.set_stage, stage1=stage1)
+        else:
+            for section, value in analysis.seo_analysis_stream(video_url=video_url, meta_data=meta_data, language=languages[0],
+                                                               force_regenerate=force_regenerate, mode=mode, on_stage=job.set_stage, stage1=stage1):
+                if section == 'result':
+                    results[languages[0]] = value
+                else:
+                    job.add_partial(section, value)
+    job.info['trace'] = run_trace.summary()
+    job.info['metrics'] = analysis.last_run_metrics
+    return results
+
+
+def submit_analysis(llm, is_local_model: bool, video_url: str, video_id: str, meta_data: dict = None, languages: list = ('English',),
+                    mode: str = STAGE2_MODE, force_regenerate: bool = False, llm_cache: LLMCache = None,
+                    metadata_cache: MetaDataCache = None, duplicates: NearDuplicateIndex = None,
+                    transcripts: TranscriptStore = None, speculator: Speculator = None, owner: str = None) -> BackgroundJob:
+    """
+        input (Parameter): Model, video (its meta data when already fetched), the languages of the
+        recommendations and the analysis options.
+        Output: The background job. Requests for the same video, languages, model, mode and
+        force flag share the job already running.
+        The job's result is {language: recommendations}; job.info keeps the video URL, the meta
+        data, and once finished the trace summary and last_run_metrics of the run.
+        With a transcript store, meta_data may be the session's version from TranscriptStore.put()
+        and job.info only keeps that version, not the transcript.
+        With a speculator, the stage-1 analysis it started for the video is used when there is one.
+        owner (a session or API client id) is what cancels the job: job.cancel(owner).
+    """
+    languages = list(languages)
+    key = ('analysis', video_id, tuple(languages), *describe_llm(llm)[:2], mode, force_regenerate)
+    info = {'video_url': video_url, 'video_id': video_id, 'meta_data': meta_data, 'languages': languages, 'mode': mode}
+    return get_coordinator().submit(
+        key,
+        lambda job: _run_analysis(job, llm, is_local_model, video_url, video_id, meta_data, languages, mode, force_regenerate, llm_cache, metadata_cache, duplicates, transcripts, speculator),
+        info=info,
+        owner=owner
+    )
@@ -0,0 +1,246 @@
+"""
+    Headless batch runner for analyzing many videos without the Streamlit UI.
+
+    Usage:
+        python -m utils.batch urls.jsonl --output results.jsonl --backend local
+
+    Every input line is either a JSON object ({"url": ..., "language": ...}), a JSON
+    string or a bare URL. Results are appended to the output file as JSON lines as soon
+    as they are ready; re-running with the same output file skips the videos that
+    already succeeded.
+"""
+import argparse, json, os, queue, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from utils.video_extraction import VideoExtraction
+from utils.analysis import Analysis
+from utils.cache import MetaDataCache, LLMCache
+from utils.near_duplicates import NearDuplicateIndex
+from utils import tracing
+from utils.config import HUGGINGFACE_API_KEY, BATCH_IO_WORKERS, BATCH_LLM_WORKERS, NEAR_DUPLICATE_REUSE
+
+
+def percentile(values: list, q: float) -> float:
+    """
+        input (Parameter): List of numbers and the percentile (0-100).
+        Output: Linearly interpolated percentile, or 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def read_items(path: str) -> list:
+    items = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = line
+            if isinstance(item, str):
+                item = {"url": item}
+            items.append({"url": item["url"], "language": item.get("language", "English")})
+    return items
+
+
+def item_key(item: dict) -> str:
+    return f"{item['url']}|{item.get('language', 'English')}"
+
+
+def completed_keys(output_path: str) -> set:
+    """
+        Keys of the items that already have a successful record in the output file.
+    """
+    done = set()
+    if not output_path or not os.path.exists(output_path):
+        return done
+
+    with open(output_path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written last line of an interrupted run
+            if record.get("status") == "ok":
+                done.add(item_key(record))
+    return done
+
+
+class BatchRunner:
+    """
+        Two-stage pipeline: page/transcript fetches run on the I/O pool and the
+        analyses on a separate, usually much smaller, LLM pool.
+    """
+    def __init__(self, llm, is_local_model: bool, io_workers: int = BATCH_IO_WORKERS, llm_workers: int = BATCH_LLM_WORKERS,
+                 meta_cache: MetaDataCache = None, llm_cache: LLMCache = None, include_transcript: bool = False,
+                 duplicates: NearDuplicateIndex = None):
+        self.__video_extraction = VideoExtraction(cache=meta_cache)
+        self.__llm = llm
+        self.__is_local_model = is_local_model
+        self.__llm_cache = llm_cache
+        self.__duplicates = duplicates
+        self.io_workers = io_workers
+        self.llm_workers = llm_workers
+        self.include_transcript = include_transcript
+
+    def __fetch_stage(self, item: dict, llm_pool: ThreadPoolExecutor, results: queue.Queue):
+        # Every item puts exactly one record: here, or in the analysis stage once handed over
+        record = {"url": None, "language": None, "timings": {}}
+        started = time.perf_counter()
+        handed_over = False
+        try:
+            record.update(url=item["url"], language=item["language"])
+            video_id = self.__video_extraction.get_video_id(url=item["url"])
+            if not video_id:
+                raise ValueError("Invalid YouTube URL")
+            record["video_id"] = video_id
+            meta_data = self.__video_extraction.get_meta_data(video_id=video_id)
+            record["timings"]["fetch"] = time.perf_counter() - started
+            llm_pool.submit(self.__analysis_stage, record, meta_data, time.perf_counter(), results)
+            handed_over = True
+        except Exception as e:
+            record.update(status="error", stage="fetch", error=str(e))
+        finally:
+            if not handed_over:
+                record["timings"]["fetch"] = time.perf_counter() - started
+                record.setdefault("status", "error")
+                results.put(record)
+
+    def __analysis_stage(self, record: dict, meta_data: dict, queued_at: float, results: queue.Queue):
+        started = time.perf_counter()
+        record["timings"]["llm_wait"] = started - queued_at
+        analysis = None
+        try:
+            record["meta_data"] = meta_data if self.include_transcript else {k: v for k, v in meta_data.items() if k not in ("transcript", "segments")}
+            # One Analysis per video: its run metrics must not be shared between LLM workers
+            analysis = Analysis(llm=self.__llm, is_local_model=self.__is_local_model, cache=self.__llm_cache, duplicates=self.__duplicates)
+            result = analysis.seo_analysis(video_url=record["url"], meta_data=meta_data, language=record["language"])
+            if not result:
+                raise ValueError("No recommendation could be parsed from the model output")
+            record.update(status="ok", result=result)
+        except Exception as e:
+            record.update(status="error", stage="analysis", error=str(e))
+        finally:
+            metrics = analysis.last_run_metrics if analysis is not None else {}
+            record.update({key: metrics[key] for key in ("parse", "near_duplicate") if key in metrics})
+            record["timings"]["analysis"] = time.perf_counter() - started
+            record.setdefault("status", "error")
+            # iter_results waits for one record per item
+            results.put(record)
+
+    def iter_results(self, items: list):
+        """
+            Process the items and yield one record per item, in completion order.
+        """
+        results = queue.Queue()
+        with ThreadPoolExecutor(max_workers=self.llm_workers, thread_name_prefix="batch-llm") as llm_pool, \
+             ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="batch-io") as io_pool:
+            for item in items:
+                io_pool.submit(self.__fetch_stage, item, llm_pool, results)
+            for _ in range(len(items)):
+                yield results.get()
+
+    def run(self, items: list, output_path: str = None, resume: bool = True) -> dict:
+        """
+            Process the items, streaming each record to `output_path` (or stdout) as JSON lines.
+            Output: Throughput summary of the run.
+        """
+        skip = completed_keys(output_path) if resume else set()
+        pending = [item for item in items if item_key(item) not in skip]
+
+        output = open(output_path, "a" if resume else "w", encoding="utf-8") if output_path else sys.stdout
+        timings = {"fetch": [], "llm_wait": [], "analysis": []}
+        succeeded = failed = 0
+        repair = {"retries": 0, "repaired_sections": 0, "missing_sections": 0}
+        started = time.perf_counter()
+        try:
+            for record in self.iter_results(pending):
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                for stage, seconds in record["timings"].items():
+                    timings[stage].append(seconds)
+                if "parse" in record:
+                    repair["retries"] += record["parse"]["retries"]
+                    repair["repaired_sections"] += len(record["parse"]["repaired_sections"])
+                    repair["missing_sections"] += len(record["parse"]["missing_sections"])
+                if record["status"] == "ok":
+                    succeeded += 1
+                else:
+                    failed += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        elapsed = time.perf_counter() - started
+        return {
+            "total": len(items),
+            "skipped": len(items) - len(pending),
+            "succeeded": succeeded,
+            "failed": failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "videos_per_minute": round((succeeded + failed) / elapsed * 60, 2) if elapsed else 0.0,
+            "repair": repair,
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "p50": round(percentile(values, 50), 3),
+                    "p95": round(percentile(values, 95), 3),
+                }
+                for stage, values in timings.items()
+            },
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate SEO recommendations for many videos.")
+    parser.add_argument("input", help="JSONL file with one video URL (or {'url', 'language'} object) per line")
+    parser.add_argument("--output", "-o", help="JSONL file the results are appended to (default: stdout)")
+    parser.add_argument("--backend", choices=["local", "huggingface"], default="local")
+    parser.add_argument("--api-key", default=os.environ.get("HUGGING_FACE_TOKEN", HUGGINGFACE_API_KEY), help="HuggingFace API key")
+    parser.add_argument("--io-workers", type=int, default=BATCH_IO_WORKERS, help="Concurrent page/transcript fetches")
+    parser.add_argument("--llm-workers", type=int, default=BATCH_LLM_WORKERS, help="Concurrent analyses")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite the output instead of skipping finished videos")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk metadata and LLM caches nor the near-duplicate index")
+    parser.add_argument("--include-transcript", action="store_true", help="Keep the full transcript in the output records")
+    parser.add_argument("--summary", help="Also write the run summary to this JSON file")
+    parser.add_argument("--metrics", help="Write the Prometheus metrics of the run (stage durations, tokens, cache hits) to this file")
+    args = parser.parse_args(argv)
+
+    from utils.model_handler import get_ollama_model, get_huggingface_model
+    if args.backend == "local":
+        llm, is_local_model = get_ollama_model(), True
+    else:
+        if not args.api_key:
+            parser.error("--api-key (or HUGGING_FACE_TOKEN) is required for the huggingface backend")
+        llm, is_local_model = get_huggingface_model(args.api_key), False
+
+    runner = BatchRunner(
+        llm=llm,
+        is_local_model=is_local_model,
+        io_workers=args.io_workers,
+        llm_workers=args.llm_workers,
+        meta_cache=None if args.no_cache else MetaDataCache(),
+        llm_cache=None if args.no_cache else LLMCache(),
+        include_transcript=args.include_transcript,
+        duplicates=None if args.no_cache or not NEAR_DUPLICATE_REUSE else NearDuplicateIndex()
+    )
+    summary = runner.run(read_items(args.input), output_path=args.output, resume=not args.no_resume)
+
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as file:
+            file.write(tracing.render_prometheus())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import hashlib, json, os, sqlite3, threading, time
+from contextlib import closing, contextmanager
+from utils import tracing
+from utils.config import CACHE_DIR, METADATA_CACHE_TTL, METADATA_CACHE_MAX_ENTRIES, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+
+
+class SQLiteCache:
+    """
+        Persistent key/value store backed by a single SQLite file.
+        Values are stored as JSON and the least recently used entries are evicted
+        once the table grows past `max_entries`. Safe to share between threads
+        and between processes pointing at the same file.
+    """
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 1000):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self.__connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table}(accessed_at)")
+
+    @contextmanager
+    def __connect(self):
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:
+                yield conn
+
+    def __count(self, hit: bool):
+        with self.__lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        tracing.count("cache_requests_total", cache=self.table, result="hit" if hit else "miss")
+
+    def get(self, key: str, ttl: float = None):
+        """
+            input (Parameter): Cache key and an optional time-to-live in seconds.
+            Output: The stored value, or None when missing or expired.
+        """
+        now = time.time()
+        with self.__connect() as conn:
+            row = conn.execute(f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.__count(hit=False)
+                return None
+
+            value, stored_at = row
+            if ttl is not None and now - stored_at > ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.__count(hit=False)
+                return None
+
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+
+        self.__count(hit=True)
+        return json.loads(value)
+
+    def set(self, key: str, value):
+        now = time.time()
+        with self.__connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            overflow = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,)
+                )
+
+    def delete(self, key: str):
+        with self.__connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self.__connect() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self.__connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
+
+
+class MetaDataCache:
+    """
+        Video metadata cache keyed by video_id.
+        Each video is stored as separate fields ('details', 'transcript' and its timed
+        'segments') so that fast-changing details such as the view count can expire long
+        before the transcript. 'no_captions' marks a video found to have no transcript at all.
+    """
+    FIELDS = ("details", "transcript", "segments", "no_captions")
+
+    def __init__(self, path: str = None, ttl: dict = None, max_entries: int = METADATA_CACHE_MAX_ENTRIES):
+        self.ttl = {**METADATA_CACHE_TTL, **(ttl or {})}
+        self.__store = SQLiteCache(
+            path=path or os.path.join(CACHE_DIR, "metadata.sqlite3"),
+            table="meta_data",
+            max_entries=max_entries
+        )
+        self.__lock = threading.Lock()
+        self.__counters = {field: {"hits": 0, "misses": 0} for field in self.FIELDS}
+
+    def get(self, video_id: str, field: str):
+        value = self.__store.get(f"{video_id}:{field}", ttl=self.ttl.get(field))
+        with self.__lock:
+            self.__counters[field]["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, video_id: str, field: str, value):
+        self.__store.set(f"{video_id}:{field}", value)
+
+    def invalidate(self, video_id: str):
+        for field in self.FIELDS:
+            self.__store.delete(f"{video_id}:{field}")
+
+    def stats(self) -> dict:
+        stats = self.__store.stats()
+        with self.__lock:
+            stats["fields"] = {field: dict(counts) for field, counts in self.__counters.items()}
+        return stats
+
+
+class LLMCache:
+    """
+        Content-addressed cache of raw LLM completions.
+        Keys are a hash of the backend, model, prompt and sampling parameters, so any
+        change in one of them results in a fresh generation.
+    """
+    def __init__(self, path: str = None, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.__store = SQLiteCache(
+            path=path or os.path.join(CACHE_DIR, "llm.sqlite3"),
+            table="completions",
+            max_entries=max_entries
+        )
+
+    @staticmethod
+    def make_key(backend: str, model: str, prompt: str, params: dict = None) -> str:
+        payload = json.dumps([backend, model, prompt, params or {}], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        return self.__store.get(key, ttl=self.ttl)
+
+    def set(self, key: str, completion: str):
+        self.__store.set(key, completion)
+
+    def delete(self, key: str):
+        self.__store.delete(key)
+
+    def stats(self) -> dict:
+        return self.__store.stats()
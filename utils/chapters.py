@@ -0,0 +1,142 @@
+"""
+    Local chapter detection over timed transcript segments.
+
+    The transcript is cut into fixed-length time blocks and the TF-IDF similarity of the
+    blocks before and after every gap is compared over a sliding window (TextTiling).
+    Gaps where the vocabulary changes the most become chapter boundaries, so only the
+    short chapter labels are left to the LLM.
+"""
+import math, re
+from collections import Counter
+from utils.config import CHAPTER_BLOCK_SECONDS, CHAPTER_WINDOW_BLOCKS, CHAPTER_MIN_SECONDS, CHAPTER_MIN_DEPTH, CHAPTER_MIN_COUNT
+
+_MARKER = re.compile(r"\[[^\]]*\]")
+_WORD = re.compile(r"[\w\u0900-\u097F]+")  # \w alone splits Devanagari words at the vowel signs
+
+STOP_WORDS = set("""
+    a about above after again all also am an and any are as at be because been before being but by can could did do
+    does doing down during each few for from further get got had has have having he her here hers him his how i if in
+    into is it its just know let like me more most my no nor not now of off on once one only or other our out over own
+    really right same she should so some such than that the their them then there these they this those through to
+    too um uh under until up us very was we were what when where which while who why will with would yeah you your
+    okay ok gonna wanna going thing things
+    और का की के को में से है हैं था थे थी तो भी ही पर ये यह वो वह इस उस एक कि जो हम आप मैं तुम नहीं हाँ हां ना
+    कर करना करते किया लिए साथ बहुत अब फिर क्या कैसे मतलब अच्छा
+""".split())
+
+
+def format_time(seconds: int) -> str:
+    """
+        Chapter time as YouTube writes it: MM:SS, or H:MM:SS from one hour on.
+    """
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def tokenize(text: str) -> list:
+    return [
+        word for word in _WORD.findall(_MARKER.sub(" ", text.lower()))
+        if word not in STOP_WORDS and len(word) > 1 and not word.isdigit()
+    ]
+
+
+def _cosine(left: Counter, right: Counter, idf: dict) -> float:
+    if not left or not right:
+        return 0.0
+
+    def weight(count, term):
+        return (1 + math.log(count)) * idf[term]
+
+    dot = sum(weight(count, term) * weight(right[term], term) for term, count in left.items() if term in right)
+    if not dot:
+        return 0.0
+    norm_left = math.sqrt(sum(weight(count, term) ** 2 for term, count in left.items()))
+    norm_right = math.sqrt(sum(weight(count, term) ** 2 for term, count in right.items()))
+    return dot / (norm_left * norm_right)
+
+
+def _depth_scores(similarities: list) -> list:
+    """
+        How deep every gap lies below the highest similarity reachable on each side of it.
+    """
+    depths = []
+    for i, similarity in enumerate(similarities):
+        left = right = similarity
+        for value in reversed(similarities[:i]):
+            if value < left:
+                break
+            left = value
+        for value in similarities[i + 1:]:
+            if value < right:
+                break
+            right = value
+        depths.append((left - similarity) + (right - similarity))
+    return depths
+
+
+def detect_chapters(text: str, segments: dict, duration: int = 0, max_chapters: int = 60, min_chapters: int = CHAPTER_MIN_COUNT,
+                    block_seconds: int = CHAPTER_BLOCK_SECONDS, window_blocks: int = CHAPTER_WINDOW_BLOCKS,
+                    min_seconds: int = CHAPTER_MIN_SECONDS, min_depth: float = CHAPTER_MIN_DEPTH) -> list:
+    """
+        input (Parameter): Transcript text, its timed segments ({'starts': [ms], 'offsets': [char offset]}),
+        the video duration in seconds and the number of chapters allowed.
+        Boundaries below `min_depth` are only used to reach `min_chapters`.
+        Output: List of chapters ({'start', 'time', 'keywords', 'excerpt'}), the first one at 00:00.
+        Returns an empty list when the transcript has no usable timing or fewer than `min_chapters`
+        chapters are found (a short or single-topic video), so the caller can place timestamps otherwise.
+    """
+    starts, offsets = (segments or {}).get("starts") or [], (segments or {}).get("offsets") or []
+    if not starts or len(starts) != len(offsets):
+        return []
+
+    # Consecutive time blocks of the transcript: (start ms, start offset, term counts)
+    blocks = []
+    block_ms = block_seconds * 1000
+    for i, (start, offset) in enumerate(zip(starts, offsets)):
+        end = offsets[i + 1] if i + 1 < len(offsets) else len(text)
+        if not blocks or start // block_ms != blocks[-1][0] // block_ms:
+            blocks.append((start, offset, Counter()))
+        blocks[-1][2].update(tokenize(text[offset:end]))
+
+    document_frequency = Counter(term for _, _, counts in blocks for term in counts)
+    idf = {term: math.log(len(blocks) / df) + 1 for term, df in document_frequency.items()}
+
+    # Similarity of the window before and the window after the gap in front of every block
+    similarities = []
+    for i in range(1, len(blocks)):
+        left = sum((counts for _, _, counts in blocks[max(0, i - window_blocks):i]), Counter())
+        right = sum((counts for _, _, counts in blocks[i:i + window_blocks]), Counter())
+        similarities.append(_cosine(left, right, idf))
+
+    depths = _depth_scores(similarities)
+    end_ms = max(duration * 1000, starts[-1])
+    boundaries = [0]
+    for depth, i in sorted(((depth, i + 1) for i, depth in enumerate(depths)), reverse=True):
+        if len(boundaries) >= max_chapters or (depth < min_depth and len(boundaries) >= min_chapters) or depth <= 0:
+            break
+        start = blocks[i][0]
+        if end_ms - start < min_seconds * 1000:
+            continue
+        if all(abs(start - blocks[j][0]) >= min_seconds * 1000 for j in boundaries):
+            boundaries.append(i)
+    if len(boundaries) < min_chapters:
+        return []
+    boundaries.sort()
+
+    chapters = []
+    for n, first in enumerate(boundaries):
+        last = boundaries[n + 1] if n + 1 < len(boundaries) else len(blocks)
+        counts = sum((counts for _, _, counts in blocks[first:last]), Counter())
+        keywords = sorted(counts, key=lambda term: (-(1 + math.log(counts[term])) * idf[term], term))[:5]
+        start_offset = blocks[first][1]
+        end_offset = blocks[last][1] if last < len(blocks) else len(text)
+        start_seconds = 0 if n == 0 else blocks[first][0] // 1000
+        chapters.append({
+            "start": start_seconds,
+            "time": format_time(start_seconds),
+            "keywords": keywords,
+            "excerpt": _MARKER.sub("", text[start_offset:end_offset]).strip()[:200],
+        })
+    return chapters
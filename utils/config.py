@@ -2,4 +2,203 @@
 LOCAL_MODEL = "llava"
 
 # Enter api key if you are using locally
-HUGGINGFACE_API_KEY = ""
\ No newline at end of file
+HUGGINGFACE_API_KEY = ""
+
+# Model served through the HuggingFace Inference API
+HUGGINGFACE_MODEL = "mistralai/Mistral-7B-Instruct-v0.3"
+
+# Base URL for watch pages (point it at a local stub server for offline runs)
+YOUTUBE_BASE_URL = "https://www.youtube.com"
+
+# (connect, read) timeouts in seconds and pooled connections per host for HTTP requests
+HTTP_TIMEOUT = (5, 20)
+HTTP_POOL_SIZE = 16
+
+# Generate one token with a model as soon as it is selected, so the first analysis does not
+# wait for the model to load or the connection to open
+MODEL_WARM_UP = True
+
+# Model routing (utils/model_handler.py). Every model call gets MODEL_CALL_TIMEOUT seconds per
+# attempt (for a streamed answer: until the first piece, then between two pieces) and up to
+# MODEL_RETRIES more attempts after a timeout, a connection error or a 429/5xx answer, waiting
+# MODEL_RETRY_BACKOFF * 2^attempt seconds (with jitter) in between. Then the backend in
+# MODEL_FALLBACK is tried, unless the prompt (fitted to the first backend) does not fit its context
+MODEL_CALL_TIMEOUT = 120
+MODEL_RETRIES = 2
+MODEL_RETRY_BACKOFF = 0.5
+MODEL_FALLBACK = {"huggingface": "ollama"}
+# A backend whose calls failed MODEL_FAILURES_TO_TRIP times in a row is skipped (its fallback is
+# used directly) for MODEL_COOLDOWN_SECONDS
+MODEL_FAILURES_TO_TRIP = 3
+MODEL_COOLDOWN_SECONDS = 60
+# Hedged requests: a call still running after the backend's recent p95 latency (at least
+# MODEL_HEDGE_MIN_SECONDS) is sent a second time and the first answer wins. Off by default, it
+# doubles the load of slow calls; streamed answers are never hedged
+MODEL_HEDGING = False
+MODEL_HEDGE_MIN_SECONDS = 5.0
+# Latencies kept per backend for the p95, and the fewest before hedging starts
+MODEL_LATENCY_SAMPLES = 200
+MODEL_HEDGE_MIN_SAMPLES = 20
+# Output tokens of a HuggingFace call without its own limit (the server default is very short)
+HUGGINGFACE_MAX_NEW_TOKENS = 2500
+
+# Persistent cache shared by every session (created on first use)
+CACHE_DIR = ".cache"
+
+# Seconds before a cached field is fetched again (view counts change often, transcripts rarely do)
+METADATA_CACHE_TTL = {
+    "details": 6 * 60 * 60,
+    "transcript": 30 * 24 * 60 * 60,
+    "segments": 30 * 24 * 60 * 60,
+    # Marker of a video without any captions: it may get auto-generated ones later
+    "no_captions": 24 * 60 * 60,
+}
+
+# Maximum cached fields before the least recently used ones are evicted
+METADATA_CACHE_MAX_ENTRIES = 5000
+
+# LLM completions are cached by (backend, model, prompt, sampling params)
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+LLM_CACHE_MAX_ENTRIES = 2000
+
+# Near-duplicate transcripts (re-uploads, mirrors) reuse the stage-1 analysis of the video
+# already analyzed when their estimated similarity is at least NEAR_DUPLICATE_THRESHOLD
+NEAR_DUPLICATE_REUSE = True
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# MinHash signature length and LSH bands (rows per band = permutations / bands); 16 bands of
+# 8 rows make pairs above ~0.7 similarity candidates
+NEAR_DUPLICATE_PERMUTATIONS = 128
+NEAR_DUPLICATE_BANDS = 16
+# Transcripts are compared as sets of overlapping word n-grams (shingles)
+NEAR_DUPLICATE_SHINGLE_WORDS = 5
+# Shorter transcripts are neither indexed nor looked up (too little text to tell videos apart)
+NEAR_DUPLICATE_MIN_WORDS = 150
+NEAR_DUPLICATE_MAX_ENTRIES = 20000
+# Seconds between checks for videos indexed by other processes
+NEAR_DUPLICATE_REFRESH_SECONDS = 5.0
+
+# Transcripts of fetched videos are kept once per video outside the sessions (utils/transcript_store.py):
+# videos kept on disk, and bytes of the most recently used ones also kept in memory
+TRANSCRIPT_STORE_MAX_ENTRIES = 500
+TRANSCRIPT_STORE_MEMORY_BYTES = 64 * 1024 * 1024
+# The Video Info tab shows the transcript one page of this many characters at a time
+TRANSCRIPT_PAGE_CHARS = 5000
+TRANSCRIPT_PREVIEW_CHARS = 500
+# Recommendations of the sessions are kept outside them too (utils/result_store.py): sessions kept on disk
+RESULT_STORE_MAX_ENTRIES = 1000
+
+# Transcripts longer than this (in estimated tokens) are summarized in chunks before the analysis
+TRANSCRIPT_CHUNK_THRESHOLD = 6000
+# Size of a single chunk in estimated tokens
+TRANSCRIPT_CHUNK_TOKENS = 2500
+# Maximum chunk summaries requested from the model at the same time
+TRANSCRIPT_CHUNK_WORKERS = 4
+
+# LLM calls running at the same time per backend, across every session of the process (utils/jobs.py);
+# further calls wait in line. Backends not listed get DEFAULT_LLM_CONCURRENCY
+LLM_MAX_CONCURRENCY = {
+    "ollama": 2,
+    "huggingface": 8,
+}
+DEFAULT_LLM_CONCURRENCY = 4
+
+# Analyses running in the background at the same time (queued beyond that), and seconds a
+# finished one is kept so a refreshed page can still pick up its result
+BACKGROUND_JOB_WORKERS = 4
+BACKGROUND_JOB_RETENTION = 3600
+# Seconds between two progress updates of a running analysis in the app
+JOB_POLL_SECONDS = 1.0
+
+# Speculative work (utils/speculation.py): as soon as a valid URL is entered, the app fetches the
+# video and runs the stage-1 analysis in the background, so Generate only waits for stage 2.
+# At most SPECULATION_MAX_JOBS run at the same time per process; keep it below
+# BACKGROUND_JOB_WORKERS so requested analyses always find a free worker
+SPECULATION = True
+SPECULATION_MAX_JOBS = 2
+# A speculation that failed (backend down...) is not started again for the same video and model
+# for this many seconds, unless the URL is entered again; Generate runs the analysis regardless
+SPECULATION_FAILURE_COOLDOWN = 60
+
+# HTTP API (python api.py): port, most analyses one POST /analyze may submit, most languages
+# one analysis may ask for, and seconds between two checks of a job by the streaming endpoint
+API_PORT = 8000
+API_MAX_BATCH = 50
+API_MAX_LANGUAGES = 4
+API_STREAM_POLL_SECONDS = 0.2
+
+# Batch runner defaults (python -m utils.batch)
+BATCH_IO_WORKERS = 8
+BATCH_LLM_WORKERS = 2
+
+# Attempts to regenerate a single missing or invalid recommendation section
+SECTION_REPAIR_RETRIES = 2
+
+# Language of the stage-1 content analysis. It is shared by the recommendations of every
+# language, so switching the output language only runs stage 2 again
+ANALYSIS_LANGUAGE = "English"
+# Languages the recommendations can be written in
+LANGUAGES = ["English", "Hindi"]
+# Most languages whose stage 2 runs at the same time in one analysis (model calls are also
+# capped per backend by LLM_MAX_CONCURRENCY)
+LANGUAGE_WORKERS = 4
+
+# Stage 2 generation: "single" asks for all sections in one call, "parallel" sends one prompt per section
+STAGE2_MODE = "single"
+
+# Constrained decoding of stage 2 on local (Ollama) models: "schema" limits the answer to the JSON
+# schema of the recommendations, "json" to any JSON object (Ollama before 0.5), None leaves it to
+# the prompt. With a constraint, the format instructions are left out of the prompt
+OLLAMA_OUTPUT_FORMAT = "schema"
+
+# Output token budget of each section when it is generated on its own
+SECTION_MAX_TOKENS = {
+    "title": 400,
+    "tags": 500,
+    "description": 1600,
+    "timestamp": 1000,
+}
+
+# Chapter detection over the timed transcript (utils/chapters.py): length of a block,
+# blocks compared on each side of a gap, shortest chapter, minimum topic-shift depth and
+# the fewest chapters used (YouTube only shows chapters when there are at least 3); with fewer,
+# the LLM places the timestamps
+CHAPTER_BLOCK_SECONDS = 20
+CHAPTER_WINDOW_BLOCKS = 3
+CHAPTER_MIN_SECONDS = 30
+CHAPTER_MIN_DEPTH = 0.5
+CHAPTER_MIN_COUNT = 3
+
+# Tracing (utils/tracing.py): every finished span is written as a JSON line to
+# TRACE_LOG_FILE (stderr when None); set TRACE_METRICS_PORT to serve Prometheus metrics on /metrics
+TRACE_JSON_LOGS = True
+TRACE_LOG_FILE = None
+TRACE_METRICS_PORT = None
+
+# Context window (tokens) of each model; the prompt and the reserved answer must fit in it.
+# The local model is started with this num_ctx, so Ollama does not silently cut long prompts
+MODEL_CONTEXT_TOKENS = {
+    "llava": 4096,
+    "mistralai/Mistral-7B-Instruct-v0.3": 32768,
+}
+DEFAULT_CONTEXT_TOKENS = 4096
+
+# Tokens kept free for the answer of the content analysis and of the recommendations
+STAGE1_OUTPUT_TOKENS = 1024
+STAGE2_OUTPUT_TOKENS = 2500
+
+# Largest share of the input budget the video description may take, the transcript gets the rest
+DESCRIPTION_BUDGET_SHARE = 0.15
+
+# How a transcript that does not fit is compacted: "salient" sentences or evenly sampled "windows"
+TRANSCRIPT_COMPACTION = "salient"
+
+# Inputs always get at least this many tokens, even when the instructions leave less room
+BUDGET_MIN_INPUT_TOKENS = 512
+
+# Transcript clean-up when a transcript is fetched (utils/transcript_cleanup.py): non-speech markers like
+# [Music] and words repeated by overlapping caption lines are removed, English/Hindi filler words too when
+# TRANSCRIPT_REMOVE_FILLERS is set. Cached transcripts keep the clean-up they were fetched with
+TRANSCRIPT_CLEANUP = True
+TRANSCRIPT_REMOVE_FILLERS = True
+# Longest run of words compared with the words right before it when looking for a repeat
+TRANSCRIPT_MAX_OVERLAP_WORDS = 20
@@ -0,0 +1,341 @@
+"""
+    Process-wide coordination of the pipeline work of every Streamlit session (and batch thread).
+
+    - run(key, function) coalesces identical requests: while a job with the same key (video,
+      language, model...) is in flight, other callers wait for it and get its result instead
+      of starting the same fetch or analysis again.
+    - llm_slot(backend) caps the LLM calls running at the same time per backend
+      (LLM_MAX_CONCURRENCY); further calls wait in line, in arrival order.
+    - stats() reports running and queued calls, wait times and in-flight jobs for the UI.
+    - submit(key, function) runs a job on a background thread and returns a BackgroundJob,
+      kept here (not in a session) so a page can poll it, cancel it or reattach to it by id
+      after a refresh. An identical job still running is returned instead of a new one, and
+      its owners (sessions, API clients) are tracked: cancel(owner) only detaches that owner,
+      the job stops once none is left.
+"""
+import threading, time, uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from utils import tracing
+from utils.config import LLM_MAX_CONCURRENCY, DEFAULT_LLM_CONCURRENCY, BACKGROUND_JOB_WORKERS, BACKGROUND_JOB_RETENTION
+
+# Wait times kept per backend for the averages shown in the UI
+_RECENT_WAITS = 100
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+class JobAbandoned(Exception):
+    """
+        The job a caller was waiting for stopped without a result (its session was stopped
+        or rerun); the caller runs the job itself.
+    """
+
+
+class JobCancelled(Exception):
+    """
+        Raised inside a background job at its next stage (or, in an analysis, at the next
+        streamed piece of a model call) once it was cancelled.
+    """
+
+
+class BackgroundJob:
+    """
+        State of a job running on a background thread: current stage, partial results,
+        final result or error. Updated by the job, read by any session that polls it.
+    """
+    def __init__(self, key: tuple, info: dict = None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.key = key
+        # Whatever the caller needs to show the job again after a page refresh
+        self.info = info or {}
+        self.state = "queued"  # queued, running, done, failed, cancelled
+        self.stages = []
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        # Sessions and API clients that want the result
+        self.__owners = set()
+        self.__cancel = threading.Event()
+        self.__done = threading.Event()
+        self.__lock = threading.Lock()
+
+    def set_stage(self, stage: str):
+        """
+            Mark the start of a stage. Cancellation takes effect here.
+        """
+        if self.__cancel.is_set():
+            raise JobCancelled()
+        with self.__lock:
+            self.stages.append((stage, time.time()))
+
+    def add_partial(self, name: str, value):
+        with self.__lock:
+            self.partial[name] = value
+
+    def subscribe(self, owner: str = None) -> bool:
+        """
+            Attach an owner to the job (None only checks the job can still be joined).
+            Output: False when the job is already cancelled; the caller needs a new one.
+        """
+        with self.__lock:
+            if self.__cancel.is_set():
+                return False
+            if owner is not None:
+                self.__owners.add(owner)
+            return True
+
+    def cancel(self, owner: str = None) -> bool:
+        """
+            Detach the owner; the job is only cancelled once no owner is left. Without an
+            owner it is cancelled at once (for callers keeping track of their owners themselves).
+            Output: False when the owner is not attached to the job.
+        """
+        with self.__lock:
+            if owner is not None:
+                if owner not in self.__owners:
+                    return False
+                self.__owners.discard(owner)
+                if self.__owners:
+                    return True
+            self.__cancel.set()
+            return True
+
+    def set_finished(self, state: str):
+        self.state = state
+        self.finished = time.time()
+        self.__done.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+            Block until the job is over or the timeout expires. Output: whether the job is over.
+        """
+        return self.__done.wait(timeout)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self.__cancel.is_set()
+
+    @property
+    def stage(self) -> str:
+        with self.__lock:
+            return self.stages[-1][0] if self.stages else None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {
+                "job_id": self.job_id,
+                "state": self.state,
+                "stage": self.stages[-1][0] if self.stages else None,
+                "stages": list(self.stages),
+                "partial": dict(self.partial),
+                "result": self.result,
+                "error": self.error,
+                "created": self.created,
+                "finished": self.finished,
+                "elapsed_seconds": (self.finished or time.time()) - self.created,
+            }
+
+
+class _BackendQueue:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.running = 0
+        self.waiting = deque()
+        self.calls = 0
+        self.recent_waits = deque(maxlen=_RECENT_WAITS)
+
+
+class JobCoordinator:
+    def __init__(self, limits: dict = None, default_limit: int = DEFAULT_LLM_CONCURRENCY):
+        self.__limits = {**LLM_MAX_CONCURRENCY, **(limits or {})}
+        self.__default_limit = default_limit
+        self.__lock = threading.Lock()
+        self.__jobs = {}
+        self.__coalesced = 0
+        self.__queues = {}
+        self.__background = {}
+        self.__background_keys = {}
+        self.__executor = ThreadPoolExecutor(max_workers=BACKGROUND_JOB_WORKERS, thread_name_prefix="job")
+
+    def run(self, key: tuple, function, *args, **kwargs):
+        """
+            input (Parameter): Key identifying the job and the function (with its arguments) that does it.
+            Output: Result of the function; when the same job is already in flight, its result.
+        """
+        while True:
+            with self.__lock:
+                job = self.__jobs.get(key)
+                leader = job is None
+                if leader:
+                    job = self.__jobs[key] = Future()
+                else:
+                    self.__coalesced += 1
+            if leader:
+                break
+            tracing.count("jobs_coalesced_total", kind=key[0])
+            try:
+                return job.result()
+            except JobAbandoned:
+                continue
+
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            job.set_exception(e)
+            raise
+        except BaseException:
+            # Streamlit stops a script with exceptions that must not reach the other sessions
+            job.set_exception(JobAbandoned())
+            raise
+        else:
+            job.set_result(result)
+            return result
+        finally:
+            with self.__lock:
+                del self.__jobs[key]
+
+    def __queue(self, backend: str) -> _BackendQueue:
+        if backend not in self.__queues:
+            self.__queues[backend] = _BackendQueue(self.__limits.get(backend, self.__default_limit))
+        return self.__queues[backend]
+
+    @contextmanager
+    def llm_slot(self, backend: str):
+        """
+            Hold one of the backend's LLM slots for the duration of the block, waiting in
+            line when all of them are taken. Yields the seconds spent waiting.
+        """
+        started = time.perf_counter()
+        turn = threading.Event()
+        with self.__lock:
+            queue = self.__queue(backend)
+            if queue.running < queue.limit and not queue.waiting:
+                queue.running += 1
+                turn.set()
+            else:
+                queue.waiting.append(turn)
+        try:
+            turn.wait()
+        except BaseException:
+            self.__leave_queue(queue, turn)
+            raise
+
+        waited = time.perf_counter() - started
+        with self.__lock:
+            queue.calls += 1
+            queue.recent_waits.append(waited)
+        tracing.count("llm_queue_wait_seconds_total", waited, backend=backend)
+        try:
+            yield waited
+        finally:
+            self.__release(queue)
+
+    def __leave_queue(self, queue: _BackendQueue, turn: threading.Event):
+        with self.__lock:
+            if turn in queue.waiting:
+                queue.waiting.remove(turn)
+                return
+        # The slot was handed over while giving up, pass it on
+        self.__release(queue)
+
+    def __release(self, queue: _BackendQueue):
+        with self.__lock:
+            if queue.waiting:
+                # The slot goes straight to the next caller in line
+                queue.waiting.popleft().set()
+            else:
+                queue.running -= 1
+
+    def submit(self, key: tuple, function, info: dict = None, owner: str = None) -> BackgroundJob:
+        """
+            input (Parameter): Key identifying the job, function(job) doing it, information
+            kept with the job for the callers and the owner asking for it.
+            Output: The BackgroundJob; the one already queued or running when the key matches,
+            unless it is being cancelled.
+        """
+        with self.__lock:
+            self.__forget_finished_jobs()
+            job_id = self.__background_keys.get(key)
+            if job_id is not None and self.__background[job_id].subscribe(owner):
+                self.__coalesced += 1
+                return self.__background[job_id]
+            job = BackgroundJob(key, info)
+            job.subscribe(owner)
+            self.__background[job.job_id] = job
+            self.__background_keys[key] = job.job_id
+        self.__executor.submit(tracing.bind(self.__run_background), job, function)
+        return job
+
+    def __run_background(self, job: BackgroundJob, function):
+        job.state = "running"
+        state = "failed"
+        try:
+            if job.cancel_requested:
+                raise JobCancelled()
+            job.result = function(job)
+            state = "done"
+        except JobCancelled:
+            state = "cancelled"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            with self.__lock:
+                # A cancelled job may already have been replaced by a new one for the same key
+                if self.__background_keys.get(job.key) == job.job_id:
+                    del self.__background_keys[job.key]
+            job.set_finished(state)
+            tracing.log("background_job", job_id=job.job_id, state=job.state, seconds=job.finished - job.created, error=job.error)
+
+    def __forget_finished_jobs(self):
+        # Finished jobs stay available for a while, so a refreshed page can still show the result
+        expired = [job_id for job_id, job in self.__background.items()
+                   if job.finished and time.time() - job.finished > BACKGROUND_JOB_RETENTION]
+        for job_id in expired:
+            del self.__background[job_id]
+
+    def get_job(self, job_id: str) -> BackgroundJob:
+        with self.__lock:
+            return self.__background.get(job_id)
+
+    def stats(self) -> dict:
+        """
+            Output: Per backend: limit, running and queued calls, calls so far, average and
+            longest of the recent wait times; plus the in-flight and coalesced job counts.
+        """
+        with self.__lock:
+            backends = {
+                backend: {
+                    "limit": queue.limit,
+                    "running": queue.running,
+                    "queued": len(queue.waiting),
+                    "calls": queue.calls,
+                    "avg_wait_seconds": sum(queue.recent_waits) / len(queue.recent_waits) if queue.recent_waits else 0.0,
+                    "max_wait_seconds": max(queue.recent_waits, default=0.0),
+                }
+                for backend, queue in self.__queues.items()
+            }
+            return {
+                "backends": backends,
+                "in_flight_jobs": len(self.__jobs) + len(self.__background_keys),
+                "coalesced_jobs": self.__coalesced,
+            }
+
+
+def get_coordinator() -> JobCoordinator:
+    """
+        The coordinator shared by the whole process.
+    """
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = JobCoordinator()
+        return _coordinator
@@ -0,0 +1,198 @@
+import json, re
+
+_STRUCTURE = re.compile(r'[{}\[\]",]')
+_STRING = re.compile(r'["\\]')
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+# How many times a truncated value is cut back to an earlier comma before giving up
+_MAX_TRUNCATION_CUTS = 50
+
+
+class IncrementalJSONParser:
+    """
+        Incremental parser for the top-level members of a JSON object that is generated
+        piece by piece. Text before the opening brace (prose, code fences) is skipped.
+        Members that do not parse are kept in `invalid_members` instead of failing the whole object.
+    """
+    def __init__(self):
+        self.__text = ""
+        self.__position = 0
+        self.__member_start = 0
+        self.__started = False
+        self.__depth = 0
+        self.__in_string = False
+        self.__escaped = False
+        self.done = False
+        self.invalid_members = []
+
+    def feed(self, text: str) -> list:
+        """
+            input (Parameter): Next piece of generated text.
+            Output: List of (key, value) pairs completed by this piece.
+        """
+        if self.done or not text:
+            return []
+        self.__text += text
+
+        if not self.__started:
+            start = self.__text.find("{", self.__position)
+            if start == -1:
+                self.__position = len(self.__text)
+                return []
+            self.__started = True
+            self.__depth = 1
+            self.__position = self.__member_start = start + 1
+
+        completed = []
+        for member in self.__scan():
+            completed.extend(self.__parse_member(member))
+        return completed
+
+    def __scan(self):
+        """
+            Advance the scanner and yield the raw text of every member that ended.
+        """
+        text = self.__text
+        while self.__position < len(text):
+            if self.__escaped:
+                self.__escaped = False
+                self.__position += 1
+                continue
+
+            if self.__in_string:
+                match = _STRING.search(text, self.__position)
+                if not match:
+                    self.__position = len(text)
+                    return
+                if match.group() == "\\":
+                    self.__escaped = True
+                else:
+                    self.__in_string = False
+                self.__position = match.end()
+                continue
+
+            match = _STRUCTURE.search(text, self.__position)
+            if not match:
+                self.__position = len(text)
+                return
+            token = match.group()
+            self.__position = match.end()
+
+            if token == '"':
+                self.__in_string = True
+            elif token in "{[":
+                self.__depth += 1
+            elif token in "}]":
+                self.__depth -= 1
+                if self.__depth == 0:
+                    self.done = True
+                    yield text[self.__member_start:match.start()]
+                    return
+            elif self.__depth == 1:
+                yield text[self.__member_start:match.start()]
+                self.__member_start = match.end()
+
+    def pending_member(self) -> str:
+        """
+            Text of the member still being generated (e.g. when the output was cut off).
+        """
+        return self.__text[self.__member_start:] if self.__started and not self.done else ""
+
+    def __parse_member(self, member: str) -> list:
+        if not member.strip():
+            return []
+        try:
+            return list(json.loads("{" + member + "}").items())
+        except json.JSONDecodeError:
+            self.invalid_members.append(member)
+            return []
+
+
+def ends_in_string(text: str) -> bool:
+    in_string = escaped = False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif char == "\\" and in_string:
+            escaped = True
+        elif char == '"':
+            in_string = not in_string
+    return in_string
+
+
+def close_json(text: str) -> str:
+    """
+        Close an unterminated string and every bracket left open at the end of `text`.
+    """
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif in_string:
+            if char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    return text + ('"' if in_string else "") + "".join(reversed(stack))
+
+
+def repair_json(text: str, truncated: bool = False):
+    """
+        Best-effort repair of a single JSON value: trailing commas are dropped and a
+        truncated value is cut back to its last complete element and closed.
+        A truncated text that stops inside a string loses that string, so a half-written
+        value is never returned as if it were complete.
+        Output: The parsed value, or None when it could not be repaired.
+    """
+    candidate = _TRAILING_COMMA.sub(r"\1", text.strip())
+    if truncated and ends_in_string(candidate):
+        cut = candidate.rfind(",")
+        if cut == -1:
+            return None
+        candidate = candidate[:cut]
+    for _ in range(_MAX_TRUNCATION_CUTS):
+        try:
+            return json.loads(_TRAILING_COMMA.sub(r"\1", close_json(candidate)))
+        except json.JSONDecodeError:
+            cut = candidate.rfind(",")
+            if cut == -1:
+                return None
+            candidate = candidate[:cut]
+    return None
+
+
+def parse_sections(text: str) -> dict:
+    """
+        input (Parameter): Raw model output that should contain one JSON object.
+        Output: Dict of every top-level member that could be recovered. The whole object is
+        tried first, then each member on its own, repairing trailing commas and truncation.
+    """
+    start = text.find("{")
+    end = text.rfind("}") + 1
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end])
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            pass
+
+    parser = IncrementalJSONParser()
+    sections = dict(parser.feed(text))
+    # Complete members that failed to parse, then the one that was cut off (closed by repair_json)
+    leftovers = [("{" + member + "}", False) for member in parser.invalid_members]
+    if parser.pending_member().strip():
+        leftovers.append(("{" + parser.pending_member(), True))
+    for member, truncated in leftovers:
+        repaired = repair_json(member, truncated=truncated)
+        if isinstance(repaired, dict):
+            for key, value in repaired.items():
+                sections.setdefault(key, value)
+    return sections
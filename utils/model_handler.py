@@ -1,16 +1,540 @@
-from langchain_ollama import ChatOllama
-import streamlit as st
+from langchain_core.messages import AIMessage, AIMessageChunk
 from langchain_core.runnables import Runnable
-from utils.config import LOCAL_MODEL
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+import copy, hashlib, random, requests, sys, threading, time
+from utils import tracing
+from utils.text_processing import estimate_tokens
+from utils.config import LOCAL_MODEL, HUGGINGFACE_MODEL, MODEL_CONTEXT_TOKENS, DEFAULT_CONTEXT_TOKENS, HTTP_POOL_SIZE, MODEL_WARM_UP
+from utils.config import MODEL_CALL_TIMEOUT, MODEL_RETRIES, MODEL_RETRY_BACKOFF, MODEL_FALLBACK, MODEL_FAILURES_TO_TRIP, MODEL_COOLDOWN_SECONDS
+from utils.config import MODEL_HEDGING, MODEL_HEDGE_MIN_SECONDS, MODEL_LATENCY_SAMPLES, MODEL_HEDGE_MIN_SAMPLES, HUGGINGFACE_MAX_NEW_TOKENS
+
+# Models built so far, keyed by (backend, model, hash of the API token): the backend clients
+# and the routed models handed out. Shared by every session and Streamlit rerun of the process
+_models = {}
+_clients = {}
+_models_lock = threading.Lock()
+_warm_up_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="warm-up")
+
+# Model calls run here so the caller can stop waiting at the deadline. A call past its deadline
+# keeps its worker until the client's own timeout (set to the same value) ends it
+_call_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="model-call")
+
+# Health and latency of every backend, shared by all routed models of the process
+_health = {}
+_health_lock = threading.Lock()
+
+_api_session = None
+_api_session_lock = threading.Lock()
 
 class HuggingFaceModel(Runnable):
-    def __init__(self, client):
+    def __init__(self, client, temperature: float = 0.7, max_new_tokens: int = None):
         self.client = client
+        self.temperature = temperature
+        self.max_new_tokens = max_new_tokens
+
+    def __generation_params(self) -> dict:
+        params = {"temperature": self.temperature}
+        if self.max_new_tokens:
+            params["max_new_tokens"] = self.max_new_tokens
+        return params
 
     def invoke(self, input, config=None):
-        return self.client.text_generation(input, temperature=0.7)
+        return self.client.text_generation(input, **self.__generation_params())
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.client.text_generation(input, stream=True, **self.__generation_params())
+
+
+def get_api_session() -> requests.Session:
+    """
+        Process-wide pooled session for the HuggingFace Inference API. huggingface_hub otherwise
+        opens a new session (and TLS connection) for every thread, i.e. every Streamlit rerun.
+    """
+    global _api_session
+    with _api_session_lock:
+        if _api_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _api_session = session
+        return _api_session
+
+
+def _build_ollama(model: str, api_token: str = None):
+    # Imported on first use only, langchain_ollama alone takes about a second to import
+    from langchain_ollama import ChatOllama
+    return ChatOllama(model=model, temperature=0.7, num_ctx=MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS),
+                      client_kwargs={"timeout": MODEL_CALL_TIMEOUT})
+
+
+def _build_huggingface(model: str, api_token: str = None):
+    from huggingface_hub import InferenceClient, configure_http_backend
+    configure_http_backend(backend_factory=get_api_session)
+    return HuggingFaceModel(InferenceClient(model=model, token=api_token, timeout=MODEL_CALL_TIMEOUT), max_new_tokens=HUGGINGFACE_MAX_NEW_TOKENS)
+
+
+_BUILDERS = {"ollama": _build_ollama, "huggingface": _build_huggingface}
+_DEFAULT_MODELS = {"ollama": LOCAL_MODEL, "huggingface": HUGGINGFACE_MODEL}
+
+
+def _warm_up(llm):
+    """
+        Generate a single token, so the model is loaded and the connection is open before the first real request.
+    """
+    backend, model, _ = describe_llm(llm)
+    try:
+        with tracing.span("model_warm_up", backend=backend, model=model):
+            with_max_tokens(llm, 1).invoke("Hi")
+    except Exception as e:
+        tracing.log("model_warm_up_failed", backend=backend, model=model, error=f"{type(e).__name__}: {e}")
+
+
+def _model_key(backend: str, model: str, api_token: str) -> tuple:
+    # Only a hash of the token is kept as the key
+    return (backend, model, hashlib.sha256((api_token or "").encode("utf-8")).hexdigest()[:16])
+
+
+def _get_client(backend: str, model: str = None, api_token: str = None, warm_up: bool = False):
+    """
+        The backend's own LLM object, built (and its heavy imports done) on first use.
+    """
+    model = model or _DEFAULT_MODELS[backend]
+    key = _model_key(backend, model, api_token)
+    with _models_lock:
+        client = _clients.get(key)
+        if client is None:
+            with tracing.span("load_model", backend=backend, model=model):
+                client = _BUILDERS[backend](model, api_token)
+            _clients[key] = client
+            if warm_up:
+                _warm_up_executor.submit(tracing.bind(_warm_up), client)
+    return client
+
+
+def get_model(backend: str, model: str = None, api_token: str = None, warm_up: bool = MODEL_WARM_UP):
+    """
+        input (Parameter): Backend ('ollama' or 'huggingface'), model name (the configured one by default)
+        and the API token of the backend.
+        Output: The LLM object, a RoutedModel over the backend and its MODEL_FALLBACK. It is built
+        the first time the backend is selected, then reused by every session and rerun; warm-up
+        runs in the background. The fallback backend is only built when it is first needed.
+    """
+    model = model or _DEFAULT_MODELS[backend]
+    client = _get_client(backend, model, api_token, warm_up=warm_up)
+    key = _model_key(backend, model, api_token)
+    with _models_lock:
+        llm = _models.get(key)
+        if llm is None:
+            routes = [(backend, lambda: client)]
+            fallback = MODEL_FALLBACK.get(backend)
+            if fallback:
+                routes.append((fallback, lambda: _get_client(fallback)))
+            llm = _models[key] = RoutedModel(routes)
+    return llm
 
 
-@st.cache_resource
 def get_ollama_model():
-    return ChatOllama(model=LOCAL_MODEL, temperature=0.7)
\ No newline at end of file
+    return get_model("ollama")
+
+
+def get_huggingface_model(api_token: str, model: str = HUGGINGFACE_MODEL):
+    return get_model("huggingface", model=model, api_token=api_token)
+
+
+def _chat_ollama_class():
+    # No LLM can be a ChatOllama before langchain_ollama was imported by _build_ollama
+    module = sys.modules.get("langchain_ollama")
+    return getattr(module, "ChatOllama", None)
+
+
+def is_ollama_model(llm) -> bool:
+    chat_ollama = _chat_ollama_class()
+    return chat_ollama is not None and isinstance(llm, chat_ollama)
+
+
+def describe_llm(llm) -> tuple:
+    """
+        input (Parameter): Any of the supported LLM objects.
+        Output: (backend, model name, sampling params) used to identify its completions.
+        A RoutedModel is described by its first backend, whichever backend answers.
+    """
+    if isinstance(llm, RoutedModel):
+        primary = with_max_tokens(llm.primary, llm.max_new_tokens) if llm.max_new_tokens else llm.primary
+        return describe_llm(with_output_format(primary, llm.output_format) if llm.output_format else primary)
+
+    if isinstance(llm, HuggingFaceModel):
+        return "huggingface", getattr(llm.client, "model", None), {"temperature": llm.temperature, "max_new_tokens": llm.max_new_tokens}
+
+    if is_ollama_model(llm):
+        params = {
+            "temperature": llm.temperature,
+            "top_p": llm.top_p,
+            "top_k": llm.top_k,
+            "num_predict": llm.num_predict,
+            "num_ctx": llm.num_ctx,
+            "seed": llm.seed,
+        }
+        if llm.format:
+            # Only when set, so the completions cached before constrained decoding keep their keys
+            params["format"] = llm.format
+        return "ollama", llm.model, params
+
+    return type(llm).__name__, getattr(llm, "model", None), {
+        "temperature": getattr(llm, "temperature", None),
+        "max_new_tokens": getattr(llm, "max_new_tokens", None),
+    }
+
+
+def supports_output_format(llm) -> bool:
+    """
+        Whether the LLM (the first backend of a RoutedModel) can be constrained to JSON or a JSON schema.
+    """
+    return is_ollama_model(llm.primary if isinstance(llm, RoutedModel) else llm)
+
+
+def with_output_format(llm, output_format):
+    """
+        input (Parameter): LLM object and an Ollama output format: "json" or a JSON schema.
+        Output: A copy of the LLM whose answers are constrained to that format (the LLM itself
+        if its backend cannot do it).
+    """
+    if isinstance(llm, RoutedModel):
+        routed = copy.copy(llm)
+        routed.output_format = output_format
+        return routed
+
+    if is_ollama_model(llm):
+        return llm.model_copy(update={"format": output_format})
+
+    return llm
+
+
+def with_max_tokens(llm, max_tokens: int):
+    """
+        input (Parameter): LLM object and the maximum number of tokens to generate.
+        Output: A copy of the LLM with that output budget (the LLM itself if it has no such setting).
+    """
+    if is_ollama_model(llm):
+        return llm.model_copy(update={"num_predict": max_tokens})
+
+    if hasattr(llm, "max_new_tokens"):
+        # Also a RoutedModel, which passes the limit on to every backend
+        limited = copy.copy(llm)
+        limited.max_new_tokens = max_tokens
+        return limited
+
+    return llm
+
+
+class _BackendHealth:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.retries = 0
+        self.hedges = 0
+        self.fallbacks = 0
+        self.down_until = 0.0
+        self.last_error = None
+        self.latencies = deque(maxlen=MODEL_LATENCY_SAMPLES)
+
+    def p95(self) -> float:
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+
+
+def _backend_health(backend: str) -> _BackendHealth:
+    # Called with _health_lock held
+    if backend not in _health:
+        _health[backend] = _BackendHealth()
+    return _health[backend]
+
+
+def _record_call(backend: str, seconds: float = None, error: Exception = None):
+    with _health_lock:
+        health = _backend_health(backend)
+        health.calls += 1
+        if error is None:
+            health.consecutive_failures = 0
+            health.latencies.append(seconds)
+            return
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.last_error = f"{type(error).__name__}: {error}"
+        if health.consecutive_failures >= MODEL_FAILURES_TO_TRIP:
+            health.down_until = time.time() + MODEL_COOLDOWN_SECONDS
+    tracing.count("model_call_failures_total", backend=backend, error=type(error).__name__)
+
+
+def _count(backend: str, event: str):
+    with _health_lock:
+        health = _backend_health(backend)
+        setattr(health, event, getattr(health, event) + 1)
+    tracing.count(f"model_{event}_total", backend=backend)
+
+
+def backend_stats() -> dict:
+    """
+        Output: Per backend used so far: calls, failures (in a row too), retries, hedged calls,
+        calls it handed to its fallback, whether it is skipped for now, the last error and
+        the p50/p95 of its recent latencies.
+    """
+    with _health_lock:
+        stats = {}
+        for backend, health in _health.items():
+            latencies = sorted(health.latencies)
+            stats[backend] = {
+                "calls": health.calls,
+                "failures": health.failures,
+                "consecutive_failures": health.consecutive_failures,
+                "retries": health.retries,
+                "hedges": health.hedges,
+                "fallbacks": health.fallbacks,
+                "healthy": health.down_until <= time.time(),
+                "last_error": health.last_error,
+                "p50_seconds": latencies[len(latencies) // 2] if latencies else 0.0,
+                "p95_seconds": health.p95(),
+            }
+        return stats
+
+
+def _transport_errors() -> tuple:
+    # httpx (used by the Ollama client) is only checked for once something imported it
+    httpx = sys.modules.get("httpx")
+    errors = (TimeoutError, ConnectionError, requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+    return errors + (httpx.TransportError,) if httpx is not None else errors
+
+
+def _status_code(error: Exception) -> int:
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def _is_backend_error(error: Exception) -> bool:
+    # An HTTP error answer, a timeout or a lost connection. Anything else is a bug on this
+    # side: neither a retry nor another backend would do better
+    return _status_code(error) is not None or isinstance(error, _transport_errors())
+
+
+def _is_retryable(error: Exception) -> bool:
+    # Timeouts, lost connections, rate limits and server errors may go away on their own;
+    # client errors (bad request, unauthorized...) fail the same way again
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    return isinstance(error, _transport_errors())
+
+
+class RoutedModel(Runnable):
+    """
+        An LLM over an ordered list of backends: calls go to the first healthy one, with a
+        deadline per attempt, bounded retries with backoff, optional hedging, then the next
+        backend. Answers always have the first backend's shape (text, or a message for Ollama),
+        so the caller does not see which backend answered.
+        Prompts are fitted to the first backend's context window (utils/token_budget.py). A
+        fallback with a smaller one (Ollama's num_ctx after a 32k HuggingFace model) would cut
+        the prompt silently, so it is skipped when the prompt and its answer do not fit.
+    """
+    def __init__(self, routes: list, max_new_tokens: int = None, output_format=None):
+        # (backend name, function returning its LLM object), in order of preference
+        self.routes = routes
+        # Passed on to every backend (see with_max_tokens and with_output_format)
+        self.max_new_tokens = max_new_tokens
+        self.output_format = output_format
+        self.__clients = {}
+
+    @property
+    def primary(self):
+        return self.__client(0)
+
+    @property
+    def num_ctx(self):
+        # The prompt is fitted to the first backend's context window
+        return getattr(self.primary, "num_ctx", None)
+
+    def __client(self, index: int):
+        if index not in self.__clients:
+            self.__clients[index] = self.routes[index][1]()
+        client = self.__clients[index]
+        if self.max_new_tokens:
+            client = with_max_tokens(client, self.max_new_tokens)
+        return with_output_format(client, self.output_format) if self.output_format else client
+
+    def __order(self) -> list:
+        """
+            Indexes of the routes to try: the healthy ones in order, then the skipped ones
+            (better than no answer at all).
+        """
+        now = time.time()
+        with _health_lock:
+            down = {index for index, (backend, _) in enumerate(self.routes) if _backend_health(backend).down_until > now}
+        indexes = list(range(len(self.routes)))
+        return [index for index in indexes if index not in down] + [index for index in indexes if index in down]
+
+    def __shape(self, output, chunk: bool = False):
+        # Answers of another backend are converted to the first backend's kind of output
+        wants_message = is_ollama_model(self.primary)
+        is_message = hasattr(output, "content")
+        if wants_message and not is_message:
+            return (AIMessageChunk if chunk else AIMessage)(content=str(output))
+        if not wants_message and is_message:
+            return str(output.content)
+        return output
+
+    def __hedge_delay(self, backend: str) -> float:
+        if not MODEL_HEDGING:
+            return None
+        with _health_lock:
+            health = _backend_health(backend)
+            if len(health.latencies) < MODEL_HEDGE_MIN_SAMPLES:
+                return None
+            return max(MODEL_HEDGE_MIN_SECONDS, health.p95())
+
+    def __attempt(self, backend: str, client, input, config):
+        """
+            One call within MODEL_CALL_TIMEOUT, sent a second time when it is slower than the
+            backend's p95 and hedging is on; the first answer wins.
+        """
+        started = time.perf_counter()
+        calls = [_call_executor.submit(tracing.bind(client.invoke), input, config)]
+        hedge_delay = self.__hedge_delay(backend)
+        if hedge_delay is not None and hedge_delay < MODEL_CALL_TIMEOUT:
+            done, _ = wait(calls, timeout=hedge_delay)
+            if not done:
+                _count(backend, "hedges")
+                calls.append(_call_executor.submit(tracing.bind(client.invoke), input, config))
+
+        error = None
+        pending = set(calls)
+        while pending:
+            remaining = MODEL_CALL_TIMEOUT - (time.perf_counter() - started)
+            done, pending = wait(pending, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for call in done:
+                if call.exception() is None:
+                    # The slower duplicate, if any, runs to its end in the background
+                    return call.result(), time.perf_counter() - started
+                error = call.exception()
+        raise error or TimeoutError(f"No answer from {backend} within {MODEL_CALL_TIMEOUT}s")
+
+    def __fits(self, index: int, input) -> bool:
+        """
+            Whether the prompt and the answer's token budget fit the context of the route.
+        """
+        if not index or not isinstance(input, str):
+            return True
+        client = self.__client(index)
+        context_tokens = getattr(client, "num_ctx", None) or MODEL_CONTEXT_TOKENS.get(describe_llm(client)[1], DEFAULT_CONTEXT_TOKENS)
+        output_tokens = getattr(client, "num_predict", None) or getattr(client, "max_new_tokens", None) or 0
+        return estimate_tokens(input) + output_tokens <= context_tokens
+
+    def __backoff(self, attempt: int):
+        time.sleep(MODEL_RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def __raise(self, errors: dict):
+        """
+            Raise once every route failed (route index -> its last error): the error of the first
+            route, caused by the fallback's. A bad token or a prompt too long then reaches the
+            caller as such, not as the fallback's connection error.
+        """
+        primary_error, error = errors[min(errors)], list(errors.values())[-1]
+        if primary_error is not error:
+            raise primary_error from error
+        raise error
+
+    def invoke(self, input, config=None, **kwargs):
+        errors = {}
+        order = self.__order()
+        for position, index in enumerate(order):
+            backend = self.routes[index][0]
+            if not self.__fits(index, input):
+                tracing.count("model_fallbacks_skipped_total", backend=backend, reason="context")
+                continue
+            if position or index:
+                # Handed over by the backend tried before, or by the first one when it is skipped
+                _count(self.routes[order[position - 1] if position else 0][0], "fallbacks")
+            for attempt in range(1 + MODEL_RETRIES):
+                if attempt:
+                    _count(backend, "retries")
+                    self.__backoff(attempt - 1)
+                try:
+                    client = self.__client(index)
+                    output, seconds = self.__attempt(backend, client, input, config)
+                except Exception as e:
+                    if not _is_backend_error(e):
+                        raise
+                    errors[index] = e
+                    _record_call(backend, error=e)
+                    if not _is_retryable(e):
+                        break
+                    continue
+                _record_call(backend, seconds)
+                return self.__shape(output)
+        self.__raise(errors)
+
+    def __next(self, iterator, timeout: float):
+        # The next piece of a stream, or TimeoutError when it takes longer than timeout
+        try:
+            return _call_executor.submit(tracing.bind(next), iterator).result(timeout=timeout)
+        except FutureTimeout:
+            raise TimeoutError(f"No answer within {timeout}s") from None
+
+    def stream(self, input, config=None, **kwargs):
+        """
+            Retries and fallback only happen before the first piece: once pieces were yielded
+            the answer cannot start over, a later failure is raised to the caller.
+        """
+        errors = {}
+        order = self.__order()
+        for position, index in enumerate(order):
+            backend = self.routes[index][0]
+            if not self.__fits(index, input):
+                tracing.count("model_fallbacks_skipped_total", backend=backend, reason="context")
+                continue
+            if position or index:
+                # Handed over by the backend tried before, or by the first one when it is skipped
+                _count(self.routes[order[position - 1] if position else 0][0], "fallbacks")
+            for attempt in range(1 + MODEL_RETRIES):
+                if attempt:
+                    _count(backend, "retries")
+                    self.__backoff(attempt - 1)
+                started = time.perf_counter()
+                try:
+                    iterator = iter(self.__client(index).stream(input, config, **kwargs))
+                    first = self.__next(iterator, MODEL_CALL_TIMEOUT)
+                except StopIteration:
+                    _record_call(backend, time.perf_counter() - started)
+                    return
+                except Exception as e:
+                    if not _is_backend_error(e):
+                        raise
+                    errors[index] = e
+                    _record_call(backend, error=e)
+                    if not _is_retryable(e):
+                        break
+                    continue
+
+                try:
+                    yield self.__shape(first, chunk=True)
+                    while True:
+                        try:
+                            piece = self.__next(iterator, MODEL_CALL_TIMEOUT)
+                        except StopIteration:
+                            break
+                        yield self.__shape(piece, chunk=True)
+                except Exception as e:
+                    _record_call(backend, error=e)
+                    raise
+                finally:
+                    try:
+                        iterator.close()
+                    except (AttributeError, ValueError):
+                        pass  # Not a generator, or still running past its deadline
+                _record_call(backend, time.perf_counter() - started)
+                return
+        self.__raise(errors)
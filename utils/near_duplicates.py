@@ -0,0 +1,206 @@
+"""
+    Near-duplicate detection of transcripts, so re-uploads, clips and mirrors of a video
+    already analyzed (same content, different video_id) can reuse its stage-1 analysis.
+
+    Every transcript gets a MinHash signature of its word shingles (one-permutation hashing:
+    each shingle is hashed once and kept as the minimum of one of the bins, then empty bins
+    are filled from their neighbours). Signatures are split in LSH bands kept in memory, so
+    a lookup is a few dict lookups plus a comparison with the candidates it finds. Signatures
+    and analyses are persisted in SQLite and added one video at a time.
+"""
+import hashlib, os, sqlite3, struct, threading, time
+from array import array
+from contextlib import closing, contextmanager
+from utils import tracing
+from utils.config import CACHE_DIR, NEAR_DUPLICATE_THRESHOLD, NEAR_DUPLICATE_PERMUTATIONS, NEAR_DUPLICATE_BANDS
+from utils.config import NEAR_DUPLICATE_SHINGLE_WORDS, NEAR_DUPLICATE_MIN_WORDS, NEAR_DUPLICATE_MAX_ENTRIES, NEAR_DUPLICATE_REFRESH_SECONDS
+
+_PUNCTUATION = ".,!?;:…।\"'()-"
+_MAX_HASH = (1 << 64) - 1
+
+
+def _hash(shingle: str) -> int:
+    # Stable across processes, unlike hash()
+    return struct.unpack("<Q", hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest())[0]
+
+
+class NearDuplicateIndex:
+    """
+        Persistent MinHash/LSH index of transcripts: video_id -> signature and stage-1 analysis.
+        Safe to share between threads; other processes using the same file see each other's
+        videos after at most NEAR_DUPLICATE_REFRESH_SECONDS.
+    """
+    def __init__(self, path: str = None, threshold: float = NEAR_DUPLICATE_THRESHOLD, permutations: int = NEAR_DUPLICATE_PERMUTATIONS,
+                 bands: int = NEAR_DUPLICATE_BANDS, shingle_words: int = NEAR_DUPLICATE_SHINGLE_WORDS,
+                 min_words: int = NEAR_DUPLICATE_MIN_WORDS, max_entries: int = NEAR_DUPLICATE_MAX_ENTRIES):
+        if permutations % bands:
+            raise ValueError("permutations must be a multiple of bands")
+        self.path = path or os.path.join(CACHE_DIR, "near_duplicates.sqlite3")
+        self.threshold = threshold
+        self.permutations = permutations
+        self.bands = bands
+        self.rows = permutations // bands
+        self.shingle_words = shingle_words
+        self.min_words = min_words
+        self.max_entries = max_entries
+        self.lookups = 0
+        self.matches = 0
+        self.__lock = threading.Lock()
+        self.__signatures = {}
+        self.__buckets = [{} for _ in range(bands)]
+        self.__last_rowid = 0
+        self.__refreshed_at = 0.0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.__connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                "video_id TEXT PRIMARY KEY, signature BLOB NOT NULL, analysis TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+        self.__refresh(force=True)
+
+    @contextmanager
+    def __connect(self):
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:
+                yield conn
+
+    def signature(self, text: str) -> tuple:
+        """
+            input (Parameter): Transcript.
+            Output: Its MinHash signature, or None when it has fewer than min_words words.
+        """
+        words = [word.strip(_PUNCTUATION).lower() for word in text.split()]
+        words = [word for word in words if word]
+        if len(words) < self.min_words:
+            return None
+
+        bins = self.permutations
+        signature = [_MAX_HASH] * bins
+        n = self.shingle_words
+        for i in range(max(1, len(words) - n + 1)):
+            value = _hash(" ".join(words[i:i + n]))
+            position = value % bins
+            if value < signature[position]:
+                signature[position] = value
+
+        # Densification: an empty bin takes the value of the next filled one, shifted by the
+        # distance, so two similar transcripts still agree on it
+        minimums = list(signature)
+        for i in range(bins):
+            if minimums[i] == _MAX_HASH:
+                distance = 1
+                while minimums[(i + distance) % bins] == _MAX_HASH:
+                    distance += 1
+                signature[i] = (minimums[(i + distance) % bins] + distance * 0x9E3779B97F4A7C15) & _MAX_HASH
+        return tuple(signature)
+
+    def similarity(self, a: tuple, b: tuple) -> float:
+        """
+            Estimated Jaccard similarity of the shingles of two transcripts.
+        """
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+    def __band_keys(self, signature: tuple) -> list:
+        rows = self.rows
+        return [hash(signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def __insert(self, video_id: str, signature: tuple):
+        # Called with the lock held
+        if video_id in self.__signatures:
+            self.__remove(video_id)
+        self.__signatures[video_id] = signature
+        for bucket, key in zip(self.__buckets, self.__band_keys(signature)):
+            bucket.setdefault(key, set()).add(video_id)
+
+    def __remove(self, video_id: str):
+        # Called with the lock held
+        signature = self.__signatures.pop(video_id, None)
+        if signature is None:
+            return
+        for bucket, key in zip(self.__buckets, self.__band_keys(signature)):
+            videos = bucket.get(key)
+            if videos is not None:
+                videos.discard(video_id)
+                if not videos:
+                    del bucket[key]
+
+    def __refresh(self, force: bool = False):
+        """
+            Load the videos stored since the last refresh (by this or another process).
+        """
+        now = time.monotonic()
+        if not force and now - self.__refreshed_at < NEAR_DUPLICATE_REFRESH_SECONDS:
+            return
+        self.__refreshed_at = now
+        with self.__connect() as conn:
+            rows = conn.execute("SELECT rowid, video_id, signature FROM signatures WHERE rowid > ? ORDER BY rowid", (self.__last_rowid,)).fetchall()
+        with self.__lock:
+            for rowid, video_id, blob in rows:
+                self.__insert(video_id, tuple(array("Q", blob)))
+                self.__last_rowid = max(self.__last_rowid, rowid)
+
+    def find(self, signature: tuple, exclude: str = None) -> dict:
+        """
+            input (Parameter): Signature of a transcript and a video id to leave out.
+            Output: {'video_id', 'similarity', 'analysis'} of the most similar video indexed,
+            when its similarity is at least the threshold; None otherwise.
+        """
+        self.__refresh()
+        started = time.perf_counter()
+        with self.__lock:
+            candidates = set()
+            for bucket, key in zip(self.__buckets, self.__band_keys(signature)):
+                candidates.update(bucket.get(key, ()))
+            candidates.discard(exclude)
+            scored = sorted(((self.similarity(signature, self.__signatures[video_id]), video_id) for video_id in candidates), reverse=True)
+            self.lookups += 1
+        tracing.count("near_duplicate_lookup_seconds_total", time.perf_counter() - started)
+
+        for similarity, video_id in scored:
+            if similarity < self.threshold:
+                break
+            with self.__connect() as conn:
+                row = conn.execute("SELECT analysis FROM signatures WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                # Evicted by another process since the last refresh
+                with self.__lock:
+                    self.__remove(video_id)
+                continue
+            with self.__lock:
+                self.matches += 1
+            tracing.count("near_duplicate_lookups_total", result="match")
+            return {"video_id": video_id, "similarity": similarity, "analysis": row[0]}
+        tracing.count("near_duplicate_lookups_total", result="none")
+        return None
+
+    def add(self, video_id: str, signature: tuple, analysis: str):
+        """
+            Index a video with the stage-1 analysis to reuse for its near-duplicates.
+            The oldest videos are dropped once there are more than max_entries.
+        """
+        with self.__connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures (video_id, signature, analysis, stored_at) VALUES (?, ?, ?, ?)",
+                (video_id, array("Q", signature).tobytes(), analysis, time.time())
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0] - self.max_entries
+            evicted = []
+            if overflow > 0:
+                evicted = [row[0] for row in conn.execute("SELECT video_id FROM signatures ORDER BY stored_at ASC LIMIT ?", (overflow,))]
+                conn.executemany("DELETE FROM signatures WHERE video_id = ?", [(evicted_id,) for evicted_id in evicted])
+        with self.__lock:
+            for evicted_id in evicted:
+                self.__remove(evicted_id)
+            self.__insert(video_id, signature)
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__signatures)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {"entries": len(self.__signatures), "lookups": self.lookups, "matches": self.matches}
@@ -0,0 +1,115 @@
+import codecs, json, re
+
+_ASSIGNMENT = re.compile(r'ytInitialPlayerResponse\s*=\s*\{')
+_STRUCTURE = re.compile(r'[{}"]')
+_STRING = re.compile(r'["\\]')
+
+# Enough trailing text to find an assignment that is split between two chunks
+_TAIL_SIZE = 64
+
+
+class PlayerResponseExtractor:
+    """
+        Incremental extractor for the ytInitialPlayerResponse object of a watch page.
+        Chunks are fed as they arrive; brace depth and string state are tracked so the
+        exact end of the JSON object is found (a '};' inside a string does not end it)
+        and the caller can stop reading as soon as `done` is True.
+    """
+    def __init__(self):
+        self.__decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.__tail = ""
+        self.__parts = []
+        self.__started = False
+        self.__depth = 0
+        self.__in_string = False
+        self.__escaped = False
+        self.done = False
+        self.bytes_read = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+            input (Parameter): Next raw chunk of the page.
+            Output: True once the whole object has been read.
+        """
+        if self.done:
+            return True
+        self.bytes_read += len(chunk)
+        text = self.__decoder.decode(chunk)
+
+        if not self.__started:
+            text = self.__tail + text
+            match = _ASSIGNMENT.search(text)
+            if not match:
+                self.__tail = text[-_TAIL_SIZE:]
+                return False
+            self.__started = True
+            text = text[match.end() - 1:]  # keep the opening brace
+
+        end = self.__scan(text)
+        if end is None:
+            self.__parts.append(text)
+            return False
+
+        self.__parts.append(text[:end])
+        self.done = True
+        return True
+
+    def __scan(self, text: str):
+        """
+            Advance the brace/string state over `text`.
+            Returns the index just past the closing brace, or None if the object continues.
+        """
+        position = 0
+        length = len(text)
+        while position < length:
+            if self.__escaped:
+                self.__escaped = False
+                position += 1
+                continue
+
+            if self.__in_string:
+                match = _STRING.search(text, position)
+                if not match:
+                    return None
+                if match.group() == "\\":
+                    self.__escaped = True
+                else:
+                    self.__in_string = False
+                position = match.end()
+                continue
+
+            match = _STRUCTURE.search(text, position)
+            if not match:
+                return None
+            token = match.group()
+            if token == '"':
+                self.__in_string = True
+            elif token == "{":
+                self.__depth += 1
+            else:
+                self.__depth -= 1
+                if self.__depth == 0:
+                    return match.end()
+            position = match.end()
+        return None
+
+    def result(self) -> dict:
+        """
+            Output: The parsed player response, or None if the object was not (fully) found.
+        """
+        if not self.done:
+            return None
+        return json.loads("".join(self.__parts))
+
+
+def extract_player_response(chunks) -> tuple:
+    """
+        input (Parameter): Iterable of raw page chunks (e.g. response.iter_content()).
+        Output: (player response or None, number of bytes consumed). Iteration stops
+        right after the end of the object, the remaining chunks are never read.
+    """
+    extractor = PlayerResponseExtractor()
+    for chunk in chunks:
+        if extractor.feed(chunk):
+            break
+    return extractor.result(), extractor.bytes_read
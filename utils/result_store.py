@@ -0,0 +1,40 @@
+"""
+    Recommendations shown by each session, kept out of the Streamlit sessions.
+
+    A session only keeps its session key. The recommendations of every language it generated
+    for the current video (with the sections regenerated since) live here, on disk (SQLite,
+    least recently used sessions evicted), so the sessions of a busy process stay small.
+"""
+import os
+from utils.cache import SQLiteCache
+from utils.config import CACHE_DIR, RESULT_STORE_MAX_ENTRIES
+
+
+class ResultStore:
+    """
+        Recommendations per session key and language, shared by every session of the process.
+    """
+    def __init__(self, path: str = None, max_entries: int = RESULT_STORE_MAX_ENTRIES):
+        self.__store = SQLiteCache(
+            path=path or os.path.join(CACHE_DIR, "results.sqlite3"),
+            table="results",
+            max_entries=max_entries
+        )
+
+    def get(self, session: str) -> dict:
+        """
+            Output: {language: recommendations} of the session, empty when it has none (anymore).
+        """
+        return self.__store.get(session) or {}
+
+    def update(self, session: str, results: dict):
+        """
+            input (Parameter): Session key and {language: recommendations}; other languages are kept.
+        """
+        self.__store.set(session, {**self.get(session), **results})
+
+    def clear(self, session: str):
+        self.__store.delete(session)
+
+    def stats(self) -> dict:
+        return self.__store.stats()
@@ -0,0 +1,203 @@
+"""
+    Speculative prefetch: work started for a video before anyone asked for it.
+
+    As soon as a session enters a valid URL, start() fetches the video's meta data and then
+    runs the stage-1 content analysis as a background job, while the user is still reading
+    the video info. When the analysis is requested, take() hands the stage-1 result to the
+    job (waiting for it if it is still running), so only stage 2 is left.
+
+    - At most max_jobs speculations run at the same time in the process; URLs entered
+      beyond that are not speculated on.
+    - Stage 1 is not started while calls to the backend wait in line: requested work goes first.
+    - A session has one speculation at a time. Moving on to another video releases the
+      previous one, and a speculation no session wants any more is cancelled (entering its
+      URL again starts a new one rather than waiting on the job being cancelled).
+    - A failed speculation is not restarted on every rerun of the page: only once the URL is
+      entered again or after SPECULATION_FAILURE_COOLDOWN.
+    - stats() reports how many speculations were started, used, cancelled, skipped or
+      expired unused, and the hit rate.
+"""
+import threading, time
+from utils import tracing
+from utils.analysis import Analysis
+from utils.cache import LLMCache, MetaDataCache
+from utils.jobs import BackgroundJob, JobCancelled, get_coordinator
+from utils.model_handler import describe_llm
+from utils.near_duplicates import NearDuplicateIndex
+from utils.transcript_store import TranscriptStore
+from utils.video_extraction import VideoExtraction
+from utils.config import SPECULATION_MAX_JOBS, SPECULATION_FAILURE_COOLDOWN, JOB_POLL_SECONDS, YOUTUBE_BASE_URL
+
+OUTCOMES = ("started", "used", "cancelled", "skipped", "unused")
+
+
+class _Speculation:
+    def __init__(self, job: BackgroundJob):
+        self.job = job
+        # Sessions that may still ask for it
+        self.owners = set()
+        self.used = False
+
+
+class Speculator:
+    """
+        Speculative fetch + stage-1 jobs of the whole process, per video and model.
+    """
+    def __init__(self, max_jobs: int = SPECULATION_MAX_JOBS, llm_cache: LLMCache = None, metadata_cache: MetaDataCache = None,
+                 duplicates: NearDuplicateIndex = None, transcripts: TranscriptStore = None, base_url: str = YOUTUBE_BASE_URL):
+        self.max_jobs = max_jobs
+        self.__llm_cache = llm_cache
+        self.__metadata_cache = metadata_cache
+        self.__duplicates = duplicates
+        self.__transcripts = transcripts
+        self.__base_url = base_url
+        self.__speculations = {}
+        # Key -> time its last speculation failed, and session -> key it speculated on last
+        self.__failures = {}
+        self.__owner_keys = {}
+        self.__counts = dict.fromkeys(OUTCOMES, 0)
+        self.__lock = threading.Lock()
+
+    def __count(self, outcome: str):
+        # Called with the lock held
+        self.__counts[outcome] += 1
+        tracing.count("speculations_total", outcome=outcome)
+
+    def __key(self, video_id: str, llm) -> tuple:
+        return (video_id, *describe_llm(llm)[:2])
+
+    def start(self, llm, is_local_model: bool, video_url: str, video_id: str, owner: str) -> BackgroundJob:
+        """
+            input (Parameter): Model, video and the session asking for it.
+            Output: The speculative job of the video, or None when max_jobs are already running.
+        """
+        key = self.__key(video_id, llm)
+        with self.__lock:
+            self.__forget_expired()
+            self.__release(owner, keep=key)
+            # A rerun of the page asks again for the URL the session already speculated on
+            entered_again = self.__owner_keys.get(owner) != key
+            self.__owner_keys[owner] = key
+            speculation = self.__speculations.get(key)
+            # A job released by every session stops at its next step: it is as good as cancelled
+            if speculation is None or speculation.job.state in ("failed", "cancelled") or speculation.job.cancel_requested:
+                failed = self.__failures.get(key)
+                if failed is not None and not entered_again and time.time() - failed < SPECULATION_FAILURE_COOLDOWN:
+                    return None
+                if sum(not other.job.is_finished and not other.job.cancel_requested for other in self.__speculations.values()) >= self.max_jobs:
+                    self.__count("skipped")
+                    return None
+                job = get_coordinator().submit(
+                    ("speculation", *key),
+                    lambda job: self.__run(job, key, llm, is_local_model, video_url, video_id),
+                    info={'video_url': video_url, 'video_id': video_id}
+                )
+                speculation = self.__speculations[key] = _Speculation(job)
+                self.__count("started")
+            speculation.owners.add(owner)
+            return speculation.job
+
+    def __run(self, job: BackgroundJob, key: tuple, llm, is_local_model: bool, video_url: str, video_id: str) -> dict:
+        try:
+            result = self.__speculate(job, llm, is_local_model, video_url, video_id)
+        except JobCancelled:
+            raise
+        except Exception:
+            with self.__lock:
+                self.__failures[key] = time.time()
+            raise
+        with self.__lock:
+            self.__failures.pop(key, None)
+        return result
+
+    def __speculate(self, job: BackgroundJob, llm, is_local_model: bool, video_url: str, video_id: str) -> dict:
+        job.set_stage('fetching')
+        extraction = VideoExtraction(cache=self.__metadata_cache, base_url=self.__base_url)
+        # Shared with the fetch of the Enter button when both run at the same time
+        meta_data = get_coordinator().run(("fetch", video_id), extraction.get_meta_data, video_id=video_id)
+        if not meta_data:
+            return None
+        job.info['meta_data'] = self.__transcripts.put(meta_data) if self.__transcripts is not None else meta_data
+
+        backend = describe_llm(llm)[0]
+        if get_coordinator().stats()['backends'].get(backend, {}).get('queued'):
+            job.info['skipped_stage1'] = True
+            return None
+        job.set_stage('analyzing')
+        with tracing.trace("speculative_stage1", video_id=video_id, job_id=job.job_id):
+            return Analysis(llm=llm, is_local_model=is_local_model, cache=self.__llm_cache, duplicates=self.__duplicates,
+                            cancelled=lambda: job.cancel_requested) \
+                .content_analysis(video_url=video_url, meta_data=meta_data)
+
+    def meta_data(self, video_id: str) -> dict:
+        """
+            Output: The meta data fetched ahead of time for the video (as returned by
+            TranscriptStore.put() when there is a store), or None.
+        """
+        with self.__lock:
+            for key, speculation in self.__speculations.items():
+                if key[0] == video_id and speculation.job.info.get('meta_data'):
+                    return speculation.job.info['meta_data']
+        return None
+
+    def take(self, video_id: str, llm, waiting_job: BackgroundJob = None) -> dict:
+        """
+            input (Parameter): Video and model of an analysis about to run, and its job (to stop
+            waiting when it is cancelled).
+            Output: The stage-1 result for Analysis.seo_analysis(stage1=...), waiting for the
+            speculation when it is still running; None when there is none to use.
+        """
+        with self.__lock:
+            speculation = self.__speculations.get(self.__key(video_id, llm))
+        if speculation is None:
+            return None
+        while not speculation.job.wait(JOB_POLL_SECONDS):
+            if waiting_job is not None and waiting_job.cancel_requested:
+                raise JobCancelled()
+        if speculation.job.state != "done" or not speculation.job.result:
+            return None
+        with self.__lock:
+            if not speculation.used:
+                speculation.used = True
+                self.__count("used")
+        return speculation.job.result
+
+    def release(self, owner: str):
+        """
+            The session no longer wants its speculation (cancelled if nobody else does).
+        """
+        with self.__lock:
+            self.__owner_keys.pop(owner, None)
+            self.__release(owner)
+
+    def __release(self, owner: str, keep: tuple = None):
+        for key, speculation in self.__speculations.items():
+            if key == keep or owner not in speculation.owners:
+                continue
+            speculation.owners.discard(owner)
+            if not speculation.owners and not speculation.used and not speculation.job.is_finished:
+                # Stops at the next stage or streamed piece of a model call
+                speculation.job.cancel()
+                self.__count("cancelled")
+
+    def __forget_expired(self):
+        # Once the coordinator no longer keeps the job, its result is gone too
+        coordinator = get_coordinator()
+        for key, speculation in list(self.__speculations.items()):
+            if coordinator.get_job(speculation.job.job_id) is None:
+                del self.__speculations[key]
+                if not speculation.used and speculation.job.state == "done" and speculation.job.result:
+                    self.__count("unused")
+
+    def stats(self) -> dict:
+        """
+            Output: Speculations per outcome, those running, and the hit rate (share of the
+            speculations started that were used).
+        """
+        with self.__lock:
+            running = sum(not speculation.job.is_finished for speculation in self.__speculations.values())
+            return {
+                **self.__counts,
+                "running": running,
+                "hit_rate": self.__counts["used"] / self.__counts["started"] if self.__counts["started"] else 0.0,
+            }
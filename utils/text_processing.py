@@ -0,0 +1,37 @@
+import math
+
+# Average UTF-8 bytes per token used by the estimate
+BYTES_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+        Fast token count approximation (~4 UTF-8 bytes per token).
+        Works for Hindi as well, since Devanagari characters take 3 bytes each.
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def split_into_chunks(text: str, max_tokens: int) -> list:
+    """
+        input (Parameter): Text and the token budget of a single chunk.
+        Output: List of consecutive chunks, split on whitespace, each within the budget.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for word in text.split():
+        word_tokens = estimate_tokens(word + " ")
+        if current and current_tokens + word_tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current = []
+            current_tokens = 0
+        current.append(word)
+        current_tokens += word_tokens
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
@@ -0,0 +1,166 @@
+"""
+    Token budgeting: fit the transcript, the description (and the stage-1 analysis) into
+    the context window of the active model, keeping room for its answer.
+"""
+import functools, math, re
+from collections import Counter
+from utils.chapters import tokenize
+from utils.model_handler import describe_llm
+from utils.text_processing import estimate_tokens
+from utils.config import MODEL_CONTEXT_TOKENS, DEFAULT_CONTEXT_TOKENS, TRANSCRIPT_COMPACTION, BUDGET_MIN_INPUT_TOKENS
+
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+# Auto-captions have no punctuation, so long "sentences" are cut into pieces of this many words
+_MAX_SENTENCE_WORDS = 30
+# Part of the video every round of sentence picking covers, so the whole video is represented
+_COVERAGE_BUCKETS = 10
+_GAP = " … "
+
+
+@functools.lru_cache(maxsize=8)
+def _load_tokenizer(model: str):
+    """
+        The model's own tokenizer when the optional `tokenizers` package can load it, otherwise None.
+    """
+    try:
+        from tokenizers import Tokenizer
+        return Tokenizer.from_pretrained(model)
+    except Exception:
+        return None
+
+
+def get_token_counter(llm):
+    """
+        input (Parameter): The active LLM.
+        Output: Function text -> token count. HuggingFace models use their tokenizer when it is
+        available; every other case uses the fast estimate (~4 bytes per token).
+    """
+    backend, model, _ = describe_llm(llm)
+    tokenizer = _load_tokenizer(model) if backend == "huggingface" and model else None
+    if tokenizer is None:
+        return estimate_tokens
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids) if text else 0
+
+
+def context_window(llm) -> int:
+    """
+        Context size in tokens of the active model: the configured num_ctx for Ollama models,
+        otherwise MODEL_CONTEXT_TOKENS (DEFAULT_CONTEXT_TOKENS for unknown models).
+    """
+    num_ctx = getattr(llm, "num_ctx", None)
+    if num_ctx:
+        return num_ctx
+    _, model, _ = describe_llm(llm)
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+
+
+def allocate(context_tokens: int, instruction_tokens: int, output_tokens: int, inputs: dict, shares: dict = None) -> dict:
+    """
+        Split the room left by the instructions and the reserved output between the inputs.
+        input (Parameter): Context size, tokens of the prompt without its inputs, tokens kept for the
+        answer, input name -> token count and optional input name -> maximum share of the room.
+        Output: Input name -> token budget. Inputs that fit keep their size; the unused
+        share of capped inputs goes to the others.
+    """
+    available = max(context_tokens - instruction_tokens - output_tokens, BUDGET_MIN_INPUT_TOKENS)
+    shares = shares or {}
+    budget = {}
+    # Capped inputs first, then the rest get whatever is left
+    for name in sorted(inputs, key=lambda name: name not in shares):
+        remaining = available - sum(budget.values())
+        limit = int(available * shares[name]) if name in shares else remaining
+        budget[name] = max(0, min(inputs[name], limit, remaining))
+    return budget
+
+
+def split_sentences(text: str) -> list:
+    sentences = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        words = sentence.split()
+        for i in range(0, len(words), _MAX_SENTENCE_WORDS):
+            sentences.append(" ".join(words[i:i + _MAX_SENTENCE_WORDS]))
+    return [sentence for sentence in sentences if sentence]
+
+
+def truncate(text: str, max_tokens: int, count_tokens=estimate_tokens) -> str:
+    """
+        Keep the start of `text` within `max_tokens`, cut at a sentence (or word) boundary.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence + " ")
+        if used + tokens > max_tokens:
+            break
+        kept.append(sentence)
+        used += tokens
+    return " ".join(kept)
+
+
+def sample_windows(text: str, max_tokens: int, windows: int = _COVERAGE_BUCKETS, count_tokens=estimate_tokens) -> str:
+    """
+        Evenly spaced windows of consecutive words, together within `max_tokens`.
+    """
+    words = text.split()
+    total = count_tokens(text)
+    if total <= max_tokens or not words:
+        return text
+    keep = max(1, int(len(words) * max_tokens / total) - windows)  # room for the gap markers
+    size = max(1, keep // windows)
+    step = len(words) / windows
+    parts = [" ".join(words[int(i * step):int(i * step) + size]) for i in range(windows)]
+    return _GAP.join(part for part in parts if part)
+
+
+def salient_sentences(text: str, max_tokens: int, count_tokens=estimate_tokens) -> str:
+    """
+        The most informative sentences (highest average TF-IDF of their words) within `max_tokens`,
+        picked round-robin from every part of the video and returned in their original order.
+    """
+    sentences = split_sentences(text)
+    if count_tokens(text) <= max_tokens or not sentences:
+        return text
+
+    words = [tokenize(sentence) for sentence in sentences]
+    document_frequency = Counter(term for terms in words for term in set(terms))
+    idf = {term: math.log(len(sentences) / df) + 1 for term, df in document_frequency.items()}
+    scores = [sum(idf[term] for term in terms) / math.sqrt(len(terms)) if terms else 0.0 for terms in words]
+
+    bucket_size = math.ceil(len(sentences) / _COVERAGE_BUCKETS)
+    buckets = [
+        sorted(range(start, min(start + bucket_size, len(sentences))), key=lambda i: -scores[i])
+        for start in range(0, len(sentences), bucket_size)
+    ]
+    # Every sentence is charged for a gap marker too, so the result stays within the budget
+    gap_tokens = count_tokens(_GAP)
+    chosen, used = set(), 0
+    while any(buckets):
+        for bucket in buckets:
+            if not bucket:
+                continue
+            i = bucket.pop(0)
+            tokens = count_tokens(sentences[i] + " ") + gap_tokens
+            if used + tokens <= max_tokens:
+                chosen.add(i)
+                used += tokens
+
+    text, previous = "", None
+    for i in sorted(chosen):
+        if previous is not None:
+            text += " " if i == previous + 1 else _GAP
+        text += sentences[i]
+        previous = i
+    return text
+
+
+def compact(text: str, max_tokens: int, strategy: str = TRANSCRIPT_COMPACTION, count_tokens=estimate_tokens) -> str:
+    """
+        input (Parameter): Text, its token budget and the strategy ('salient' or 'windows').
+        Output: The text itself when it fits, otherwise its compacted form.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    if strategy == "windows":
+        return sample_windows(text, max_tokens, count_tokens=count_tokens)
+    return salient_sentences(text, max_tokens, count_tokens=count_tokens)
@@ -0,0 +1,259 @@
+"""
+    Lightweight tracing and metrics for the extraction and analysis pipeline.
+
+    - span(name) times a stage. Finished spans are written as JSON log lines and
+      collected in the current trace (one trace per app action or batch item).
+    - count(name, value, **labels) increments a counter (cache hits, tokens, parse failures...).
+    - render_prometheus() exposes every counter and stage-duration histogram in the
+      Prometheus text format; start_metrics_server(port) serves it on /metrics.
+
+    Work submitted to a thread pool only belongs to the caller's trace when the function
+    is wrapped with bind().
+"""
+import contextvars, json, logging, sys, threading, time, uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from utils.config import TRACE_JSON_LOGS, TRACE_LOG_FILE
+
+METRIC_PREFIX = "youtube_seo_"
+# Upper bounds (seconds) of the stage-duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+
+logger = logging.getLogger("youtube_seo.trace")
+logger.propagate = False
+logger.setLevel(logging.INFO)
+if TRACE_JSON_LOGS:
+    _handler = logging.FileHandler(TRACE_LOG_FILE, encoding="utf-8") if TRACE_LOG_FILE else logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+else:
+    logger.addHandler(logging.NullHandler())
+
+
+def log(event: str, **fields):
+    """
+        Write one JSON log line.
+    """
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, ensure_ascii=False, default=str))
+
+
+class MetricsRegistry:
+    """
+        Process-wide counters and duration histograms, keyed by metric name and labels.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counters = defaultdict(float)
+        self.__histograms = {}
+
+    @staticmethod
+    def __key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self.__lock:
+            self.__counters[self.__key(name, labels)] += value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self.__key(name, labels)
+        with self.__lock:
+            histogram = self.__histograms.setdefault(key, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def reset(self):
+        with self.__lock:
+            self.__counters.clear()
+            self.__histograms.clear()
+
+    def render_prometheus(self) -> str:
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        with self.__lock:
+            counters = sorted(self.__counters.items())
+            histograms = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in self.__histograms.items())
+
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            metric = METRIC_PREFIX + name
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{labels_text(labels)} {value:g}")
+        for (name, labels), histogram in histograms:
+            metric = METRIC_PREFIX + name
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} histogram")
+                declared.add(metric)
+            for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                lines.append(f"{metric}_bucket{labels_text(labels, [('le', f'{bound:g}')])} {count}")
+            lines.append(f"{metric}_bucket{labels_text(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{metric}_sum{labels_text(labels)} {histogram['sum']:.6f}")
+            lines.append(f"{metric}_count{labels_text(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class Trace:
+    """
+        Spans and counters of one pipeline run.
+    """
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.attributes = attributes
+        self.spans = []
+        self.counters = defaultdict(float)
+        self.total_seconds = None
+        self.__lock = threading.Lock()
+
+    def add_span(self, span: dict):
+        with self.__lock:
+            self.spans.append(span)
+
+    def add_count(self, name: str, value: float):
+        with self.__lock:
+            self.counters[name] += value
+
+    def summary(self) -> dict:
+        with self.__lock:
+            return {
+                "name": self.name,
+                "trace_id": self.trace_id,
+                **self.attributes,
+                "total_seconds": self.total_seconds,
+                "spans": [dict(span) for span in self.spans],
+                "counters": dict(self.counters),
+            }
+
+
+def current_trace() -> Trace:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(name: str, **attributes):
+    """
+        Collect every span and counter recorded inside the block (and in functions wrapped
+        with bind() from it) into a new Trace, logged as a whole when the block ends.
+    """
+    current = Trace(name, **attributes)
+    token = _current_trace.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.total_seconds = time.perf_counter() - started
+        _current_trace.reset(token)
+        summary = current.summary()
+        # The spans were logged one by one already
+        log("trace", **{key: value for key, value in summary.items() if key != "spans"}, span_count=len(summary["spans"]))
+
+
+def _finish_span(span: dict, started: float):
+    span["seconds"] = time.perf_counter() - started
+    if span.get("completion_tokens") and span["seconds"] > 0:
+        span["tokens_per_second"] = span["completion_tokens"] / span["seconds"]
+    REGISTRY.observe("stage_duration_seconds", span["seconds"], stage=span["name"])
+    current = _current_trace.get()
+    if current is not None:
+        span["trace_id"] = current.trace_id
+        current.add_span(span)
+    log("span", **span)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+        Time the block as a stage. The yielded dict can be given more attributes
+        (token counts, bytes...) before the block ends.
+    """
+    parent = _current_span.get()
+    current = {"name": name, "parent": parent["name"] if parent else None, **attributes}
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish_span(current, started)
+
+
+def record_span(name: str, started: float, **attributes):
+    """
+        Record a span that started at `started` (time.perf_counter()) and ends now.
+    """
+    parent = _current_span.get()
+    _finish_span({"name": name, "parent": parent["name"] if parent else None, **attributes}, started)
+
+
+def count(name: str, value: float = 1, **labels):
+    """
+        Increment a process-wide counter and the counter of the current trace.
+    """
+    REGISTRY.inc(name, value, **labels)
+    current = _current_trace.get()
+    if current is not None:
+        suffix = ",".join(f"{key}={value}" for key, value in sorted(labels.items()))
+        current.add_count(f"{name}{{{suffix}}}" if suffix else name, value)
+
+
+def bind(function):
+    """
+        Wrap a function submitted to a thread pool so it runs in the caller's trace and span.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # Every call gets its own copy: one Context cannot be entered by two threads at once
+        return context.copy().run(function, *args, **kwargs)
+    return run
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+        Serve the metrics on http://host:port/metrics from a background thread.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
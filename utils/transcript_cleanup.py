@@ -0,0 +1,98 @@
+"""
+    Clean-up of caption text before it is sent to the model: non-speech markers ([Music],
+    [संगीत], ♪...), words repeated by overlapping (rolling) auto-caption lines and, optionally,
+    English and Hindi filler words.
+
+    Every word is looked at once and compared with at most TRANSCRIPT_MAX_OVERLAP_WORDS words
+    before it, so the clean-up stays linear on multi-hour transcripts.
+"""
+import html, math, re, unicodedata
+from utils.text_processing import BYTES_PER_TOKEN
+from utils.config import TRANSCRIPT_REMOVE_FILLERS, TRANSCRIPT_MAX_OVERLAP_WORDS
+
+# Bracketed captions ([Music], [Applause], [संगीत], [__]), parenthesized sound labels,
+# music notes and the ">>" speaker-change marker
+_NON_SPEECH = re.compile(
+    r"\[[^\]]{0,40}\]"
+    r"|\((?:music|applause|laughter|laughs|cheering|inaudible|silence|संगीत|तालियां|हंसी)\)"
+    r"|[♪♫]+|>>",
+    re.IGNORECASE
+)
+_PUNCTUATION = ".,!?;:…।\"'()-"
+
+# Words that carry no content on their own; ambiguous ones ("like", "so", "तो") are left in
+FILLER_WORDS = {
+    "um", "umm", "uh", "uhh", "uhm", "erm", "hmm", "hmmm", "mm", "mmm", "mhm", "ah", "ahh",
+    "उम", "उम्म", "अम्म", "हम्म", "अं", "आं",
+}
+
+
+class TranscriptCleaner:
+    """
+        Cleans a transcript line by line (one caption event at a time) and keeps counts of
+        what was removed. Repeats are also found across lines, since rolling captions start
+        with the end of the previous line.
+    """
+    def __init__(self, remove_fillers: bool = TRANSCRIPT_REMOVE_FILLERS, max_overlap: int = TRANSCRIPT_MAX_OVERLAP_WORDS):
+        self.__remove_fillers = remove_fillers
+        self.__max_overlap = max_overlap
+        # Normalized words at the end of the previous lines
+        self.__tail = []
+        self.__stats = {"markers": 0, "fillers": 0, "repeated_words": 0, "bytes_before": 0, "bytes_after": 0}
+
+    def clean_line(self, text: str) -> str:
+        """
+            input (Parameter): Text of one caption.
+            Output: The cleaned text, empty when nothing but markers, fillers or repeats was left.
+        """
+        self.__stats["bytes_before"] += len(text.encode("utf-8"))
+        text = unicodedata.normalize("NFC", html.unescape(text))
+        text, markers = _NON_SPEECH.subn(" ", text)
+        self.__stats["markers"] += markers
+
+        kept = []
+        keys = list(self.__tail)
+        for word in text.split():
+            key = word.strip(_PUNCTUATION).lower() or word
+            if self.__remove_fillers and key in FILLER_WORDS:
+                self.__stats["fillers"] += 1
+                continue
+            kept.append(word)
+            keys.append(key)
+            self.__drop_repeat(kept, keys)
+
+        self.__tail = keys[-2 * self.__max_overlap:]
+        cleaned = " ".join(kept)
+        self.__stats["bytes_after"] += len(cleaned.encode("utf-8"))
+        return cleaned
+
+    def __drop_repeat(self, kept: list, keys: list):
+        """
+            Remove the last n words (n >= 2) when they repeat the n words right before them.
+            Only words of the current line are removed; earlier lines are already out.
+        """
+        last = keys[-1]
+        for n in range(2, min(self.__max_overlap, len(kept)) + 1):
+            if len(keys) < 2 * n:
+                break
+            if keys[-n - 1] == last and keys[-2 * n:-n] == keys[-n:]:
+                del kept[-n:]
+                del keys[-n:]
+                self.__stats["repeated_words"] += n
+                return
+
+    def clean_text(self, text: str) -> str:
+        """
+            Clean a transcript that is only available as plain text (no caption events).
+        """
+        return self.clean_line(text)
+
+    def stats(self) -> dict:
+        """
+            Output: Counts of removed markers, fillers and repeated words, and the estimated
+            tokens before and after the clean-up.
+        """
+        stats = dict(self.__stats)
+        stats["tokens_before"] = math.ceil(stats.pop("bytes_before") / BYTES_PER_TOKEN)
+        stats["tokens_after"] = math.ceil(stats.pop("bytes_after") / BYTES_PER_TOKEN)
+        return stats
@@ -0,0 +1,115 @@
+"""
+    Transcripts of fetched videos, kept out of the Streamlit sessions.
+
+    A session only keeps the small part of the meta data (title, author, a short preview of
+    the transcript...) and the video_id; the transcript and its timed segments live here,
+    once per video for all sessions: on disk (SQLite, least recently used videos evicted)
+    with the most recently used ones also in memory, up to TRANSCRIPT_STORE_MEMORY_BYTES.
+"""
+import os, threading
+from collections import OrderedDict
+from utils.cache import SQLiteCache
+from utils.config import CACHE_DIR, TRANSCRIPT_STORE_MAX_ENTRIES, TRANSCRIPT_STORE_MEMORY_BYTES, TRANSCRIPT_PAGE_CHARS, TRANSCRIPT_PREVIEW_CHARS
+
+
+class TranscriptStore:
+    """
+        Transcript and segments per video_id, shared by every session of the process.
+    """
+    # Meta data fields kept here instead of in the session
+    FIELDS = ("transcript", "segments")
+
+    def __init__(self, path: str = None, max_entries: int = TRANSCRIPT_STORE_MAX_ENTRIES, memory_bytes: int = TRANSCRIPT_STORE_MEMORY_BYTES):
+        self.__store = SQLiteCache(
+            path=path or os.path.join(CACHE_DIR, "transcripts.sqlite3"),
+            table="transcripts",
+            max_entries=max_entries
+        )
+        self.memory_bytes = memory_bytes
+        self.__memory = OrderedDict()
+        self.__memory_used = 0
+        self.__lock = threading.Lock()
+
+    def __remember(self, video_id: str, fields: dict):
+        size = len(fields.get("transcript") or "") + len(str(fields.get("segments") or ""))
+        with self.__lock:
+            if video_id in self.__memory:
+                self.__memory_used -= self.__memory.pop(video_id)[1]
+            self.__memory[video_id] = (fields, size)
+            self.__memory_used += size
+            while self.__memory_used > self.memory_bytes and len(self.__memory) > 1:
+                _, (_, evicted_size) = self.__memory.popitem(last=False)
+                self.__memory_used -= evicted_size
+
+    def get(self, video_id: str) -> dict:
+        """
+            Output: {'transcript', 'segments'} of the video, or None when it is not stored (anymore).
+        """
+        with self.__lock:
+            entry = self.__memory.get(video_id)
+            if entry is not None:
+                self.__memory.move_to_end(video_id)
+                return entry[0]
+        fields = self.__store.get(video_id)
+        if fields is not None:
+            self.__remember(video_id, fields)
+        return fields
+
+    def put(self, meta_data: dict) -> dict:
+        """
+            input (Parameter): Meta data of a video, with its transcript.
+            Output: The same meta data without the transcript and segments, to keep in the
+            session; it has the transcript length and a short preview instead.
+        """
+        fields = {field: meta_data.get(field) for field in self.FIELDS}
+        self.__store.set(meta_data["video_id"], fields)
+        self.__remember(meta_data["video_id"], fields)
+
+        transcript = fields["transcript"] or ""
+        handle = {key: value for key, value in meta_data.items() if key not in self.FIELDS}
+        handle["transcript_chars"] = len(transcript)
+        handle["transcript_preview"] = transcript[:TRANSCRIPT_PREVIEW_CHARS]
+        return handle
+
+    def restore(self, meta_data: dict) -> dict:
+        """
+            input (Parameter): Meta data as returned by put() (full meta data is returned as is).
+            Output: The full meta data, or None when the transcript is no longer stored and
+            the video has to be fetched again.
+        """
+        if "transcript_chars" not in meta_data:
+            return meta_data
+        fields = self.get(meta_data["video_id"])
+        if fields is None:
+            return None
+        meta_data = {key: value for key, value in meta_data.items() if key not in ("transcript_chars", "transcript_preview")}
+        return {**meta_data, **fields}
+
+    def page(self, video_id: str, number: int, page_chars: int = TRANSCRIPT_PAGE_CHARS) -> tuple:
+        """
+            input (Parameter): Video, page number (from 1) and page size in characters.
+            Output: (text of the page, number of pages). Pages end on a space, so words are
+            not cut; an unknown video has no pages.
+        """
+        fields = self.get(video_id)
+        transcript = (fields or {}).get("transcript") or ""
+        if not transcript:
+            return "", 0
+        bounds = []
+        start = 0
+        while start < len(transcript):
+            end = min(start + page_chars, len(transcript))
+            if end < len(transcript):
+                space = transcript.rfind(" ", start, end)
+                end = space + 1 if space > start else end
+            bounds.append((start, end))
+            start = end
+        start, end = bounds[min(max(number, 1), len(bounds)) - 1]
+        return transcript[start:end].strip(), len(bounds)
+
+    def stats(self) -> dict:
+        stats = self.__store.stats()
+        with self.__lock:
+            stats["memory_entries"] = len(self.__memory)
+            stats["memory_bytes"] = self.__memory_used
+        return stats
@@ -1,10 +1,83 @@
-import re, requests, json
+import re, requests, threading, time
+from contextlib import contextmanager
 from html import unescape
-from langchain_community.document_loaders import YoutubeLoader
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from utils import tracing
+from utils.cache import MetaDataCache
+from utils.player_response import extract_player_response
+from utils.transcript_cleanup import TranscriptCleaner
+from utils.config import YOUTUBE_BASE_URL, HTTP_TIMEOUT, HTTP_POOL_SIZE, TRANSCRIPT_CLEANUP, TRANSCRIPT_REMOVE_FILLERS
+
+# Bytes read from the socket at a time while looking for the player response
+STREAM_CHUNK_SIZE = 64 * 1024
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Preferred transcript languages, in order
+TRANSCRIPT_LANGUAGES = ['en', 'hi']
+
+_session = None
+_session_lock = threading.Lock()
+_transcript_executor = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="transcript")
+
+
+def get_http_session() -> requests.Session:
+    """
+        Process-wide HTTP session, so every fetch reuses pooled keep-alive connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+
+def join_caption_events(events: list, cleaner: TranscriptCleaner = None) -> tuple:
+    """
+        input (Parameter): Events of a caption track in YouTube's json3 format and an optional
+        cleaner applied to every caption before it is joined.
+        Output: (plain transcript text, timed segments) where the segments are two parallel
+        lists: 'starts' (start time in ms) and 'offsets' (where the caption starts in the text).
+    """
+    texts, starts, offsets = [], [], []
+    length = 0
+    for event in events:
+        text = "".join(seg.get("utf8", "") for seg in event.get("segs", [])).strip()
+        if cleaner is not None:
+            text = cleaner.clean_line(text)
+        if not text:
+            continue
+        if texts:
+            length += 1  # joining space
+        starts.append(int(event.get("tStartMs", 0)))
+        offsets.append(length)
+        texts.append(text.replace("\n", " "))
+        length += len(texts[-1])
+    return " ".join(texts), {"starts": starts, "offsets": offsets}
+
 
 class VideoExtraction:
-    def __init__(self):
-        pass
+    def __init__(self, cache: MetaDataCache = None, base_url: str = YOUTUBE_BASE_URL,
+                 cleanup: bool = TRANSCRIPT_CLEANUP, remove_fillers: bool = TRANSCRIPT_REMOVE_FILLERS):
+        self.__cache = cache
+        self.__base_url = base_url.rstrip("/")
+        self.__cleanup = cleanup
+        self.__remove_fillers = remove_fillers
+        self.__requests = []
+        self.__requests_lock = threading.Lock()
 
     def get_platform(self, url: str) -> bool:
         url = url.strip().lower()
@@ -33,7 +106,16 @@ class VideoExtraction:
     def get_meta_data(self, video_id) -> dict:
         """
             Get meta data for the given Video Id.
+            Fields found in the cache are reused and only the missing ones are fetched.
+            The watch page is downloaded once; its caption track is then fetched on a
+            background thread while the details are parsed and cached.
         """
+        with tracing.span("get_meta_data", video_id=video_id) as span:
+            meta_data = self.__get_meta_data(video_id)
+            span["transcript_chars"] = len(meta_data["transcript"])
+            return meta_data
+
+    def __get_meta_data(self, video_id) -> dict:
         meta_data = {
             "title": f"Youtube Video: {video_id}",
             "platform": "Youtube",
@@ -43,61 +125,212 @@ class VideoExtraction:
             "views": 0,
             "author": "Unknown",
             "video_id": video_id,
-            "transcript": ""
+            "transcript": "",
+            "segments": None
         }
+        url = f"{self.__base_url}/watch?v={video_id}"
+        with self.__requests_lock:
+            self.__requests = []
+
+        details = self.__cache.get(video_id, "details") if self.__cache else None
+        transcript = self.__cache.get(video_id, "transcript") if self.__cache else None
+        # Transcript and segments are stored together; a transcript cached without them is fetched again
+        segments = self.__cache.get(video_id, "segments") if self.__cache and transcript is not None else None
+        if segments is None:
+            transcript = None
+        # A video known to have no captions is not looked up again until the marker expires
+        no_captions = transcript is None and self.__cache is not None and self.__cache.get(video_id, "no_captions") is not None
 
         try:
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            headers = {
-                "User-Agent": (
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/122.0.0.0 Safari/537.36"
-                ),
-                "Accept-Language": "en-US,en;q=0.9",
-            }
-            response = requests.get(url=url, headers=headers)
-            
-            if response.status_code != 200:
-                print(f"Bad response, so couldn't find the metadatas as response: {response.status_code}")
-                return meta_data
-            
-            html = response.text
-            match = re.search(r'ytInitialPlayerResponse\s*=\s*({.+?});', html)
-            if not match:
-                print("ytInitialPlayerResponse not found.")
-                return meta_data
-
-            player_response = json.loads(match.group(1))
-            video_details = player_response.get("videoDetails", {})
-            # microformat = player_response.get("microformat", {}).get("playerMicroformatRenderer", {})
-
-            meta_data["title"] = video_details.get("title", meta_data["title"])
-            meta_data["author"] = video_details.get("author", meta_data["author"])
-            meta_data["views"] = int(video_details.get("viewCount", 0))
-            meta_data["duration"] = int(video_details.get("lengthSeconds", 0))
-
-            # Get clean description (cut off at first 2 paragraphs or 500 chars)
-            raw_description = unescape(video_details.get("shortDescription", ""))
-            lines = raw_description.strip().split("\n")
-            filtered_lines = [line for line in lines if not line.lower().startswith("http")]
-            meta_data["description"] = "\n".join(filtered_lines).strip()
-
-            # Try high-quality thumbnail fallback
-            thumbnails = video_details.get("thumbnail", {}).get("thumbnails", [])
-            if thumbnails:
-                meta_data["thumbnail_url"] = thumbnails[-1]["url"].split("?")[0]  # remove query params
+            if details is None or (transcript is None and not no_captions):
+                player_response = self.__fetch_player_response(url=url)
+                if player_response is None and details is None:
+                    return meta_data
 
-            
-            transcript_loader = YoutubeLoader.from_youtube_url(youtube_url=url, language=['en', 'hi'])
-            documents = transcript_loader.load()
-            meta_data['transcript'] = documents[0].page_content if documents else "Transcript not available"
+                track = None
+                if player_response is not None:
+                    pending_transcript = None
+                    if transcript is None and not no_captions:
+                        track = self.__select_caption_track(player_response)
+                        if track:
+                            pending_transcript = _transcript_executor.submit(tracing.bind(self.__fetch_caption_track), track["baseUrl"])
+
+                    with tracing.span("parse_details"):
+                        details = self.__parse_details(player_response)
+                    if self.__cache:
+                        self.__cache.set(video_id, "details", details)
+
+                    if pending_transcript is not None:
+                        transcript, segments = pending_transcript.result()
+
+                if transcript is None and not no_captions:
+                    # The loader only returns plain text, so there is no timing for chapter detection
+                    with tracing.span("transcript_fallback"):
+                        transcript, segments = self.__fetch_transcript_fallback(url=url), {}
+                    if not transcript and player_response is not None and track is None and self.__cache:
+                        # Neither a caption track nor a transcript from the loader: not tried on every request
+                        self.__cache.set(video_id, "no_captions", True)
+                if transcript and self.__cache:
+                    self.__cache.set(video_id, "transcript", transcript)
+                    self.__cache.set(video_id, "segments", segments)
+
+            meta_data.update(details)
+            meta_data['transcript'] = transcript if transcript else "Transcript not available"
+            meta_data['segments'] = segments if transcript and segments else None
 
             return meta_data
 
         except Exception as e:
             raise Exception(e)
 
+    def get_request_stats(self) -> dict:
+        """
+            Network cost of the last get_meta_data call: one entry per HTTP request plus totals.
+        """
+        with self.__requests_lock:
+            requests_made = list(self.__requests)
+        return {
+            "requests": requests_made,
+            "total_requests": len(requests_made),
+            "total_bytes": sum(r["bytes"] or 0 for r in requests_made),
+            "total_seconds": sum(r["seconds"] for r in requests_made),
+        }
+
+    def __record_request(self, url: str, status: int, num_bytes: int, seconds: float):
+        with self.__requests_lock:
+            self.__requests.append({"url": url, "status": status, "bytes": num_bytes, "seconds": seconds})
+        tracing.count("http_requests_total", status=status)
+        tracing.count("http_response_bytes_total", num_bytes or 0)
+
+    def __get(self, url: str) -> requests.Response:
+        started = time.perf_counter()
+        response = get_http_session().get(url=url, timeout=HTTP_TIMEOUT)
+        self.__record_request(url, response.status_code, len(response.content), time.perf_counter() - started)
+        return response
+
+    def __fetch_player_response(self, url: str) -> dict:
+        """
+            Stream the watch page and return the parsed ytInitialPlayerResponse.
+            Reading stops as soon as the object is complete, the rest of the page is never downloaded.
+            Returns None when the page could not be read.
+        """
+        with tracing.span("fetch_watch_page") as span:
+            started = time.perf_counter()
+            response = get_http_session().get(url=url, timeout=HTTP_TIMEOUT, stream=True)
+            try:
+                span["status"] = response.status_code
+                if response.status_code != 200:
+                    self.__record_request(url, response.status_code, 0, time.perf_counter() - started)
+                    tracing.log("watch_page_failed", url=url, status=response.status_code)
+                    return None
+
+                player_response, bytes_read = extract_player_response(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+                span["bytes"] = bytes_read
+                self.__record_request(url, response.status_code, bytes_read, time.perf_counter() - started)
+            finally:
+                response.close()
+
+        if player_response is None:
+            tracing.count("player_response_missing_total")
+            tracing.log("player_response_missing", url=url)
+        return player_response
+
+    def __parse_details(self, player_response: dict) -> dict:
+        video_details = player_response.get("videoDetails", {})
+        # microformat = player_response.get("microformat", {}).get("playerMicroformatRenderer", {})
+
+        details = {}
+        if "title" in video_details:
+            details["title"] = video_details["title"]
+        if "author" in video_details:
+            details["author"] = video_details["author"]
+        details["views"] = int(video_details.get("viewCount", 0))
+        details["duration"] = int(video_details.get("lengthSeconds", 0))
+
+        # Get clean description (cut off at first 2 paragraphs or 500 chars)
+        raw_description = unescape(video_details.get("shortDescription", ""))
+        lines = raw_description.strip().split("\n")
+        filtered_lines = [line for line in lines if not line.lower().startswith("http")]
+        details["description"] = "\n".join(filtered_lines).strip()
+
+        # Try high-quality thumbnail fallback
+        thumbnails = video_details.get("thumbnail", {}).get("thumbnails", [])
+        if thumbnails:
+            details["thumbnail_url"] = thumbnails[-1]["url"].split("?")[0]  # remove query params
+
+        return details
+
+    def __select_caption_track(self, player_response: dict) -> dict:
+        """
+            Pick the caption track from the player response, in the same order as the
+            transcript loader: by preferred language, manual captions before auto-generated ones.
+        """
+        tracks = (
+            player_response.get("captions", {})
+            .get("playerCaptionsTracklistRenderer", {})
+            .get("captionTracks", [])
+        )
+        for language in TRANSCRIPT_LANGUAGES:
+            for auto_generated in (False, True):
+                for track in tracks:
+                    code = track.get("languageCode", "").split("-")[0]
+                    if code == language and (track.get("kind") == "asr") == auto_generated and track.get("baseUrl"):
+                        return track
+        return None
+
+    def __fetch_caption_track(self, base_url: str) -> tuple:
+        """
+            Download a caption track in YouTube's json3 format.
+            Output: (plain text, timed segments), or (None, None) when the track is empty or could not be read.
+        """
+        if base_url.startswith("/"):
+            base_url = self.__base_url + base_url
+        with tracing.span("fetch_transcript") as span:
+            try:
+                response = self.__get(url=f"{base_url}&fmt=json3")
+                span["status"] = response.status_code
+                span["bytes"] = len(response.content)
+                if response.status_code != 200 or not response.content:
+                    return None, None
+                events = response.json().get("events", [])
+            except (requests.RequestException, ValueError) as e:
+                tracing.count("caption_fetch_failures_total", error=type(e).__name__)
+                tracing.log("caption_fetch_failed", error=f"{type(e).__name__}: {e}")
+                return None, None
+
+            with self.__cleanup_span() as cleaner:
+                text, segments = join_caption_events(events, cleaner=cleaner)
+            span["segments"] = len(segments["starts"])
+            return (text, segments) if text else (None, None)
+
+    @contextmanager
+    def __cleanup_span(self):
+        """
+            Yield the cleaner for one transcript (None when the clean-up is off) and record
+            what it removed on a clean_transcript span.
+        """
+        if not self.__cleanup:
+            yield None
+            return
+        cleaner = TranscriptCleaner(remove_fillers=self.__remove_fillers)
+        with tracing.span("clean_transcript") as span:
+            yield cleaner
+            stats = cleaner.stats()
+            span.update(stats)
+        tracing.count("transcript_tokens_total", stats["tokens_before"], stage="raw")
+        tracing.count("transcript_tokens_total", stats["tokens_after"], stage="clean")
+
+    def __fetch_transcript_fallback(self, url: str) -> str:
+        # Only needed when the page has no caption track, and slow to import
+        from langchain_community.document_loaders import YoutubeLoader
+        transcript_loader = YoutubeLoader.from_youtube_url(youtube_url=url, language=TRANSCRIPT_LANGUAGES)
+        documents = transcript_loader.load()
+        if not documents:
+            return None
+        with self.__cleanup_span() as cleaner:
+            text = documents[0].page_content
+            return cleaner.clean_text(text) if cleaner is not None else text
+
 # v = VideoExtraction()
 # url = "https://www.youtube.com/watch?v=ZTmF2v59CtI"
 